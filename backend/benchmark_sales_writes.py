@@ -0,0 +1,135 @@
+"""
+Sales write benchmark
+Measures POST /sales write throughput with a commit per sale versus the write-behind
+queue (utils/sales_writer.py), on a scratch SQLite database in a temporary directory.
+
+Each mode runs the same burst: concurrent clients, each recording sales one after
+another and waiting for its result, as the desktop client does on peak days.
+
+Run from the backend directory:
+    python benchmark_sales_writes.py                          # 16 clients x 200 sales
+    python benchmark_sales_writes.py --clients 32 --sales 100
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import attach_archive
+from models import Base, ProductModel, Inventory
+from utils.sales_writer import SalesWriteBehind, write_sale
+
+PRODUCTS = 5
+
+
+def last_weekday() -> date:
+    day = date.today()
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def scratch_database(directory: str, name: str, initial_stock: int) -> sessionmaker:
+    """Fresh database with a few products and enough stock for the whole burst"""
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name + '.db')}", connect_args={"check_same_thread": False})
+    attach_archive(engine, os.path.join(directory, name + "_archive.db"))
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = session_factory()
+    for product_id in range(1, PRODUCTS + 1):
+        db.add(ProductModel(id=product_id, sku=f"BENCH{product_id}", name=f"BENCH{product_id}",
+                            shipping_mode="CKD F", status="benchmark"))
+        db.add(Inventory(product_id=product_id, current_stock=initial_stock))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def run_burst(clients: int, sales: int, record_sale: Callable[[int, int], None]) -> Dict:
+    """Run `clients` threads recording `sales` sales each; returns throughput and latency"""
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    start_barrier = threading.Barrier(clients + 1)
+
+    def client(index: int) -> None:
+        start_barrier.wait()
+        for n in range(sales):
+            started = time.perf_counter()
+            record_sale(index, n)
+            latencies[index].append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    all_latencies = sorted(ms for client_latencies in latencies for ms in client_latencies)
+    return {
+        "sales": len(all_latencies),
+        "seconds": elapsed,
+        "sales_per_second": len(all_latencies) / elapsed,
+        "p50_ms": statistics.median(all_latencies),
+        "p99_ms": all_latencies[int(len(all_latencies) * 0.99) - 1]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--sales", type=int, default=200, help="Sales per client")
+    args = parser.parse_args()
+
+    sale_date = last_weekday()
+    initial_stock = args.clients * args.sales
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Before: every sale in its own transaction (one commit, one fsync, per sale)
+        direct_sessions = scratch_database(directory, "direct", initial_stock)
+
+        def direct_sale(client: int, n: int) -> None:
+            db = direct_sessions()
+            try:
+                write_sale(db, (client + n) % PRODUCTS + 1, 1, sale_date, "benchmark")
+                db.commit()
+            finally:
+                db.close()
+
+        # After: validated against cached stock, committed in batches by the writer thread
+        queued_sessions = scratch_database(directory, "write_behind", initial_stock)
+        writer = SalesWriteBehind(session_factory=queued_sessions)
+
+        def queued_sale(client: int, n: int) -> None:
+            db = queued_sessions()
+            try:
+                future = writer.submit(db, (client + n) % PRODUCTS + 1, 1, sale_date, "benchmark")
+            finally:
+                db.close()
+            future.result()
+
+        results = {
+            "commit per sale": run_burst(args.clients, args.sales, direct_sale),
+            "write-behind": run_burst(args.clients, args.sales, queued_sale)
+        }
+        writer.stop()
+
+    print(f"{args.clients} clients x {args.sales} sales")
+    for mode, result in results.items():
+        print(f"{mode:>16}: {result['sales_per_second']:8.0f} sales/s   "
+              f"p50 {result['p50_ms']:6.1f} ms   p99 {result['p99_ms']:6.1f} ms   "
+              f"({result['sales']} sales in {result['seconds']:.2f} s)")
+    speedup = results["write-behind"]["sales_per_second"] / results["commit per sale"]["sales_per_second"]
+    print(f"Write-behind throughput: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
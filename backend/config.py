@@ -28,6 +28,42 @@ class Settings(BaseSettings):
     ORDER_TO_ETD_DAYS: int = 28   # Order week to ETD (from Sheet 1)
     ORDER_TO_ETA_DAYS: int = 73   # Order week to ETA (28 order + 45 shipping, from Sheet 1)
     
+    # Learned lead times (from delivered PO history, see utils/lead_times.py)
+    USE_LEARNED_LEAD_TIMES: bool = False  # Use learned lead times in PO generation and safety stock
+    LEARNED_LEAD_TIME_STATISTIC: str = "p90"  # "median" or "p90"
+    LEAD_TIME_MIN_SAMPLES: int = 3        # Deliveries needed before a learned value is trusted
+    
+    # Container Settings (CKD kits are consolidated into 40' high-cube containers)
+    CONTAINER_TYPE: str = "40HQ"
+    CONTAINER_VOLUME_CBM: float = 68.0       # Usable loading volume (76 m³ nominal)
+    CONTAINER_MAX_WEIGHT_KG: float = 26500.0 # Maximum payload
+    
+    # Dashboard Settings
+    DASHBOARD_REFRESH_DEBOUNCE_SECONDS: float = 2.0  # Delay before rebuilding the dashboard snapshot after writes
+    DASHBOARD_QUERY_WORKERS: int = 6                 # Threads building dashboard sections concurrently
+    
+    # Live Events (Server-Sent Events stream at /events)
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0  # Keep-alive comment interval on idle streams
+    EVENTS_HISTORY_SIZE: int = 200          # Recent events kept for clients resuming with Last-Event-ID
+    EVENTS_QUEUE_SIZE: int = 100            # Pending events per client before the oldest are dropped
+    
+    # Sales Import (POST /sales/import)
+    SALES_IMPORT_CHUNK_SIZE: int = 1000     # Rows per executemany INSERT
+    
+    # Sales Write-Behind (group commit for POST /sales, see utils/sales_writer.py)
+    SALES_WRITE_BEHIND: bool = False                # Queue sales and commit them in batches from one writer thread
+    SALES_WRITE_BEHIND_BATCH_MS: float = 5.0        # How long the writer collects sales before committing
+    SALES_WRITE_BEHIND_MAX_BATCH: int = 500         # Sales per transaction at most
+    SALES_WRITE_BEHIND_STOCK_TTL_SECONDS: float = 1.0  # Age after which cached stock is re-read
+    
+    # Idempotency keys (Idempotency-Key header on POST /sales and POST /purchase/create)
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24              # How long a key's response is replayed; older keys are deleted
+    IDEMPOTENCY_CACHE_SIZE: int = 1000               # Recent keys kept in memory
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: float = 600.0  # Minimum time between deletions of expired keys
+    
+    # Sales Archive (POST /sales/archive, see utils/sales_archive.py)
+    SALES_ARCHIVE_AFTER_MONTHS: int = 24    # Months kept in sales_records; older months are compacted and archived
+    
     # Inventory Settings
     TARGET_DOS_NEW: tuple = (50, 60)      # DOS range for new branches
     TARGET_DOS_ESTABLISHED: tuple = (0, 45) # DOS range for established branches
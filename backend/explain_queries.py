@@ -0,0 +1,198 @@
+"""
+Query plan advisor
+Replays the query shapes behind the app's hot endpoints through EXPLAIN QUERY PLAN and
+flags full table scans, so a missing or unusable index shows up before it gets slow.
+
+Run from the backend directory (after migrate_db.py for existing databases):
+    python explain_queries.py          # flagged queries only; exit code 1 if any
+    python explain_queries.py --all    # plan of every query
+"""
+import sys
+from datetime import date, timedelta
+from typing import List, Tuple
+from sqlalchemy import func, literal, select, tuple_, or_
+from sqlalchemy.exc import OperationalError
+
+from database import engine
+from models import (
+    Base, SalesRecord, ProductModel, Inventory, PurchaseOrder, POWeeklyTotal, MonthlyPlan, SalesForecast,
+    InventoryMovement, InventorySnapshot, SalesMonthlyArchive, ArchivedSalesRecord, SalesSummaryPartial,
+    IdempotencyKey, SalesDailyTotal
+)
+
+# Lookup tables with one row per product or setting: scanning them is expected
+SMALL_TABLES = {"product_models", "inventory", "system_config", "users", "sequence_counters", "lead_time_stats"}
+
+
+def query_shapes() -> List[Tuple[str, object]]:
+    """(description, statement) per hot query, with representative parameters"""
+    today = date.today()
+    month_start = today.replace(day=1)
+    product_id = 1
+    
+    sales_columns = [
+        SalesRecord.id, SalesRecord.product_id, ProductModel.name, SalesRecord.quantity,
+        SalesRecord.sale_date, SalesRecord.channel, SalesRecord.created_at
+    ]
+    sales_list = select(*sales_columns).outerjoin(ProductModel, SalesRecord.product_id == ProductModel.id)
+    newest_first = [SalesRecord.sale_date.desc(), SalesRecord.id.desc()]
+    
+    return [
+        ("GET /sales (first page)",
+         sales_list.order_by(*newest_first).limit(101)),
+        ("GET /sales?cursor= (keyset page)",
+         sales_list.where(tuple_(SalesRecord.sale_date, SalesRecord.id) < tuple_(literal(today - timedelta(days=400)), literal(10**6)))
+         .order_by(*newest_first).limit(101)),
+        ("GET /sales/by_model/{id}",
+         select(SalesRecord.id, SalesRecord.quantity, SalesRecord.sale_date)
+         .where(SalesRecord.product_id == product_id, SalesRecord.sale_date >= today - timedelta(days=90))
+         .order_by(*newest_first).limit(101)),
+        ("Weekly consumption per product (PO generation)",
+         select(SalesRecord.product_id, func.sum(SalesRecord.quantity))
+         .where(SalesRecord.sale_date.between(today - timedelta(days=11), today - timedelta(days=7)))
+         .group_by(SalesRecord.product_id)),
+        ("Monthly sales of one product (PSI calculations, sales_daily)",
+         select(func.sum(SalesDailyTotal.total_quantity))
+         .where(SalesDailyTotal.product_id == product_id, SalesDailyTotal.sale_date.between(month_start, today))),
+        ("Sales trend by week (dashboard, sales_daily)",
+         select(func.date(SalesDailyTotal.sale_date, 'weekday 0', '-6 days'), func.sum(SalesDailyTotal.total_quantity))
+         .where(SalesDailyTotal.sale_date.between(today - timedelta(weeks=12), today))
+         .group_by(func.date(SalesDailyTotal.sale_date, 'weekday 0', '-6 days'))),
+        ("Inventory of one product (sales, stock adjustments)",
+         select(Inventory.current_stock).where(Inventory.product_id == product_id)),
+        ("GET /purchase?product_id=",
+         select(PurchaseOrder.id, ProductModel.sku).join(ProductModel, PurchaseOrder.product_id == ProductModel.id)
+         .where(PurchaseOrder.product_id == product_id).order_by(PurchaseOrder.order_week.desc())),
+        ("GET /shipments?status=&stage=",
+         select(PurchaseOrder.id, ProductModel.sku).join(ProductModel, PurchaseOrder.product_id == ProductModel.id)
+         .where(PurchaseOrder.status == "ordered", PurchaseOrder.stage == "Shipped")
+         .order_by(PurchaseOrder.order_week.desc())),
+        ("Stage counts (GROUP BY stage, status)",
+         select(PurchaseOrder.stage, PurchaseOrder.status, func.count(PurchaseOrder.id))
+         .group_by(PurchaseOrder.stage, PurchaseOrder.status)),
+        ("In-transit POs of one product (end-to-end inventory)",
+         select(PurchaseOrder.quantity).where(
+             PurchaseOrder.product_id == product_id,
+             PurchaseOrder.eta > today,
+             PurchaseOrder.eta <= today + timedelta(days=90),
+             PurchaseOrder.status.in_(["ordered", "shipped"])
+         )),
+        ("Delayed shipments (ETA passed, not delivered)",
+         select(PurchaseOrder.id).where(
+             PurchaseOrder.eta < today,
+             PurchaseOrder.status.in_(["ordered", "shipped"]),
+             PurchaseOrder.stage != "CBU Warehouse"
+         )),
+        ("Delivered POs (lead time analytics)",
+         select(PurchaseOrder.id, PurchaseOrder.eta).where(PurchaseOrder.status == "delivered")),
+        ("Consolidation candidates of one order week",
+         select(PurchaseOrder.id).where(
+             PurchaseOrder.order_week == today,
+             PurchaseOrder.status == "suggested",
+             PurchaseOrder.container_ref.is_(None)
+         )),
+        ("po_weekly_totals refresh of touched weeks",
+         select(PurchaseOrder.order_week, PurchaseOrder.product_id, func.sum(PurchaseOrder.quantity))
+         .where(PurchaseOrder.order_week.in_([today, today - timedelta(weeks=1)]))
+         .group_by(PurchaseOrder.order_week, PurchaseOrder.product_id)),
+        ("PO forecast vs actual chart (po_weekly_totals range)",
+         select(POWeeklyTotal.order_week, func.sum(POWeeklyTotal.actual_quantity))
+         .where(POWeeklyTotal.order_week.between(today - timedelta(weeks=12), today))
+         .group_by(POWeeklyTotal.order_week)),
+        ("Monthly plan of one product and month",
+         select(MonthlyPlan.id).where(MonthlyPlan.product_id == product_id, MonthlyPlan.plan_month == month_start)),
+        ("Sales forecast of one product, month and channel",
+         select(SalesForecast.quantity).where(
+             SalesForecast.product_id == product_id,
+             SalesForecast.forecast_date == month_start,
+             SalesForecast.channel == "all"
+         ).order_by(SalesForecast.version.desc()).limit(1)),
+        ("Latest stock snapshot of one product (stock at date)",
+         select(InventorySnapshot.snapshot_date, InventorySnapshot.stock).where(
+             InventorySnapshot.product_id == product_id,
+             InventorySnapshot.snapshot_date <= month_start
+         ).order_by(InventorySnapshot.snapshot_date.desc()).limit(1)),
+        ("Stock movements since the snapshot (stock at date)",
+         select(func.sum(InventoryMovement.quantity)).where(
+             InventoryMovement.product_id == product_id,
+             InventoryMovement.movement_date > month_start - timedelta(days=31),
+             InventoryMovement.movement_date <= month_start
+         )),
+        ("Archived month totals of one product (monthly sales)",
+         select(func.sum(SalesMonthlyArchive.total_quantity)).where(
+             SalesMonthlyArchive.product_id == product_id,
+             SalesMonthlyArchive.month >= month_start.replace(year=month_start.year - 3),
+             SalesMonthlyArchive.month < month_start.replace(year=month_start.year - 2)
+         )),
+        ("Archived raw sales of one product (partial months)",
+         select(func.sum(ArchivedSalesRecord.quantity)).where(
+             ArchivedSalesRecord.product_id == product_id,
+             ArchivedSalesRecord.sale_date.between(today - timedelta(days=3 * 365), today - timedelta(days=2 * 365))
+         )),
+        ("Stock movements of one PO (delivery receipt)",
+         select(func.sum(InventoryMovement.quantity)).where(InventoryMovement.reference == "po:1")),
+        ("Sales summary: cached partials of closed months",
+         select(SalesSummaryPartial.product_id, func.sum(SalesSummaryPartial.total_quantity))
+         .where(SalesSummaryPartial.month >= month_start.replace(month=1), SalesSummaryPartial.month < month_start)
+         .group_by(SalesSummaryPartial.product_id)),
+        ("Sales summary: edge days and open month",
+         select(SalesRecord.product_id, func.sum(SalesRecord.quantity))
+         .where(or_(
+             SalesRecord.sale_date.between(month_start - timedelta(days=40), month_start - timedelta(days=32)),
+             SalesRecord.sale_date.between(month_start, today)
+         ))
+         .group_by(SalesRecord.product_id)),
+        ("Expired idempotency keys (TTL cleanup)",
+         select(IdempotencyKey.key_hash).where(IdempotencyKey.created_at < func.datetime('now', '-86400 seconds'))),
+    ]
+
+
+def explain(conn, statement) -> List[str]:
+    """Detail lines of EXPLAIN QUERY PLAN for a statement"""
+    sql = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def full_table_scans(plan: List[str]) -> List[str]:
+    """Plan lines reading a whole (non-lookup) table without an index"""
+    flagged = []
+    for line in plan:
+        words = line.split()
+        if len(words) >= 2 and words[0] == "SCAN" and "USING" not in words:
+            if words[1] in Base.metadata.tables and words[1] not in SMALL_TABLES:
+                flagged.append(line)
+    return flagged
+
+
+def main() -> int:
+    show_all = "--all" in sys.argv[1:]
+    flagged_count = 0
+    
+    with engine.connect() as conn:
+        for description, statement in query_shapes():
+            try:
+                plan = explain(conn, statement)
+            except OperationalError as e:
+                flagged_count += 1
+                print(f"✗ {description}\n    -> cannot explain ({e.orig}); run migrate_db.py first")
+                continue
+            scans = full_table_scans(plan)
+            flagged_count += bool(scans)
+            
+            if scans or show_all:
+                print(f"{'✗' if scans else '✓'} {description}")
+                for line in plan:
+                    print(f"    {line}")
+                for line in scans:
+                    print(f"    -> full table scan: {line}")
+    
+    total = len(query_shapes())
+    if flagged_count:
+        print(f"\n{flagged_count} of {total} queries need attention")
+    else:
+        print(f"✓ No full table scans in {total} queries")
+    return 1 if flagged_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
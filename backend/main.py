@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import dashboard, inventory, sales, purchase, shipments, models_api, settings_api, auth, monthly_plan, export
+from routers import dashboard, inventory, sales, purchase, shipments, models_api, settings_api, auth, monthly_plan, export, events
+from utils.sales_writer import sales_write_behind
 
 app = FastAPI(title="PSI Forecast System", version="1.0")
 
@@ -19,6 +20,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],       # allow GET, POST, PUT, DELETE, OPTIONS
     allow_headers=["*"],       # allow all headers
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],  # keyset pagination cursor (/sales), replayed writes
 )
 
 # Register Routers
@@ -32,6 +34,12 @@ app.include_router(shipments.router)
 app.include_router(settings_api.router)
 app.include_router(export.router)
 app.include_router(dashboard.router)
+app.include_router(events.router)
+
+# Commit sales still queued in write-behind mode before the process exits
+@app.on_event("shutdown")
+def flush_sales_write_behind():
+    sales_write_behind.stop()
 
 @app.get("/")
 def root():
@@ -2,6 +2,7 @@
 Database migration script to add new columns to existing database
 Run this if you have an existing database and need to add the new columns
 """
+from datetime import date
 from sqlalchemy import create_engine, text
 import os
 
@@ -11,6 +12,9 @@ DATABASE_URL = "sqlite:///./data/psi.db"
 def migrate_database():
     """Add new columns to existing database if they don't exist"""
     engine = create_engine(DATABASE_URL)
+    # Archived sales live in a separate database, attached as schema 'archive'
+    from database import attach_archive
+    attach_archive(engine)
     
     # Check if database file exists
     db_path = DATABASE_URL.replace("sqlite:///", "")
@@ -18,6 +22,10 @@ def migrate_database():
         print("Database file does not exist. Run init_db.py first.")
         return
     
+    # Create any tables added since the database was initialized (existing tables are left untouched)
+    from models import Base
+    Base.metadata.create_all(bind=engine)
+    
     with engine.connect() as conn:
         # Check if columns exist and add them if they don't
         try:
@@ -41,6 +49,15 @@ def migrate_database():
             else:
                 print("✓ lead_time_weeks column already exists")
             
+            for col_name in ['kit_volume_cbm', 'kit_weight_kg']:
+                if col_name not in columns:
+                    print(f"Adding {col_name} column...")
+                    conn.execute(text(f"ALTER TABLE product_models ADD COLUMN {col_name} REAL"))
+                    conn.commit()
+                    print(f"✓ Added {col_name} column")
+                else:
+                    print(f"✓ {col_name} column already exists")
+            
             # Check PurchaseOrder table for new columns
             result = conn.execute(text("PRAGMA table_info(purchase_orders)"))
             po_columns = [row[1] for row in result]
@@ -49,7 +66,8 @@ def migrate_database():
                 'forecasted_quantity': 'INTEGER',
                 'order_date': 'DATE',
                 'expected_delivery_week': 'DATE',
-                'stage_updated_at': 'DATETIME'
+                'stage_updated_at': 'DATETIME',
+                'container_ref': 'VARCHAR(30)'
             }
             
             for col_name, col_type in new_po_columns.items():
@@ -61,6 +79,107 @@ def migrate_database():
                 else:
                     print(f"✓ {col_name} column already exists")
             
+            # Generated POs are keyed on (product_id, order_week)
+            if 'is_generated' not in po_columns:
+                print("Adding is_generated column to purchase_orders...")
+                conn.execute(text("ALTER TABLE purchase_orders ADD COLUMN is_generated BOOLEAN NOT NULL DEFAULT 0"))
+                conn.execute(text("UPDATE purchase_orders SET is_generated = 1 WHERE notes LIKE 'Auto-generated PO.%'"))
+                conn.commit()
+                print("✓ Added is_generated column")
+            else:
+                print("✓ is_generated column already exists")
+            
+            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'purchase_orders'"))
+            po_indexes = [row[0] for row in result]
+            
+            if 'uq_generated_po_week' not in po_indexes:
+                print("Creating unique index on generated POs (product_id, order_week)...")
+                # Keep the earliest generated PO per product/week, demote later duplicates to manual POs
+                demoted = conn.execute(text("""
+                    UPDATE purchase_orders SET is_generated = 0
+                    WHERE is_generated = 1 AND id NOT IN (
+                        SELECT MIN(id) FROM purchase_orders
+                        WHERE is_generated = 1
+                        GROUP BY product_id, order_week
+                    )
+                """)).rowcount
+                if demoted:
+                    print(f"  Marked {demoted} duplicate generated POs as manual")
+                conn.execute(text(
+                    "CREATE UNIQUE INDEX uq_generated_po_week ON purchase_orders (product_id, order_week) "
+                    "WHERE is_generated = 1"
+                ))
+                conn.commit()
+                print("✓ Created uq_generated_po_week index")
+            else:
+                print("✓ uq_generated_po_week index already exists")
+            
+            # Indexes declared in models.py that older databases lack (create_all skips existing tables)
+            result = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "UNION ALL SELECT name FROM archive.sqlite_master WHERE type = 'index'"
+            ))
+            existing_indexes = {row[0] for row in result}
+            missing_indexes = [
+                index for table in Base.metadata.sorted_tables for index in table.indexes
+                if index.name not in existing_indexes
+            ]
+            for index in missing_indexes:
+                print(f"Creating index {index.name}...")
+                index.create(bind=conn)
+                print(f"✓ Created {index.name} index")
+            if missing_indexes:
+                conn.commit()
+            else:
+                print("✓ All indexes already exist")
+            
+            # Backfill the weekly PO aggregate (table is created empty by create_all above)
+            totals_rows = conn.execute(text("SELECT COUNT(*) FROM po_weekly_totals")).scalar()
+            po_rows = conn.execute(text("SELECT COUNT(*) FROM purchase_orders")).scalar()
+            if not totals_rows and po_rows:
+                print("Backfilling po_weekly_totals...")
+                conn.execute(text("""
+                    INSERT INTO po_weekly_totals (order_week, product_id, forecasted_quantity, actual_quantity, po_count)
+                    SELECT order_week, product_id, SUM(COALESCE(forecasted_quantity, quantity)), SUM(quantity), COUNT(id)
+                    FROM purchase_orders
+                    GROUP BY order_week, product_id
+                """))
+                conn.commit()
+                print("✓ Backfilled po_weekly_totals")
+            else:
+                print("✓ po_weekly_totals already populated")
+            
+            # Backfill the daily sales aggregate (table is created empty by create_all above)
+            daily_rows = conn.execute(text("SELECT COUNT(*) FROM sales_daily")).scalar()
+            sales_rows = conn.execute(text("SELECT COUNT(*) FROM sales_records")).scalar()
+            if not daily_rows and sales_rows:
+                print("Backfilling sales_daily...")
+                conn.execute(text("""
+                    INSERT INTO sales_daily (sale_date, product_id, channel, total_quantity, sales_count)
+                    SELECT sale_date, product_id, channel, SUM(quantity), COUNT(id)
+                    FROM sales_records
+                    GROUP BY sale_date, product_id, channel
+                """))
+                conn.commit()
+                print("✓ Backfilled sales_daily")
+            else:
+                print("✓ sales_daily already populated")
+            
+            # Open the inventory ledger with today's stock (earlier stock history is unknown)
+            movement_rows = conn.execute(text("SELECT COUNT(*) FROM inventory_movements")).scalar()
+            if not movement_rows:
+                print("Opening inventory ledger...")
+                conn.execute(text("""
+                    INSERT INTO inventory_movements (product_id, movement_date, quantity, movement_type, reference)
+                    SELECT product_id, :today, SUM(COALESCE(current_stock, 0)), 'opening', 'migration'
+                    FROM inventory
+                    GROUP BY product_id
+                """), {"today": date.today()})
+                conn.commit()
+                print("✓ Opened inventory ledger")
+            else:
+                print("✓ inventory ledger already opened")
+            
             print("\n✓ Database migration completed successfully!")
             
         except Exception as e:
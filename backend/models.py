@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Date, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Date, UniqueConstraint, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -18,6 +18,8 @@ class ProductModel(Base):
     safety_stock_days = Column(Integer, default=45)  # Target DOS days
     safety_threshold_percentage = Column(Float, default=20.0)  # Safety stock as % of current inventory (default 20%)
     lead_time_weeks = Column(Integer, default=10)  # Lead time in weeks (default 10)
+    kit_volume_cbm = Column(Float, nullable=True)  # Packed CKD kit volume per unit (m³), used for container consolidation
+    kit_weight_kg = Column(Float, nullable=True)  # Packed CKD kit gross weight per unit (kg)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -33,7 +35,7 @@ class Inventory(Base):
     __tablename__ = "inventory"
     
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), nullable=False)
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), nullable=False, index=True)
     current_stock = Column(Integer, default=0)
     cbu_in_hand = Column(Integer, default=0)  # Complete Built Units
     kits_in_factory = Column(Integer, default=0)  # Kits being assembled
@@ -42,6 +44,33 @@ class Inventory(Base):
     # Relationships
     product = relationship("ProductModel", back_populates="inventory")
 
+class InventoryMovement(Base):
+    """Append-only stock ledger - every change to Inventory.current_stock is recorded here"""
+    __tablename__ = "inventory_movements"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), nullable=False)
+    movement_date = Column(Date, nullable=False)  # Business date the stock changed (sale date, delivery date)
+    quantity = Column(Integer, nullable=False)  # Signed: negative leaves stock, positive enters it
+    movement_type = Column(String(20), nullable=False)  # opening, sale, sale_import, adjustment
+    reference = Column(String(50), nullable=True)  # Source document, e.g. sale:123, po:45
+    created_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        # Stock-at-date range scans per product
+        Index('ix_inventory_movements_product_date', 'product_id', 'movement_date'),
+        Index('ix_inventory_movements_reference', 'reference'),
+    )
+
+class InventorySnapshot(Base):
+    """Closing stock per product at a date, taken from the movement ledger"""
+    __tablename__ = "inventory_snapshots"
+    
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)  # Stock at the end of this day
+    stock = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+
 class SalesRecord(Base):
     """Actual sales data - 销售实际数"""
     __tablename__ = "sales_records"
@@ -55,6 +84,71 @@ class SalesRecord(Base):
     
     # Relationships
     product = relationship("ProductModel")
+    
+    # Per-product history and date ranges (sales by model, weekly consumption, forecasts)
+    __table_args__ = (
+        Index('ix_sales_records_product_date', 'product_id', 'sale_date'),
+    )
+
+class SalesDailyTotal(Base):
+    """Sales pre-aggregated per day, product and channel - kept in step with sales_records"""
+    __tablename__ = "sales_daily"
+    
+    sale_date = Column(Date, primary_key=True)  # Leading key for date-range reads (dashboard, policy windows)
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), primary_key=True)
+    channel = Column(String(20), primary_key=True)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    sales_count = Column(Integer, nullable=False, default=0)
+    
+    # Per-product date ranges (forecast history, monthly PSI sales)
+    __table_args__ = (
+        Index('ix_sales_daily_product_date', 'product_id', 'sale_date'),
+    )
+
+class SalesMonthlyArchive(Base):
+    """Compacted sales of archived months - one row per month, product and channel"""
+    __tablename__ = "sales_monthly_archive"
+    
+    month = Column(Date, primary_key=True)  # First day of the month; leading key for range scans
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), primary_key=True)
+    channel = Column(String(20), primary_key=True)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    sales_count = Column(Integer, nullable=False, default=0)
+
+class ArchivedSalesRecord(Base):
+    """Raw sales records moved out of sales_records (lives in the attached archive database)"""
+    __tablename__ = "archived_sales_records"
+    
+    id = Column(Integer, primary_key=True)
+    sales_record_id = Column(Integer, nullable=False)  # id the record had in sales_records
+    product_id = Column(Integer, nullable=False)  # No foreign key across databases
+    sale_date = Column(Date, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    channel = Column(String(20), nullable=False)
+    created_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        Index('ix_archived_sales_records_product_date', 'product_id', 'sale_date'),
+        Index('ix_archived_sales_records_sale_date', 'sale_date'),
+        {"schema": "archive"},
+    )
+
+class SalesSummaryMonth(Base):
+    """Closed months whose per-product sales partials are cached in sales_summary_partials"""
+    __tablename__ = "sales_summary_months"
+    
+    month = Column(Date, primary_key=True)  # First day of the month
+    computed_at = Column(DateTime, server_default=func.now())
+
+class SalesSummaryPartial(Base):
+    """Per-month, per-product sales totals of closed months (GET /sales/summary)"""
+    __tablename__ = "sales_summary_partials"
+    
+    month = Column(Date, primary_key=True)  # First day of the month
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), primary_key=True)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    sales_count = Column(Integer, nullable=False, default=0)
 
 class SalesForecast(Base):
     """Sales predictions - 销售预测"""
@@ -91,17 +185,94 @@ class PurchaseOrder(Base):
     order_date = Column(Date, nullable=True)  # Actual order date
     expected_delivery_week = Column(Date, nullable=True)  # Expected delivery week (Order Week + Lead Time)
     etd = Column(Date, nullable=True)  # Estimated Time of Departure
-    eta = Column(Date, nullable=True)  # Estimated Time of Arrival
+    eta = Column(Date, nullable=True, index=True)  # Estimated Time of Arrival
     status = Column(String(20), nullable=False, default='suggested')  # suggested, ordered, shipped, delivered, cancelled
     shipping_mode = Column(String(20), nullable=False)  # CKD F, etc.
     stage = Column(String(50), nullable=True, default='CKD Prepared')  # CKD Prepared, Booking, Shipped, Customs, Assembly
     stage_updated_at = Column(DateTime, nullable=True)  # When stage was last updated
     notes = Column(Text, nullable=True)
+    is_generated = Column(Boolean, nullable=False, default=False, server_default=text('0'))  # Created by WeeklyPOGenerator
+    container_ref = Column(String(30), nullable=True)  # Container the PO was consolidated into (CNT-YYYYMMDD-NNN)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationships
     product = relationship("ProductModel", back_populates="purchase_orders")
+    
+    # One generated PO per product per order week (manual POs are not restricted)
+    __table_args__ = (
+        Index('uq_generated_po_week', 'product_id', 'order_week', unique=True,
+              sqlite_where=text('is_generated = 1')),
+        # The partial index above only serves generated POs
+        Index('ix_purchase_orders_product_week', 'product_id', 'order_week'),
+        # Stage / status filters and the stage count GROUP BY
+        Index('ix_purchase_orders_status_stage', 'status', 'stage'),
+    )
+
+class SequenceCounter(Base):
+    """Named counters for document numbers (PO numbers are reserved from here in blocks)"""
+    __tablename__ = "sequence_counters"
+    
+    name = Column(String(50), primary_key=True)  # e.g. 'purchase_order'
+    next_value = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class IdempotencyKey(Base):
+    """Responses of write requests sent with an Idempotency-Key header, kept for replay"""
+    __tablename__ = "idempotency_keys"
+    
+    key_hash = Column(String(64), primary_key=True)  # sha256 of endpoint + client key
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    
+    # TTL cleanup deletes by age
+    __table_args__ = (
+        Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
+
+class LeadTimeObservation(Base):
+    """Actual order-to-arrival lead time of one delivered PO"""
+    __tablename__ = "lead_time_observations"
+    
+    po_id = Column(Integer, ForeignKey('purchase_orders.id', ondelete='CASCADE'), primary_key=True)
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), nullable=False)
+    shipping_mode = Column(String(20), nullable=False)
+    lead_time_days = Column(Integer, nullable=False)
+    delivered_on = Column(Date, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_lead_time_observations_product_mode', 'product_id', 'shipping_mode'),
+    )
+
+class LeadTimeStat(Base):
+    """Learned lead-time statistics per SKU and shipping mode (product_id NULL = whole shipping mode)"""
+    __tablename__ = "lead_time_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), nullable=True)
+    shipping_mode = Column(String(20), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    mean_days = Column(Float, nullable=True)
+    median_days = Column(Float, nullable=True)
+    p90_days = Column(Float, nullable=True)
+    histogram = Column(Text, nullable=True)  # JSON {lead_time_days: count}, updated incrementally
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index('ix_lead_time_stats_product_mode', 'product_id', 'shipping_mode'),
+    )
+
+class POWeeklyTotal(Base):
+    """Forecasted vs actual PO quantity per order week and product (kept current on PO writes)"""
+    __tablename__ = "po_weekly_totals"
+    
+    order_week = Column(Date, primary_key=True)  # Leading key: range scans by week
+    product_id = Column(Integer, ForeignKey('product_models.id', ondelete='CASCADE'), primary_key=True)
+    forecasted_quantity = Column(Integer, nullable=False, default=0)  # SUM(COALESCE(forecasted_quantity, quantity))
+    actual_quantity = Column(Integer, nullable=False, default=0)      # SUM(quantity)
+    po_count = Column(Integer, nullable=False, default=0)
 
 class MonthlyPlan(Base):
     """Monthly PSI planning - PSI表数据"""
@@ -48,6 +48,7 @@ a = Analysis(
         'reportlab',
         'routers.auth',
         'routers.dashboard',
+        'routers.events',
         'routers.export',
         'routers.inventory',
         'routers.models_api',
@@ -57,10 +58,30 @@ a = Analysis(
         'routers.settings_api',
         'routers.shipments',
         'utils.calculations',
+        'utils.columnar',
+        'utils.container_consolidation',
+        'utils.dashboard_metrics',
+        'utils.dashboard_snapshot',
+        'utils.events',
         'utils.export_excel',
         'utils.export_pdf',
         'utils.forecast',
+        'utils.idempotency',
+        'utils.inventory_ledger',
+        'utils.lead_time_analytics',
+        'utils.lead_times',
+        'utils.pagination',
+        'utils.po_numbers',
+        'utils.po_weekly_totals',
+        'utils.policy_replay',
+        'utils.sales_archive',
+        'utils.sales_daily',
+        'utils.sales_import',
+        'utils.sales_summary',
+        'utils.sales_writer',
         'utils.shipments_helper',
+        'utils.stage_counts',
+        'utils.stock',
         'utils.weekly_po_generator',
     ],
     hookspath=[],
@@ -0,0 +1,52 @@
+"""
+Server-Sent Events router for live dashboard and shipment updates
+"""
+import asyncio
+from fastapi import APIRouter, Header, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from config import settings
+from utils.events import event_broker, format_sse
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"]
+)
+
+# GET: Live change event stream
+@router.get("")
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Stream change events (text/event-stream):
+    sale_recorded, sale_updated, sale_deleted, sales_imported, sales_archived, inventory_updated,
+    po_stage_changed, po_generated and dashboard_updated (refreshed dashboard aggregates)
+    """
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscriber_id, queue, missed = event_broker.subscribe(resume_from)
+    
+    async def event_stream():
+        try:
+            # Ask EventSource to reconnect after 3 seconds if the stream drops
+            yield "retry: 3000\n\n"
+            for event in missed:
+                yield format_sse(event)
+            
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies and the Electron shell from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(subscriber_id)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -115,11 +115,15 @@ def export_inventory_excel(db: Session = Depends(get_db)):
 def export_sales_excel(
     start_date: date = Query(..., description="Start date"),
     end_date: date = Query(..., description="End date"),
+    daily: bool = Query(False, description="One row per day, product and channel instead of every sale"),
     db: Session = Depends(get_db)
 ):
     """Export sales data to Excel"""
     exporter = ExcelExporter(db)
-    excel_file = exporter.export_sales_data(start_date, end_date)
+    if daily:
+        excel_file = exporter.export_daily_sales(start_date, end_date)
+    else:
+        excel_file = exporter.export_sales_data(start_date, end_date)
     
     return StreamingResponse(
         io.BytesIO(excel_file.read()),
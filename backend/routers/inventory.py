@@ -7,10 +7,15 @@ from database import get_db
 from models import Inventory, ProductModel
 from utils.calculations import BusinessCalculations
 from utils.forecast import ForecastEngine
+from utils.dashboard_snapshot import mark_dashboard_stale
+from utils.events import publish_event
+from utils.inventory_ledger import InventoryLedger
+from utils.stock import get_stock
 
 router = APIRouter(
     prefix="/inventory",
-    tags=["inventory"]
+    tags=["inventory"],
+    dependencies=[Depends(mark_dashboard_stale)]
 )
 
 class InventoryUpdate(BaseModel):
@@ -100,6 +105,7 @@ def update_inventory(payload: InventoryUpdate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Product not found")
     
     inventory = db.query(Inventory).filter(Inventory.product_id == payload.product_id).first()
+    previous_stock = (inventory.current_stock or 0) if inventory else 0
     if inventory:  # type: ignore[truthy-function]
         inventory.current_stock = payload.current_stock  # type: ignore[assignment]
         inventory.cbu_in_hand = payload.cbu_in_hand  # type: ignore[assignment]
@@ -113,9 +119,20 @@ def update_inventory(payload: InventoryUpdate, db: Session = Depends(get_db)):
         )
         db.add(inventory)
     
+    InventoryLedger(db).record(
+        payload.product_id, payload.current_stock - previous_stock, "adjustment", reference="inventory_update"  # type: ignore[operator]
+    )
+    
     db.commit()
     db.refresh(inventory)
     
+    publish_event("inventory_updated", {
+        "product_id": inventory.product_id,
+        "current_stock": inventory.current_stock,
+        "cbu_in_hand": inventory.cbu_in_hand,
+        "kits_in_factory": inventory.kits_in_factory
+    })
+    
     return {
         "id": inventory.id,
         "product_id": inventory.product_id,
@@ -160,24 +177,30 @@ def update_product_config(payload: ProductConfigUpdate, db: Session = Depends(ge
 # POST: Subtract from inventory
 @router.post("/subtract")
 def subtract_inventory(payload: InventorySubtract, db: Session = Depends(get_db)):
-    """Subtract quantity from inventory (for sales)"""
-    inventory = db.query(Inventory).filter(Inventory.product_id == payload.product_id).first()
-    if not inventory:  # type: ignore[truthy-function]
-        raise HTTPException(status_code=404, detail="Inventory record not found")
-    
-    current_stock: int = inventory.current_stock or 0  # type: ignore
-    if current_stock < payload.quantity:
+    """Subtract quantity from inventory (for sales) - checked and written in one UPDATE"""
+    remaining_stock = InventoryLedger(db).adjust(
+        payload.product_id, -payload.quantity, "adjustment", reference="inventory_subtract"
+    )
+    if remaining_stock is None:
+        current_stock = get_stock(db, payload.product_id)
+        if current_stock is None:
+            raise HTTPException(status_code=404, detail="Inventory record not found")
         raise HTTPException(
             status_code=400, 
             detail=f"Insufficient stock. Available: {current_stock}, Requested: {payload.quantity}"
         )
     
-    inventory.current_stock = current_stock - payload.quantity  # type: ignore[assignment]
     db.commit()
     
+    publish_event("inventory_updated", {
+        "product_id": payload.product_id,
+        "current_stock": remaining_stock,
+        "quantity_change": -payload.quantity
+    })
+    
     return {
         "message": "Inventory subtracted successfully",
-        "remaining_stock": inventory.current_stock
+        "remaining_stock": remaining_stock
     }
 
 # GET: Low stock alerts
@@ -204,6 +227,69 @@ def get_low_stock_alerts(db: Session = Depends(get_db)):
         for inv, product in low_stock_items
     ]
 
+# GET: Stock of a product on a past date (from the inventory ledger)
+@router.get("/ledger/stock-at")
+def get_stock_at_date(
+    product_id: int = Query(..., description="Product ID"),
+    as_of: date = Query(..., description="Date (YYYY-MM-DD); stock at the end of that day"),
+    db: Session = Depends(get_db)
+):
+    """Closing stock on a date: latest ledger snapshot plus the movements after it"""
+    stock = InventoryLedger(db).stock_at(product_id, as_of)
+    if stock is None:
+        raise HTTPException(status_code=404, detail="No stock history for this product on that date")
+    return {"product_id": product_id, "as_of": as_of.isoformat(), "stock": stock}
+
+# GET: Stock movements of a product
+@router.get("/ledger/movements")
+def get_stock_movements(
+    product_id: int = Query(..., description="Product ID"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """Inventory ledger entries of a product, newest first"""
+    movements = InventoryLedger(db).get_movements(product_id, start_date, end_date, limit)
+    return [
+        {
+            "id": movement.id,
+            "movement_date": movement.movement_date.isoformat(),  # type: ignore[union-attr]
+            "quantity": movement.quantity,
+            "movement_type": movement.movement_type,
+            "reference": movement.reference,
+            "created_at": movement.created_at.isoformat() if movement.created_at is not None else None  # type: ignore[union-attr]
+        }
+        for movement in movements
+    ]
+
+# POST: Snapshot closing stock of every product (periodic job)
+@router.post("/ledger/snapshots")
+def take_stock_snapshots(
+    as_of: Optional[date] = Query(None, description="Snapshot date (default: end of the previous month)"),
+    db: Session = Depends(get_db)
+):
+    """Write per-product closing stock rows used as starting points by stock-at-date queries"""
+    return InventoryLedger(db).take_snapshots(as_of)
+
+# POST: Rebuild current stock from the ledger (batch job)
+@router.post("/ledger/rebuild")
+def rebuild_stock_from_ledger(
+    dry_run: bool = Query(False, description="Only report drift, do not correct it"),
+    db: Session = Depends(get_db)
+):
+    """Recompute current_stock as the sum of each product's movements and report drift"""
+    result = InventoryLedger(db).rebuild_current_stock(dry_run=dry_run)
+    
+    if not dry_run:
+        for drifted in result["products"]:
+            publish_event("inventory_updated", {
+                "product_id": drifted["product_id"],
+                "current_stock": drifted["ledger_stock"]
+            })
+    
+    return result
+
 # DELETE: Remove inventory record
 @router.delete("/{product_id}")
 def delete_inventory_record(product_id: int, db: Session = Depends(get_db)):
@@ -212,8 +298,11 @@ def delete_inventory_record(product_id: int, db: Session = Depends(get_db)):
     if not inventory:
         raise HTTPException(status_code=404, detail="Inventory record not found")
     
+    InventoryLedger(db).record(product_id, -(inventory.current_stock or 0), "adjustment", reference="inventory_delete")  # type: ignore[operator]
     db.delete(inventory)
     db.commit()
+    
+    publish_event("inventory_updated", {"product_id": product_id, "current_stock": None, "deleted": True})
     return {"message": "Inventory record deleted successfully"}
 
 # GET: Calculate monthly PSI (Excel Sheet 2)
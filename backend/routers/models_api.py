@@ -5,10 +5,12 @@ from typing import List, Optional
 from database import get_db
 from models import ProductModel
 import schemas
+from utils.dashboard_snapshot import mark_dashboard_stale
 
 router = APIRouter(
     prefix="/models",
-    tags=["models"]
+    tags=["models"],
+    dependencies=[Depends(mark_dashboard_stale)]
 )
 
 # Pydantic model for request
@@ -21,6 +23,8 @@ class ProductModelCreate(BaseModel):
     safety_stock_days: int = 45
     safety_threshold_percentage: float = 20.0  # Safety stock as % of current inventory
     lead_time_weeks: int = 10  # Lead time in weeks
+    kit_volume_cbm: Optional[float] = None  # Packed kit volume per unit (m³)
+    kit_weight_kg: Optional[float] = None  # Packed kit weight per unit (kg)
 
 @router.post("")
 def create_model(payload: ProductModelCreate, db: Session = Depends(get_db)):
@@ -45,7 +49,9 @@ def create_model(payload: ProductModelCreate, db: Session = Depends(get_db)):
             remarks=payload.remarks.strip() if payload.remarks and payload.remarks.strip() else None,  # Handle empty strings
             safety_stock_days=payload.safety_stock_days,
             safety_threshold_percentage=payload.safety_threshold_percentage,
-            lead_time_weeks=payload.lead_time_weeks
+            lead_time_weeks=payload.lead_time_weeks,
+            kit_volume_cbm=payload.kit_volume_cbm,
+            kit_weight_kg=payload.kit_weight_kg
         )
         db.add(new_model)
         db.flush()  # Flush to get the ID without committing
@@ -76,6 +82,8 @@ def create_model(payload: ProductModelCreate, db: Session = Depends(get_db)):
             "safety_stock_days": new_model.safety_stock_days,
             "safety_threshold_percentage": new_model.safety_threshold_percentage,  # type: ignore
             "lead_time_weeks": new_model.lead_time_weeks,  # type: ignore
+            "kit_volume_cbm": new_model.kit_volume_cbm,
+            "kit_weight_kg": new_model.kit_weight_kg,
             "is_active": new_model.is_active
         }
     except HTTPException:
@@ -108,6 +116,8 @@ def list_models(
             "safety_stock_days": m.safety_stock_days,
             "safety_threshold_percentage": m.safety_threshold_percentage if m.safety_threshold_percentage is not None else 20.0,  # type: ignore
             "lead_time_weeks": m.lead_time_weeks if m.lead_time_weeks is not None else 10,  # type: ignore
+            "kit_volume_cbm": m.kit_volume_cbm,
+            "kit_weight_kg": m.kit_weight_kg,
             "is_active": m.is_active,
             "created_at": m.created_at.isoformat() if m.created_at is not None else None  # type: ignore[union-attr]
         }
@@ -146,6 +156,11 @@ def update_model(model_id: int, payload: ProductModelCreate, db: Session = Depen
         model.safety_stock_days = payload.safety_stock_days  # type: ignore[assignment]
         model.safety_threshold_percentage = payload.safety_threshold_percentage  # type: ignore[assignment]
         model.lead_time_weeks = payload.lead_time_weeks  # type: ignore[assignment]
+        # Kit attributes only when sent - clients that predate them must not clear them
+        sent = payload.dict(exclude_unset=True)
+        for field in ("kit_volume_cbm", "kit_weight_kg"):
+            if field in sent:
+                setattr(model, field, sent[field])
         
         db.commit()
         db.refresh(model)
@@ -160,6 +175,8 @@ def update_model(model_id: int, payload: ProductModelCreate, db: Session = Depen
             "safety_stock_days": model.safety_stock_days,
             "safety_threshold_percentage": model.safety_threshold_percentage,  # type: ignore
             "lead_time_weeks": model.lead_time_weeks,  # type: ignore
+            "kit_volume_cbm": model.kit_volume_cbm,
+            "kit_weight_kg": model.kit_weight_kg,
             "is_active": model.is_active
         }
     except HTTPException:
@@ -196,6 +213,8 @@ def get_model(model_id: int, db: Session = Depends(get_db)):
         "safety_stock_days": model.safety_stock_days,
         "safety_threshold_percentage": model.safety_threshold_percentage if model.safety_threshold_percentage is not None else 20.0,  # type: ignore
         "lead_time_weeks": model.lead_time_weeks if model.lead_time_weeks is not None else 10,  # type: ignore
+        "kit_volume_cbm": model.kit_volume_cbm,
+        "kit_weight_kg": model.kit_weight_kg,
         "is_active": model.is_active,
         "created_at": model.created_at.isoformat() if model.created_at is not None else None  # type: ignore[union-attr]
     }
\ No newline at end of file
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import date, timedelta
 from database import get_db
 from models import PurchaseOrder, ProductModel, Inventory, SalesRecord
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from config import settings
+from utils.po_numbers import PONumberAllocator
+from utils.lead_times import LeadTimeLearner
+from utils.dashboard_snapshot import mark_dashboard_stale
+from utils.stage_counts import stage_counts, stage_key
+from utils.events import publish_event, publish_po_stage_changed
+from utils.idempotency import idempotency_store
+from utils.po_weekly_totals import POWeeklyTotals
+from utils.columnar import RESPONSE_FORMATS, columnar_response, isoformat_or_none
 
 router = APIRouter(
     prefix="/purchase",
-    tags=["purchase"]
+    tags=["purchase"],
+    dependencies=[Depends(mark_dashboard_stale)]
 )
 
 class PurchaseOrderCreate(BaseModel):
@@ -24,6 +33,9 @@ class PurchaseOrderCreate(BaseModel):
     stage: Optional[str] = None
     notes: Optional[str] = None
 
+class PurchaseOrderBulkCreate(BaseModel):
+    purchase_orders: List[PurchaseOrderCreate]
+
 class PurchaseOrderUpdate(BaseModel):
     quantity: Optional[int] = None
     status: Optional[str] = None
@@ -39,15 +51,51 @@ class ForecastRequest(BaseModel):
 class MessageResponse(BaseModel):
     message: str
 
+# Fields of the list response, in order, for format=columnar
+PO_COLUMNS = {
+    "id": PurchaseOrder.id,
+    "po_number": PurchaseOrder.po_number,
+    "product_id": PurchaseOrder.product_id,
+    "product_name": ProductModel.name,
+    "product_sku": ProductModel.sku,
+    "quantity": PurchaseOrder.quantity,
+    "forecasted_quantity": PurchaseOrder.forecasted_quantity,
+    "order_week": PurchaseOrder.order_week,
+    "order_date": PurchaseOrder.order_date,
+    "expected_delivery_week": PurchaseOrder.expected_delivery_week,
+    "etd": PurchaseOrder.etd,
+    "eta": PurchaseOrder.eta,
+    "status": PurchaseOrder.status,
+    "shipping_mode": PurchaseOrder.shipping_mode,
+    "stage": PurchaseOrder.stage,
+    "stage_updated_at": PurchaseOrder.stage_updated_at,
+    "notes": PurchaseOrder.notes,
+    "container_ref": PurchaseOrder.container_ref,
+    "created_at": PurchaseOrder.created_at,
+    "updated_at": PurchaseOrder.updated_at
+}
+PO_DATE_COLUMNS = [
+    "order_week", "order_date", "expected_delivery_week", "etd", "eta",
+    "stage_updated_at", "created_at", "updated_at"
+]
+
 # GET: List all purchase orders
 @router.get("")
 def list_purchase_orders(
     status: Optional[str] = None,
     product_id: Optional[int] = None,
     stage: Optional[str] = None,  # Filter by stage
+    response_format: str = Query("rows", alias="format"),
     db: Session = Depends(get_db)
 ):
-    """Get all purchase orders with filtering by status, product, or stage"""
+    """
+    Get all purchase orders with filtering by status, product, or stage
+    format=columnar returns one array per field, with SKU, status, shipping mode and
+    stage dictionary-encoded
+    """
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+    
     query = db.query(PurchaseOrder, ProductModel).join(
         ProductModel, PurchaseOrder.product_id == ProductModel.id
     ).filter(ProductModel.is_active == True)
@@ -59,6 +107,15 @@ def list_purchase_orders(
     if stage:
         query = query.filter(PurchaseOrder.stage == stage)
     
+    if response_format == "columnar":
+        rows = query.with_entities(*PO_COLUMNS.values()).order_by(PurchaseOrder.order_week.desc()).all()
+        return columnar_response(
+            list(PO_COLUMNS),
+            rows,
+            encoded=["product_name", "product_sku", "status", "shipping_mode", "stage"],
+            converters={name: isoformat_or_none for name in PO_DATE_COLUMNS}
+        )
+    
     pos = query.order_by(PurchaseOrder.order_week.desc()).all()
     
     return [
@@ -80,16 +137,72 @@ def list_purchase_orders(
             "stage": po.stage,
             "stage_updated_at": po.stage_updated_at.isoformat() if po.stage_updated_at is not None else None,  # type: ignore[union-attr]
             "notes": po.notes,
+            "container_ref": po.container_ref,
             "created_at": po.created_at.isoformat() if po.created_at is not None else None,  # type: ignore[union-attr]
             "updated_at": po.updated_at.isoformat() if po.updated_at is not None else None  # type: ignore[union-attr]
         }
         for po, product in pos
     ]
 
+MAX_BULK_PURCHASE_ORDERS = 1000
+
+def calculate_etd_eta(order_week: date, etd: Optional[date], eta: Optional[date]) -> Tuple[date, date]:
+    """
+    Fill in ETD and ETA based on Excel Sheet 1 business logic
+    Lead time breakdown:
+    - Order placement: 28 days before ETD (ORDER_TO_ETD_DAYS)
+    - ETD to ETA: 45 days shipping + 10 days customs + 15 days production = 70 days (LEAD_TIME_DAYS)
+    """
+    # If ETD not provided, calculate from order_week + 28 days (order placement time)
+    if etd is None:
+        etd = order_week + timedelta(days=settings.ORDER_TO_ETD_DAYS)
+    
+    # If ETA not provided, calculate from ETD + lead time (shipping + customs + production)
+    if eta is None:
+        eta = etd + timedelta(days=settings.LEAD_TIME_DAYS)
+    
+    return etd, eta
+
+def purchase_order_values(item: PurchaseOrderCreate, po_number: str) -> dict:
+    """Column values of a new PO - /create and /bulk-create apply the same defaults"""
+    etd, eta = calculate_etd_eta(item.order_week, item.etd, item.eta)
+    return {
+        "product_id": item.product_id,
+        "po_number": po_number,
+        "quantity": item.quantity,
+        "order_week": item.order_week,
+        "etd": etd,
+        "eta": eta,
+        "status": item.status,
+        "shipping_mode": item.shipping_mode,
+        "stage": item.stage if item.stage is not None else "CKD Prepared",
+        "notes": item.notes
+    }
+
+def sync_created_purchase_orders(db: Session, pos: List[PurchaseOrder]) -> None:
+    """
+    Bookkeeping after inserting POs, shared by /create and /bulk-create: weekly totals,
+    and learned lead times for POs created as delivered. Does not commit.
+    """
+    POWeeklyTotals(db).refresh_weeks(po.order_week for po in pos)  # type: ignore[arg-type]
+    delivered = [po for po in pos if po.status == 'delivered']  # type: ignore
+    if delivered:
+        LeadTimeLearner(db).sync_purchase_orders(delivered)
+
 # POST: Create purchase order
 @router.post("/create")
-def create_purchase_order(payload: PurchaseOrderCreate, db: Session = Depends(get_db)):
+def create_purchase_order(
+    payload: PurchaseOrderCreate,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key return the first response"),
+    db: Session = Depends(get_db)
+):
     """Create a new purchase order"""
+    return idempotency_store.run(
+        "POST /purchase/create", idempotency_key, payload, lambda: insert_purchase_order(payload, db)
+    )
+
+def insert_purchase_order(payload: PurchaseOrderCreate, db: Session):
+    """Create one purchase order (POST /purchase/create without an already answered Idempotency-Key)"""
     # Check if product exists
     product = db.query(ProductModel).filter(
         ProductModel.id == payload.product_id,
@@ -98,45 +211,22 @@ def create_purchase_order(payload: PurchaseOrderCreate, db: Session = Depends(ge
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Generate PO number automatically
-    po_number = f"PO-{date.today().strftime('%Y%m%d')}-{payload.product_id:04d}"
+    # Generate PO number automatically (reserved from the PO sequence)
+    po_number = PONumberAllocator(db).allocate(1)[0]
     
-    # Calculate ETD and ETA based on Excel Sheet 1 business logic
-    # Lead time breakdown:
-    # - Order placement: 28 days before ETD (ORDER_ADVANCE_DAYS)
-    # - Shipping: 45 days (SHIPPING_DAYS)
-    # - Total order to ETD: 28 days (order_week to etd)
-    # - ETD to ETA: 45 days shipping + 10 days customs + 15 days production = 70 days
-    
-    # If ETD not provided, calculate from order_week + 28 days (order placement time)
-    if payload.etd is None:
-        etd = payload.order_week + timedelta(days=28)  # 28 days after order placement
-    else:
-        etd = payload.etd
-    
-    # If ETA not provided, calculate from ETD + lead time (shipping + customs + production)
-    if payload.eta is None:
-        eta = etd + timedelta(days=settings.LEAD_TIME_DAYS) if etd else None
-    else:
-        eta = payload.eta
-    
-    po = PurchaseOrder(
-        product_id=payload.product_id,
-        po_number=po_number,
-        quantity=payload.quantity,
-        order_week=payload.order_week,
-        etd=etd,
-        eta=eta,
-        status=payload.status,
-        shipping_mode=payload.shipping_mode,
-        stage=payload.stage,
-        notes=payload.notes
-    )
+    po = PurchaseOrder(**purchase_order_values(payload, po_number))
     
     db.add(po)
+    db.flush()
+    sync_created_purchase_orders(db, [po])
+    changes = [(None, stage_key(po))]
+    token = stage_counts.token()
     db.commit()
+    stage_counts.apply_changes(token, changes)
     db.refresh(po)
     
+    publish_event("po_generated", {"source": "manual", "count": 1, "po_ids": [po.id]})
+    
     return {
         "id": po.id,
         "po_number": po.po_number,
@@ -152,6 +242,77 @@ def create_purchase_order(payload: PurchaseOrderCreate, db: Session = Depends(ge
         "notes": po.notes
     }
 
+# POST: Create many purchase orders in one transaction (e.g. a whole container manifest)
+@router.post("/bulk-create")
+def bulk_create_purchase_orders(payload: PurchaseOrderBulkCreate, db: Session = Depends(get_db)):
+    """
+    Create many purchase orders at once
+    PO numbers are reserved as one block from the PO sequence and all rows are
+    inserted in a single transaction - either every PO is created or none is.
+    """
+    items = payload.purchase_orders
+    if not items:
+        raise HTTPException(status_code=400, detail="No purchase orders provided")
+    if len(items) > MAX_BULK_PURCHASE_ORDERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many purchase orders. Maximum per request: {MAX_BULK_PURCHASE_ORDERS}"
+        )
+    
+    # Validate all products with one query
+    product_ids = {item.product_id for item in items}
+    products = {
+        product.id: product
+        for product in db.query(ProductModel).filter(
+            ProductModel.id.in_(product_ids),
+            ProductModel.is_active == True
+        ).all()
+    }
+    missing = sorted(product_ids - set(products.keys()))
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Product not found: {', '.join(str(product_id) for product_id in missing)}"
+        )
+    
+    try:
+        po_numbers = PONumberAllocator(db).allocate(len(items))
+        
+        rows = [purchase_order_values(item, po_number) for item, po_number in zip(items, po_numbers)]
+        
+        created_ids = db.execute(
+            insert(PurchaseOrder).returning(PurchaseOrder.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        sync_created_purchase_orders(db, db.query(PurchaseOrder).filter(PurchaseOrder.id.in_(created_ids)).all())
+        db.commit()
+        stage_counts.invalidate()
+        publish_event("po_generated", {"source": "bulk", "count": len(created_ids)})
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create purchase orders: {str(e)}")
+    
+    return {
+        "created_count": len(created_ids),
+        "purchase_orders": [
+            {
+                "id": po_id,
+                "po_number": row["po_number"],
+                "product_id": row["product_id"],
+                "product_name": products[row["product_id"]].name,
+                "quantity": row["quantity"],
+                "order_week": row["order_week"].isoformat(),
+                "etd": row["etd"].isoformat(),
+                "eta": row["eta"].isoformat(),
+                "status": row["status"],
+                "shipping_mode": row["shipping_mode"],
+                "stage": row["stage"],
+                "notes": row["notes"]
+            }
+            for po_id, row in zip(created_ids, rows)
+        ]
+    }
+
 # GET: Forecast purchase order suggestions based on SALES DATA and INVENTORY
 @router.get("/forecast")
 def forecast_purchase_order(
@@ -228,17 +389,32 @@ def update_purchase_order(po_id: int, payload: PurchaseOrderUpdate, db: Session
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
+    before = stage_key(po)
+    
     # Update fields if provided
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(po, field, value)
     
-    # If stage is being updated, record the timestamp
-    if payload.stage is not None:
+    # If stage is being updated (or the PO is delivered), record the timestamp
+    if payload.stage is not None or payload.status == "delivered":
         po.stage_updated_at = datetime.now()  # type: ignore[assignment]
     
+    # Keep learned lead times current as POs are delivered
+    if payload.status is not None:
+        LeadTimeLearner(db).sync_purchase_order(po)
+    
+    if payload.quantity is not None:
+        POWeeklyTotals(db).refresh_weeks([po.order_week])  # type: ignore[list-item]
+    
+    changes = [(before, stage_key(po))]
+    token = stage_counts.token()
     db.commit()
+    stage_counts.apply_changes(token, changes)
     db.refresh(po)
     
+    if changes[0][0] != changes[0][1]:
+        publish_po_stage_changed(po, changes[0][0])
+    
     return {
         "id": po.id,
         "po_number": po.po_number,
@@ -275,14 +451,20 @@ def update_po_stage(
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
+    before = stage_key(po)
     po.stage = stage  # type: ignore[assignment]
     po.stage_updated_at = datetime.now()  # type: ignore[assignment]
     if notes:
         po.notes = notes  # type: ignore[assignment]
     
+    changes = [(before, stage_key(po))]
+    token = stage_counts.token()
     db.commit()
+    stage_counts.apply_changes(token, changes)
     db.refresh(po)
     
+    publish_po_stage_changed(po, before)
+    
     return {
         "id": po.id,
         "po_number": po.po_number,
@@ -295,6 +477,7 @@ def update_po_stage(
 @router.post("/generate-weekly")
 def generate_weekly_pos(
     order_week: Optional[date] = Query(None, description="Order week (Saturday). If not provided, uses current week"),
+    refresh: bool = Query(False, description="Recalculate existing POs for this week that are still 'suggested'"),
     db: Session = Depends(get_db)
 ):
     """Generate weekly purchase orders for all products (runs on Saturday)"""
@@ -302,7 +485,14 @@ def generate_weekly_pos(
     
     generator = WeeklyPOGenerator(db)
     # order_week can be None, the function handles it
-    result = generator.generate_weekly_pos(order_week)  # type: ignore[arg-type]
+    result = generator.generate_weekly_pos(order_week, refresh=refresh)  # type: ignore[arg-type]
+    
+    publish_event("po_generated", {
+        "source": "weekly",
+        "order_week": result["order_week"],
+        "count": result["generated_count"],
+        "skipped_count": result["skipped_count"]
+    })
     
     return result
 
@@ -319,8 +509,115 @@ def generate_annual_pos(
     # year can be None, the function handles it
     result = generator.generate_annual_pos(year)  # type: ignore[arg-type]
     
+    publish_event("po_generated", {
+        "source": "annual",
+        "year": result["year"],
+        "count": sum(week["generated_count"] for week in result["results"])
+    })
+    
     return result
 
+# GET: Container plan for a week's suggested POs
+@router.get("/consolidation")
+def get_container_plan(
+    order_week: Optional[date] = Query(None, description="Order week (Saturday). If not provided, uses current week"),
+    db: Session = Depends(get_db)
+):
+    """Pack the week's suggested POs into containers using per-SKU kit volume/weight (read only)"""
+    from utils.container_consolidation import ContainerConsolidator
+    from utils.weekly_po_generator import WeeklyPOGenerator
+    
+    if order_week is None:
+        order_week = WeeklyPOGenerator(db).get_current_week_saturday()
+    
+    return ContainerConsolidator(db).plan_containers(order_week)
+
+# POST: Consolidate a week's suggested POs into containers and push them to shipments
+@router.post("/consolidation")
+def consolidate_purchase_orders(
+    order_week: Optional[date] = Query(None, description="Order week (Saturday). If not provided, uses current week"),
+    db: Session = Depends(get_db)
+):
+    """Consolidate suggested POs into containers; each container line becomes an ordered PO"""
+    from utils.container_consolidation import ContainerConsolidator
+    from utils.weekly_po_generator import WeeklyPOGenerator
+    
+    if order_week is None:
+        order_week = WeeklyPOGenerator(db).get_current_week_saturday()
+    
+    return ContainerConsolidator(db).push_to_shipments(order_week)
+
+# GET: Learned lead-time statistics
+@router.get("/lead-times")
+def get_learned_lead_times(db: Session = Depends(get_db)):
+    """Get learned lead-time statistics (median, P90) per SKU and per shipping mode"""
+    from models import LeadTimeStat
+    
+    stats = db.query(LeadTimeStat, ProductModel).outerjoin(
+        ProductModel, LeadTimeStat.product_id == ProductModel.id
+    ).order_by(LeadTimeStat.shipping_mode, LeadTimeStat.product_id).all()
+    
+    return [
+        {
+            "product_id": stat.product_id,
+            "product_sku": product.sku if product else None,
+            "shipping_mode": stat.shipping_mode,
+            "sample_count": stat.sample_count,
+            "mean_days": stat.mean_days,
+            "median_days": stat.median_days,
+            "p90_days": stat.p90_days,
+            "manual_lead_time_weeks": product.lead_time_weeks if product else None,
+            "updated_at": stat.updated_at.isoformat() if stat.updated_at is not None else None  # type: ignore[union-attr]
+        }
+        for stat, product in stats
+    ]
+
+# POST: Rebuild learned lead times from delivered PO history
+@router.post("/lead-times/rebuild")
+def rebuild_learned_lead_times(db: Session = Depends(get_db)):
+    """Recompute learned lead-time statistics from all delivered POs (batch job)"""
+    return LeadTimeLearner(db).rebuild()
+
+# POST: Rebuild the weekly PO totals behind the forecast-vs-actual chart
+@router.post("/weekly-totals/rebuild")
+def rebuild_po_weekly_totals(db: Session = Depends(get_db)):
+    """Recompute po_weekly_totals from all purchase orders (batch job)"""
+    return {"rows": POWeeklyTotals(db).rebuild()}
+
+# GET: Replay the weekly PO policy over historical sales
+@router.get("/policy-replay")
+def replay_po_policy(
+    start_date: date = Query(..., description="First day of the replay"),
+    end_date: date = Query(..., description="Last day of the replay"),
+    initial_weeks_of_cover: Optional[float] = Query(None, description="Opening stock in weeks of average sales (default: each SKU's lead time)"),
+    carrying_cost_per_unit_week: float = Query(0.0, description="Holding cost per unit per week"),
+    db: Session = Depends(get_db)
+):
+    """
+    Simulate how the weekly PO rule would have performed over actual sales
+    Reports stockout weeks, average DOS and inventory carrying per SKU
+    """
+    from datetime import timedelta
+    from utils.policy_replay import PolicyReplaySimulator
+    from utils.sales_archive import SalesArchive
+    
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if end_date > date.today():
+        raise HTTPException(status_code=400, detail="Replay range must be in the past")
+    # Archived months only have monthly totals - weekly demand would read as zero
+    archived_before = SalesArchive(db).archived_before()
+    first_monday = start_date - timedelta(days=start_date.weekday())
+    if archived_before is not None and first_monday < archived_before:
+        earliest = archived_before + timedelta(days=-archived_before.weekday() % 7)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Sales before {archived_before.isoformat()} are archived; start the replay on {earliest.isoformat()} or later"
+        )
+    
+    simulator = PolicyReplaySimulator(db)
+    return simulator.run(start_date, end_date, initial_weeks_of_cover, carrying_cost_per_unit_week)
+
 # GET: Get PO timeline data
 @router.get("/{po_id}/timeline")
 def get_po_timeline(po_id: int, db: Session = Depends(get_db)):
@@ -391,6 +688,12 @@ def delete_purchase_order(po_id: int, db: Session = Depends(get_db)):
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
+    LeadTimeLearner(db).remove_purchase_order(po)
+    before = stage_key(po)
+    order_week = po.order_week
     db.delete(po)
+    POWeeklyTotals(db).refresh_weeks([order_week])  # type: ignore[list-item]
+    token = stage_counts.token()
     db.commit()
+    stage_counts.apply_changes(token, [(before, None)])
     return {"message": "Purchase order deleted successfully"}
\ No newline at end of file
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 from database import get_db
-from models import SalesRecord, Inventory, ProductModel
+from models import SalesRecord, SalesDailyTotal, ArchivedSalesRecord, ProductModel
+from config import settings
+from utils.dashboard_snapshot import mark_dashboard_stale
+from utils.events import publish_event
+from utils.idempotency import idempotency_store
+from utils.inventory_ledger import InventoryLedger
+from utils.columnar import RESPONSE_FORMATS, columnar_payload, isoformat_or_none
+from utils.pagination import NEXT_CURSOR_HEADER, keyset_page
+from utils.sales_archive import SalesArchive
+from utils.sales_daily import SalesDailyTotals
+from utils.sales_import import IMPORT_FORMATS, SalesImporter
+from utils.sales_summary import SalesSummary
+from utils.sales_writer import InsufficientStock, sales_write_behind, write_sale
+from utils.stock import adjust_stock, get_stock
 
 router = APIRouter(
     prefix="/sales",
-    tags=["sales"]
+    tags=["sales"],
+    dependencies=[Depends(mark_dashboard_stale)]
 )
 
 # Pydantic models
@@ -29,8 +44,16 @@ class MessageResponse(BaseModel):
 
 # POST: Add sales record
 @router.post("")
-def add_sale(payload: SalesCreate, db: Session = Depends(get_db)):
+def add_sale(
+    payload: SalesCreate,
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key return the first response"),
+    db: Session = Depends(get_db)
+):
     """Add a new sales record and update inventory. Sales only allowed on weekdays (Mon-Fri)."""
+    return idempotency_store.run("POST /sales", idempotency_key, payload, lambda: record_sale(payload, db))
+
+def record_sale(payload: SalesCreate, db: Session):
+    """Validate and write one sale (POST /sales without an already answered Idempotency-Key)"""
     from datetime import datetime
     
     # Set default sale date to today if not provided
@@ -54,36 +77,54 @@ def add_sale(payload: SalesCreate, db: Session = Depends(get_db)):
     if not product:
         raise HTTPException(status_code=404, detail="Product not found or inactive")
     
-    # Check inventory if we're subtracting stock
-    inventory = db.query(Inventory).filter(Inventory.product_id == payload.product_id).first()
-    if not inventory:
-        # Create inventory record if it doesn't exist
-        inventory = Inventory(product_id=payload.product_id, current_stock=0)
-        db.add(inventory)
-        db.flush()
+    # Write-behind mode: validated against cached stock, committed with other queued sales
+    if settings.SALES_WRITE_BEHIND:
+        try:
+            written = sales_write_behind.submit(
+                db, payload.product_id, payload.quantity, payload.sale_date, payload.channel
+            ).result()
+        except InsufficientStock as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        publish_event("sale_recorded", {
+            "sale_id": written["id"],
+            "product_id": written["product_id"],
+            "quantity": written["quantity"],
+            "sale_date": written["sale_date"].isoformat(),
+            "channel": written["channel"],
+            "current_stock": written["current_stock"]
+        })
+        
+        return {
+            "id": written["id"],
+            "product_id": written["product_id"],
+            "product_name": product.name,
+            "quantity": written["quantity"],
+            "sale_date": written["sale_date"].isoformat(),
+            "channel": written["channel"],
+            "created_at": written["created_at"].isoformat() if written["created_at"] else None
+        }
     
-    if inventory.current_stock < payload.quantity:  # type: ignore
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Insufficient stock. Available: {inventory.current_stock}, Requested: {payload.quantity}"
+    # Subtract sold quantity - check and write in one UPDATE, so concurrent sales cannot oversell
+    try:
+        sale, remaining_stock = write_sale(
+            db, payload.product_id, payload.quantity, payload.sale_date, payload.channel
         )
-    
-    # Create sales record
-    sale = SalesRecord(
-        product_id=payload.product_id,
-        quantity=payload.quantity,
-        sale_date=payload.sale_date,
-        channel=payload.channel
-    )
-    db.add(sale)
-    
-    # Update inventory (subtract sold quantity) - auto-reduce inventory
-    inventory.current_stock -= payload.quantity  # type: ignore[assignment]
-    inventory.last_updated = func.now()  # type: ignore[assignment]
+    except InsufficientStock as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     db.commit()
     db.refresh(sale)
     
+    publish_event("sale_recorded", {
+        "sale_id": sale.id,
+        "product_id": sale.product_id,
+        "quantity": sale.quantity,
+        "sale_date": sale.sale_date.isoformat(),
+        "channel": sale.channel,
+        "current_stock": remaining_stock
+    })
+    
     return {
         "id": sale.id,
         "product_id": sale.product_id,
@@ -94,19 +135,121 @@ def add_sale(payload: SalesCreate, db: Session = Depends(get_db)):
             "created_at": sale.created_at.isoformat() if sale.created_at else None  # type: ignore
     }
 
+# POST: Bulk import sales records from CSV / XLSX
+@router.post("/import")
+def import_sales(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Import sales records from a CSV or XLSX file (header row: product_id or sku,
+    quantity, sale_date, optional channel) and subtract them from inventory.
+    Invalid rows are skipped and reported; dry_run only validates.
+    """
+    file_format = (file.filename or "").rsplit(".", 1)[-1].lower()
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"File must be one of: {', '.join('.' + f for f in IMPORT_FORMATS)}")
+    
+    try:
+        result = SalesImporter(db).import_file(file.file, file_format, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if result["imported"] and not dry_run:
+        publish_event("sales_imported", {
+            "imported": result["imported"],
+            "product_ids": [adjustment["product_id"] for adjustment in result["inventory_adjustments"]]
+        })
+    
+    return result
+
+# POST: Archive old sales (batch job)
+@router.post("/archive")
+def archive_sales(
+    keep_months: Optional[int] = Query(None, ge=1, description="Months kept in sales_records (default: SALES_ARCHIVE_AFTER_MONTHS)"),
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Compact sales older than keep_months into per-month totals and move the raw records
+    to the archive database. PSI calculations and the sales export keep reading them.
+    """
+    result = SalesArchive(db).archive(keep_months, dry_run=dry_run)
+    
+    if result["archived_records"] and not dry_run:
+        publish_event("sales_archived", {
+            "cutoff": result["cutoff"],
+            "archived_records": result["archived_records"]
+        })
+    
+    return result
+
+# POST: Rebuild the sales_daily aggregate (batch job)
+@router.post("/daily/rebuild")
+def rebuild_sales_daily(db: Session = Depends(get_db)):
+    """Recompute sales_daily from all sales records (batch job)"""
+    return {"rows": SalesDailyTotals(db).rebuild()}
+
+# Keyset order of sales listings: newest first, id breaking ties within a day
+SALES_PAGE_KEYS = [(SalesRecord.sale_date, date.fromisoformat), (SalesRecord.id, int)]
+
+def sales_page_response(
+    rows: List,
+    columns: List[str],
+    next_cursor: Optional[str],
+    response_format: str,
+    encoded: List[str]
+) -> JSONResponse:
+    """Page of sales rows (tuples in `columns` order) with the next cursor in X-Next-Cursor"""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    converters = {"sale_date": isoformat_or_none, "created_at": isoformat_or_none}
+    
+    if response_format == "columnar":
+        return JSONResponse(
+            {**columnar_payload(columns, rows, encoded=encoded, converters=converters), "next_cursor": next_cursor},
+            headers=headers
+        )
+    
+    date_positions = [columns.index(name) for name in converters]
+    content = []
+    for row in rows:
+        row = list(row)
+        for position in date_positions:
+            row[position] = isoformat_or_none(row[position])
+        content.append(dict(zip(columns, row)))
+    return JSONResponse(content, headers=headers)
+
 # GET: List all sales records
 @router.get("")
 def list_sales(
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=5000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     product_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     channel: Optional[str] = None,
+    response_format: str = Query("rows", alias="format"),
     db: Session = Depends(get_db)
 ):
-    """Get all sales records with filtering options"""
-    query = db.query(SalesRecord)
+    """
+    Get sales records, newest first, with filtering options (format=columnar: one array per field)
+    Page with cursor: pass the X-Next-Cursor header of the previous page (absent on the last page).
+    """
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+    
+    # Product name comes from the join, not a lazy load per row
+    query = db.query(
+        SalesRecord.id,
+        SalesRecord.product_id,
+        func.coalesce(ProductModel.name, "Unknown"),
+        SalesRecord.quantity,
+        SalesRecord.sale_date,
+        SalesRecord.channel,
+        SalesRecord.created_at
+    ).outerjoin(ProductModel, SalesRecord.product_id == ProductModel.id)
     
     # Apply filters
     if product_id:
@@ -118,20 +261,18 @@ def list_sales(
     if channel:
         query = query.filter(SalesRecord.channel == channel)
     
-    sales = query.order_by(SalesRecord.sale_date.desc()).offset(skip).limit(limit).all()
-    
-    return [
-        {
-            "id": s.id,
-            "product_id": s.product_id,
-            "product_name": s.product.name if s.product else "Unknown",
-            "quantity": s.quantity,
-            "sale_date": s.sale_date.isoformat(),
-            "channel": s.channel,
-            "created_at": s.created_at.isoformat() if s.created_at else None  # type: ignore
-        }
-        for s in sales
-    ]
+    try:
+        rows, next_cursor = keyset_page(query, SALES_PAGE_KEYS, cursor, limit, offset=skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return sales_page_response(
+        rows,
+        ["id", "product_id", "product_name", "quantity", "sale_date", "channel", "created_at"],
+        next_cursor,
+        response_format,
+        encoded=["product_name", "channel"]
+    )
 
 # GET: Sales by specific model
 @router.get("/by_model/{model_id}")
@@ -139,36 +280,51 @@ def get_sales_by_model(
     model_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=5000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    response_format: str = Query("rows", alias="format"),
     db: Session = Depends(get_db)
 ):
-    """Get sales records for a specific product model"""
+    """
+    Get sales records for a specific product model, newest first (format=columnar: one array per field)
+    Page with cursor: pass the X-Next-Cursor header of the previous page (absent on the last page).
+    """
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+    
     # Check if product exists
-    product = db.query(ProductModel).filter(
+    product = db.query(ProductModel.id).filter(
         ProductModel.id == model_id,
         ProductModel.is_active == True
     ).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    query = db.query(SalesRecord).filter(SalesRecord.product_id == model_id)
+    query = db.query(
+        SalesRecord.id,
+        SalesRecord.quantity,
+        SalesRecord.sale_date,
+        SalesRecord.channel,
+        SalesRecord.created_at
+    ).filter(SalesRecord.product_id == model_id)
     
     if start_date:
         query = query.filter(SalesRecord.sale_date >= start_date)
     if end_date:
         query = query.filter(SalesRecord.sale_date <= end_date)
     
-    sales = query.order_by(SalesRecord.sale_date.desc()).all()
-    
-    return [
-        {
-            "id": s.id,
-            "quantity": s.quantity,
-            "sale_date": s.sale_date.isoformat(),
-            "channel": s.channel,
-            "created_at": s.created_at.isoformat() if s.created_at else None  # type: ignore
-        }
-        for s in sales
-    ]
+    try:
+        rows, next_cursor = keyset_page(query, SALES_PAGE_KEYS, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return sales_page_response(
+        rows,
+        ["id", "quantity", "sale_date", "channel", "created_at"],
+        next_cursor,
+        response_format,
+        encoded=["channel"]
+    )
 
 # GET: Sales summary by product
 @router.get("/summary")
@@ -177,32 +333,11 @@ def get_sales_summary(
     end_date: Optional[date] = None,
     db: Session = Depends(get_db)
 ):
-    """Get sales summary grouped by product"""
-    query = db.query(
-        SalesRecord.product_id,
-        ProductModel.name,
-        ProductModel.sku,
-        func.sum(SalesRecord.quantity).label('total_quantity'),
-        func.count(SalesRecord.id).label('sales_count')
-    ).join(ProductModel).filter(ProductModel.is_active == True)
-    
-    if start_date:
-        query = query.filter(SalesRecord.sale_date >= start_date)
-    if end_date:
-        query = query.filter(SalesRecord.sale_date <= end_date)
-    
-    summary = query.group_by(SalesRecord.product_id, ProductModel.name, ProductModel.sku).all()
-    
-    return [
-        {
-            "product_id": item.product_id,
-            "product_name": item.name,
-            "sku": item.sku,
-            "total_quantity": item.total_quantity,
-            "sales_count": item.sales_count
-        }
-        for item in summary
-    ]
+    """
+    Get sales summary grouped by product
+    Closed months are read from cached per-month partials (utils/sales_summary.py).
+    """
+    return SalesSummary(db).summary(start_date, end_date)
 
 # GET: Weekly sales data for forecasting
 @router.get("/weekly")
@@ -217,21 +352,32 @@ def get_weekly_sales(
     end_date = date.today()
     start_date = end_date - timedelta(weeks=weeks)
     
-    # This is a simplified version - in production you'd use proper week grouping
-    sales = db.query(SalesRecord).filter(
-        SalesRecord.product_id == product_id,
-        SalesRecord.sale_date >= start_date,
-        SalesRecord.sale_date <= end_date
-    ).order_by(SalesRecord.sale_date).all()
+    # Daily totals: archived days from the archived records, the rest from sales_daily
+    archived = db.query(
+        ArchivedSalesRecord.sale_date,
+        func.sum(ArchivedSalesRecord.quantity)
+    ).filter(
+        ArchivedSalesRecord.product_id == product_id,
+        ArchivedSalesRecord.sale_date >= start_date,
+        ArchivedSalesRecord.sale_date <= end_date
+    ).group_by(ArchivedSalesRecord.sale_date).all()
+    hot = db.query(
+        SalesDailyTotal.sale_date,
+        func.sum(SalesDailyTotal.total_quantity)
+    ).filter(
+        SalesDailyTotal.product_id == product_id,
+        SalesDailyTotal.sale_date >= start_date,
+        SalesDailyTotal.sale_date <= end_date
+    ).group_by(SalesDailyTotal.sale_date).all()
     
     # Group by week (simplified)
     weekly_data = {}
-    for sale in sales:
+    for sale_date, quantity in sorted(archived + hot):
         # Simple week grouping - in real app use proper week numbers
-        week_key = sale.sale_date.isocalendar()[1]  # Week number
+        week_key = sale_date.isocalendar()[1]  # Week number
         if week_key not in weekly_data:
             weekly_data[week_key] = 0
-        weekly_data[week_key] += sale.quantity
+        weekly_data[week_key] += quantity
     
     return {
         "product_id": product_id,
@@ -252,6 +398,8 @@ def update_sale(sale_id: int, payload: SalesUpdate, db: Session = Depends(get_db
     
     # Calculate quantity difference for inventory adjustment
     old_quantity = sale.quantity
+    old_sale_date = sale.sale_date
+    old_channel = sale.channel
     quantity_diff = 0
     
     if payload.quantity is not None and payload.quantity != old_quantity:
@@ -264,18 +412,42 @@ def update_sale(sale_id: int, payload: SalesUpdate, db: Session = Depends(get_db
     if payload.channel is not None:
         sale.channel = payload.channel  # type: ignore
     
-    # Update inventory if quantity changed
+    # Update inventory if quantity changed (products without an inventory record are skipped)
     if quantity_diff != 0:  # type: ignore
-        inventory = db.query(Inventory).filter(Inventory.product_id == sale.product_id).first()
-        if inventory:
-            new_stock = inventory.current_stock - quantity_diff  # type: ignore
-            if new_stock < 0:  # type: ignore
-                raise HTTPException(status_code=400, detail="Inventory would go negative with this update")
-            inventory.current_stock = new_stock  # type: ignore
+        stock_tracked = adjust_stock(db, sale.product_id, -quantity_diff) is not None  # type: ignore
+        if not stock_tracked and get_stock(db, sale.product_id) is not None:  # type: ignore
+            raise HTTPException(status_code=400, detail="Inventory would go negative with this update")
+    else:
+        stock_tracked = sale.sale_date != old_sale_date and get_stock(db, sale.product_id) is not None  # type: ignore
+    
+    # Ledger: reverse the sale as first recorded, then book it with its new quantity and date
+    if stock_tracked:  # type: ignore
+        reference = f"sale:{sale.id}"
+        InventoryLedger(db).record_many([
+            {"product_id": sale.product_id, "quantity": old_quantity, "movement_type": "sale",
+             "movement_date": old_sale_date, "reference": reference},
+            {"product_id": sale.product_id, "quantity": -sale.quantity, "movement_type": "sale",  # type: ignore[operator]
+             "movement_date": sale.sale_date, "reference": reference}
+        ])
+    
+    SalesDailyTotals(db).apply([
+        (sale.product_id, old_sale_date, old_channel, -old_quantity, -1),  # type: ignore[list-item]
+        (sale.product_id, sale.sale_date, sale.channel, sale.quantity, 1)  # type: ignore[list-item]
+    ])
+    SalesSummary(db).invalidate([old_sale_date, sale.sale_date])  # type: ignore[list-item]
     
     db.commit()
     db.refresh(sale)
     
+    publish_event("sale_updated", {
+        "sale_id": sale.id,
+        "product_id": sale.product_id,
+        "quantity": sale.quantity,
+        "quantity_change": quantity_diff,
+        "sale_date": sale.sale_date.isoformat(),
+        "channel": sale.channel
+    })
+    
     return {
         "id": sale.id,
         "product_id": sale.product_id,
@@ -292,12 +464,17 @@ def delete_sales_record(sale_id: int, db: Session = Depends(get_db)):
     if not sale:
         raise HTTPException(status_code=404, detail="Sales record not found")
     
-    # Restore inventory
-    inventory = db.query(Inventory).filter(Inventory.product_id == sale.product_id).first()
-    if inventory:
-        inventory.current_stock += sale.quantity  # type: ignore
+    # Restore inventory (no-op without an inventory record)
+    InventoryLedger(db).adjust(
+        sale.product_id, sale.quantity, "sale", sale.sale_date, reference=f"sale:{sale.id}"  # type: ignore[arg-type]
+    )
     
+    deleted = {"sale_id": sale.id, "product_id": sale.product_id, "quantity": sale.quantity}
+    SalesDailyTotals(db).apply([(sale.product_id, sale.sale_date, sale.channel, -sale.quantity, -1)])  # type: ignore[list-item]
+    SalesSummary(db).invalidate([sale.sale_date])  # type: ignore[list-item]
     db.delete(sale)
     db.commit()
     
+    publish_event("sale_deleted", deleted)
+    
     return {"message": "Sales record deleted successfully and inventory restored"}
\ No newline at end of file
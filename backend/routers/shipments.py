@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import date
 from database import get_db
 from models import PurchaseOrder, ProductModel
+from utils.lead_times import LeadTimeLearner
+from utils.dashboard_snapshot import mark_dashboard_stale
+from utils.stage_counts import stage_counts, stage_key
+from utils.events import publish_po_stage_changed
+from utils.columnar import RESPONSE_FORMATS, columnar_response, isoformat_or_none
 
 router = APIRouter(
     prefix="/shipments",
-    tags=["shipments"]
+    tags=["shipments"],
+    dependencies=[Depends(mark_dashboard_stale)]
 )
 
 class ShipmentUpdate(BaseModel):
@@ -35,9 +42,13 @@ SHIPMENT_STAGES = [
 def list_shipments(
     stage: Optional[str] = None,
     status: Optional[str] = None,
+    response_format: str = Query("rows", alias="format"),
     db: Session = Depends(get_db)
 ):
-    """Get all shipments with tracking information"""
+    """Get all shipments with tracking information (format=columnar: one array per field)"""
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+    
     query = db.query(PurchaseOrder, ProductModel).join(
         ProductModel, PurchaseOrder.product_id == ProductModel.id
     ).filter(ProductModel.is_active == True)
@@ -47,6 +58,32 @@ def list_shipments(
     if status:
         query = query.filter(PurchaseOrder.status == status)
     
+    if response_format == "columnar":
+        rows = query.with_entities(
+            PurchaseOrder.id,
+            PurchaseOrder.po_number,
+            PurchaseOrder.product_id,
+            ProductModel.name,
+            ProductModel.sku,
+            PurchaseOrder.quantity,
+            PurchaseOrder.order_week,
+            PurchaseOrder.etd,
+            PurchaseOrder.eta,
+            PurchaseOrder.status,
+            func.coalesce(PurchaseOrder.stage, "Not Started"),
+            PurchaseOrder.notes,
+            PurchaseOrder.shipping_mode,
+            PurchaseOrder.container_ref,
+            PurchaseOrder.updated_at
+        ).order_by(PurchaseOrder.order_week.desc()).all()
+        return columnar_response(
+            ["id", "po_number", "product_id", "product_name", "product_sku", "quantity", "order_week",
+             "etd", "eta", "status", "current_stage", "notes", "shipping_mode", "container_ref", "updated_at"],
+            rows,
+            encoded=["product_name", "product_sku", "status", "current_stage", "shipping_mode"],
+            converters={name: isoformat_or_none for name in ["order_week", "etd", "eta", "updated_at"]}
+        )
+    
     shipments = query.order_by(PurchaseOrder.order_week.desc()).all()
     
     return [
@@ -64,6 +101,7 @@ def list_shipments(
             "current_stage": po.stage or "Not Started",
             "notes": po.notes,
             "shipping_mode": po.shipping_mode,
+            "container_ref": po.container_ref,
             "updated_at": po.updated_at.isoformat() if po.updated_at else None
         }
         for po, product in shipments
@@ -78,6 +116,8 @@ def update_shipment_stage(
     db: Session = Depends(get_db)
 ):
     """Update shipment stage for a purchase order"""
+    from datetime import datetime
+    
     if stage not in SHIPMENT_STAGES:
         raise HTTPException(
             status_code=400, 
@@ -88,7 +128,9 @@ def update_shipment_stage(
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
+    before = stage_key(po)
     po.stage = stage  # type: ignore
+    po.stage_updated_at = datetime.now()  # type: ignore
     if notes:
         po.notes = notes  # type: ignore
     
@@ -100,9 +142,17 @@ def update_shipment_stage(
     else:
         po.status = "ordered"  # type: ignore
     
+    # Keep learned lead times current as POs are delivered
+    LeadTimeLearner(db).sync_purchase_order(po)
+    
+    changes = [(before, stage_key(po))]
+    token = stage_counts.token()
     db.commit()
+    stage_counts.apply_changes(token, changes)
     db.refresh(po)
     
+    publish_po_stage_changed(po, before)
+    
     return {
         "message": f"Shipment stage updated to {stage}",
         "po_id": po.id,
@@ -111,6 +161,20 @@ def update_shipment_stage(
         "notes": po.notes
     }
 
+# GET: Shipment counts per stage
+@router.get("/stage-counts")
+def get_shipment_stage_counts(
+    status: Optional[List[str]] = Query(None, description="Only count these statuses (repeat for several)"),
+    db: Session = Depends(get_db)
+):
+    """Get the number of POs in each stage, served from the in-memory stage counts"""
+    counts = stage_counts.get_counts(status, db)
+    
+    return {
+        "counts": {(stage or "Not Started"): count for stage, count in counts.items()},
+        "total": sum(counts.values())
+    }
+
 # GET: Shipment status by PO
 @router.get("/status/{po_id}")
 def get_shipment_status(po_id: int, db: Session = Depends(get_db)):
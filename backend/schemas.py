@@ -12,6 +12,8 @@ class ProductBase(BaseModel):
     safety_stock_days: int = 45
     safety_threshold_percentage: float = 20.0  # Safety stock as % of current inventory
     lead_time_weeks: int = 10  # Lead time in weeks
+    kit_volume_cbm: Optional[float] = None  # Packed kit volume per unit (m³)
+    kit_weight_kg: Optional[float] = None  # Packed kit weight per unit (kg)
 
 class ProductCreate(ProductBase):
     pass
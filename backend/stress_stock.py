@@ -0,0 +1,215 @@
+"""
+Stock concurrency stress test
+Hammers one SKU from many threads, with more units requested than there is stock, and
+checks that stock is never oversold. Runs on a scratch SQLite database in a temporary
+directory, once for each way stock is decremented:
+
+    adjust_stock         utils/stock.py conditional UPDATE, one commit per call
+    /inventory/subtract  the endpoint, through the FastAPI test client
+    write-behind         one-unit sales through the SalesWriteBehind queue (utils/sales_writer.py)
+
+Every run must satisfy:
+    final stock == starting stock - accepted decrements
+    stock never negative (sampled while the run is in progress, and at the end)
+    rejected decrements == oversell attempts (attempts beyond the starting stock)
+    sales records written == accepted decrements (write-behind)
+
+Run from the backend directory:
+    python stress_stock.py                                # 16 threads x 40 units, stock 400
+    python stress_stock.py --threads 32 --attempts 50 --stock 1000
+Exits with status 1 if any check fails.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from typing import Callable, Dict, List
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from benchmark_sales_writes import last_weekday
+from database import get_db
+from models import Base, ProductModel, Inventory, SalesRecord
+from utils.dashboard_snapshot import mark_dashboard_stale
+from utils.sales_writer import InsufficientStock, SalesWriteBehind
+from utils.stock import adjust_stock, get_stock
+
+PRODUCT_ID = 1
+
+
+def scratch_database(directory: str, name: str, initial_stock: int) -> sessionmaker:
+    """Fresh database holding one product with `initial_stock` units"""
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name + '.db')}", connect_args={"check_same_thread": False})
+    # Tables of the main database only
+    Base.metadata.create_all(bind=engine, tables=[table for table in Base.metadata.sorted_tables if table.schema is None])
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = session_factory()
+    db.add(ProductModel(id=PRODUCT_ID, sku="STRESS", name="STRESS", shipping_mode="CKD F", status="stress"))
+    db.add(Inventory(product_id=PRODUCT_ID, current_stock=initial_stock))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def hammer(threads: int, attempts: int, decrement: Callable[[], bool], session_factory: sessionmaker) -> Dict:
+    """
+    Run `threads` threads making `attempts` one-unit decrements each while a sampler
+    thread polls the stock; returns accepted/rejected counts and the lowest stock seen
+    """
+    accepted = [0] * threads
+    rejected = [0] * threads
+    lowest: List[int] = []
+    start_barrier = threading.Barrier(threads + 1)
+    done = threading.Event()
+
+    def client(index: int) -> None:
+        start_barrier.wait()
+        for _ in range(attempts):
+            if decrement():
+                accepted[index] += 1
+            else:
+                rejected[index] += 1
+
+    def sampler() -> None:
+        db = session_factory()
+        try:
+            while not done.is_set():
+                lowest.append(get_stock(db, PRODUCT_ID) or 0)
+                db.rollback()
+                done.wait(0.001)
+        finally:
+            db.close()
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+    watcher = threading.Thread(target=sampler)
+    for thread in workers:
+        thread.start()
+    watcher.start()
+    start_barrier.wait()
+    for thread in workers:
+        thread.join()
+    done.set()
+    watcher.join()
+
+    return {"accepted": sum(accepted), "rejected": sum(rejected), "lowest_sampled": min(lowest)}
+
+
+def check(mode: str, result: Dict, session_factory: sessionmaker, stock: int, attempts: int,
+          count_sales: bool = False) -> List[str]:
+    """Failed checks for one run (empty when stock was never oversold)"""
+    db = session_factory()
+    try:
+        final = get_stock(db, PRODUCT_ID) or 0
+        sales = db.query(func.count(SalesRecord.id)).filter(SalesRecord.product_id == PRODUCT_ID).scalar()
+    finally:
+        db.close()
+
+    failures = []
+    if final != stock - result["accepted"]:
+        failures.append(f"final stock {final} != {stock} - {result['accepted']} accepted")
+    if final < 0 or result["lowest_sampled"] < 0:
+        failures.append(f"stock went negative (final {final}, lowest sampled {result['lowest_sampled']})")
+    if result["rejected"] != max(0, attempts - stock):
+        failures.append(f"{result['rejected']} rejected != {max(0, attempts - stock)} oversell attempts")
+    if count_sales and sales != result["accepted"]:
+        failures.append(f"{sales} sales records != {result['accepted']} accepted")
+
+    print(f"{mode:>19}: {result['accepted']} accepted, {result['rejected']} rejected, "
+          f"final stock {final}, lowest sampled {result['lowest_sampled']}"
+          + ("" if not failures else "   FAILED"))
+    for failure in failures:
+        print(f"{'':>21}{failure}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=40, help="One-unit decrements per thread")
+    parser.add_argument("--stock", type=int, default=400, help="Starting stock of the SKU")
+    args = parser.parse_args()
+
+    attempts = args.threads * args.attempts
+    failures: List[str] = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        # utils/stock.py: the conditional UPDATE on its own
+        stock_sessions = scratch_database(directory, "adjust_stock", args.stock)
+
+        def stock_decrement() -> bool:
+            db = stock_sessions()
+            try:
+                new_stock = adjust_stock(db, PRODUCT_ID, -1)
+                db.commit()
+            finally:
+                db.close()
+            return new_stock is not None
+
+        result = hammer(args.threads, args.attempts, stock_decrement, stock_sessions)
+        failures += check("adjust_stock", result, stock_sessions, args.stock, attempts)
+
+        # POST /inventory/subtract against the scratch database
+        from main import app
+        endpoint_sessions = scratch_database(directory, "inventory_subtract", args.stock)
+
+        def scratch_db():
+            db = endpoint_sessions()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        # The dashboard snapshot would refresh from the real database after every request
+        app.dependency_overrides[get_db] = scratch_db
+        app.dependency_overrides[mark_dashboard_stale] = lambda: None
+        client = TestClient(app)
+
+        def endpoint_decrement() -> bool:
+            response = client.post("/inventory/subtract", json={"product_id": PRODUCT_ID, "quantity": 1})
+            if response.status_code not in (200, 400):
+                raise RuntimeError(f"POST /inventory/subtract returned {response.status_code}: {response.text}")
+            return response.status_code == 200
+
+        try:
+            result = hammer(args.threads, args.attempts, endpoint_decrement, endpoint_sessions)
+        finally:
+            app.dependency_overrides.clear()
+        failures += check("/inventory/subtract", result, endpoint_sessions, args.stock, attempts)
+
+        # Write-behind queue: validated against cached stock, committed in batches
+        queued_sessions = scratch_database(directory, "write_behind", args.stock)
+        writer = SalesWriteBehind(session_factory=queued_sessions)
+        sale_date = last_weekday()
+
+        def queued_sale() -> bool:
+            db = queued_sessions()
+            try:
+                future = writer.submit(db, PRODUCT_ID, 1, sale_date, "stress")
+            except InsufficientStock:
+                return False
+            finally:
+                db.close()
+            try:
+                future.result()
+            except InsufficientStock:
+                # Passed a stale cache entry, refused by the conditional UPDATE in its batch
+                return False
+            return True
+
+        try:
+            result = hammer(args.threads, args.attempts, queued_sale, queued_sessions)
+        finally:
+            writer.stop()
+        failures += check("write-behind", result, queued_sessions, args.stock, attempts, count_sales=True)
+
+    print(f"{args.threads} threads x {args.attempts} units of one SKU with stock {args.stock}: "
+          + ("OK" if not failures else f"{len(failures)} check(s) failed"))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,12 @@ import statistics
 
 # SQLAlchemy import - installed in venv, linter warning is IDE configuration issue
 from sqlalchemy.orm import Session  
+from sqlalchemy import func
 
-from models import Inventory, ProductModel, SalesRecord, PurchaseOrder, MonthlyPlan, SalesForecast
+from models import Inventory, ProductModel, SalesDailyTotal, PurchaseOrder, MonthlyPlan, SalesForecast
 from config import settings
+from utils.inventory_ledger import InventoryLedger
+from utils.sales_archive import SalesArchive
 
 class BusinessCalculations:
     """Business calculations for PSI metrics - Based on Excel Sheet 2 formulas"""
@@ -108,7 +111,12 @@ class BusinessCalculations:
         if monthly_plan and monthly_plan.ending_inventory is not None:
             return monthly_plan.ending_inventory  # type: ignore
         
-        # Fallback to current inventory if no plan exists
+        # Otherwise the actual stock at the end of the previous month, from the inventory ledger
+        ledger_stock = InventoryLedger(self.db).stock_at(product_id, month_start - timedelta(days=1))
+        if ledger_stock is not None:
+            return ledger_stock
+        
+        # Fallback to current inventory if the month predates the ledger
         inventory = self.db.query(Inventory).filter(Inventory.product_id == product_id).first()
         if inventory:
             return inventory.current_stock if inventory.current_stock is not None else 0  # type: ignore
@@ -156,14 +164,14 @@ class BusinessCalculations:
         return sum(weekly_purchases.values())
     
     def get_monthly_sales(self, product_id: int, month_start: date, month_end: date) -> int:
-        """Get total sales for the month"""
-        sales = self.db.query(SalesRecord).filter(
-            SalesRecord.product_id == product_id,
-            SalesRecord.sale_date >= month_start,
-            SalesRecord.sale_date <= month_end
-        ).all()
-        
-        return sum(sale.quantity if sale.quantity is not None else 0 for sale in sales)  # type: ignore
+        """Get total sales for the month (archived months included)"""
+        hot_sales = self.db.query(func.coalesce(func.sum(SalesDailyTotal.total_quantity), 0)).filter(
+            SalesDailyTotal.product_id == product_id,
+            SalesDailyTotal.sale_date >= month_start,
+            SalesDailyTotal.sale_date <= month_end
+        ).scalar()
+        
+        return hot_sales + SalesArchive(self.db).archived_quantity(product_id, month_start, month_end)
     
     def get_monthly_sales_forecast(self, product_id: int, month_start: date) -> int:
         """
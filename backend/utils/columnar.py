@@ -0,0 +1,64 @@
+"""
+Columnar Responses
+Opt-in ?format=columnar encoding for list endpoints (/sales, /purchase, /shipments).
+
+Row format repeats every key on every row. Columnar format sends one array per field,
+transposed straight from the query's row tuples, and dictionary-encodes low-cardinality
+strings (SKU, stage, status, ...): the column holds integer codes into
+dictionaries[field]. Chart endpoints already return labels with parallel arrays.
+"""
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Union
+from fastapi.responses import JSONResponse
+
+RESPONSE_FORMATS = ("rows", "columnar")
+
+
+def isoformat_or_none(value: Optional[Union[date, datetime]]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def columnar_payload(
+    columns: Sequence[str],
+    rows: Sequence[tuple],
+    encoded: Iterable[str] = (),
+    converters: Optional[Dict[str, Callable[[Any], Any]]] = None
+) -> Dict:
+    """
+    Encode row tuples as one array per column
+    Columns in `encoded` hold codes into dictionaries[column]; converters map a column
+    to a function applied to each of its values (e.g. isoformat_or_none for dates).
+    """
+    encoded = set(encoded)
+    converters = converters or {}
+    values_by_column = list(zip(*rows)) if rows else [()] * len(columns)
+    
+    data: Dict[str, list] = {}
+    dictionaries: Dict[str, list] = {}
+    for name, values in zip(columns, values_by_column):
+        convert = converters.get(name)
+        if convert is not None:
+            values = map(convert, values)
+        if name in encoded:
+            codes: Dict[Any, int] = {}
+            data[name] = [codes.setdefault(value, len(codes)) for value in values]
+            dictionaries[name] = list(codes)
+        else:
+            data[name] = list(values)
+    
+    return {
+        "format": "columnar",
+        "row_count": len(rows),
+        "columns": data,
+        "dictionaries": dictionaries
+    }
+
+
+def columnar_response(
+    columns: Sequence[str],
+    rows: Sequence[tuple],
+    encoded: Iterable[str] = (),
+    converters: Optional[Dict[str, Callable[[Any], Any]]] = None
+) -> JSONResponse:
+    """columnar_payload as a JSONResponse (plain lists need no jsonable_encoder pass)"""
+    return JSONResponse(columnar_payload(columns, rows, encoded, converters))
@@ -0,0 +1,288 @@
+"""
+Container Consolidation
+Packs a week's suggested POs into shipping containers after WeeklyPOGenerator has run.
+
+Each PO line is converted to volume/weight using the per-SKU kit attributes on ProductModel.
+Lines bigger than a container are first split into full single-SKU containers, the
+remainders are then packed with first-fit-decreasing (by volume, respecting weight).
+"""
+from datetime import date, timedelta
+from typing import Dict, List
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import ProductModel, PurchaseOrder
+from config import settings
+from utils.stage_counts import stage_counts
+from utils.po_weekly_totals import POWeeklyTotals
+from utils.po_numbers import PONumberAllocator
+
+
+def first_fit_decreasing(
+    volumes: np.ndarray,
+    weights: np.ndarray,
+    volume_capacity: float,
+    weight_capacity: float
+) -> np.ndarray:
+    """
+    Assign items to bins with first-fit-decreasing
+    Items are visited in decreasing volume order and placed in the first open bin with
+    enough remaining volume and weight. Returns the bin index of every item (input order).
+    Every item must fit in an empty bin.
+    """
+    n = len(volumes)
+    assignment = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return assignment
+    
+    # At most one bin per item
+    remaining_volume = np.zeros(n, dtype=np.float64)
+    remaining_weight = np.zeros(n, dtype=np.float64)
+    open_bins = 0
+    
+    for item in np.argsort(-volumes, kind="stable"):
+        volume = volumes[item]
+        weight = weights[item]
+        fits = np.flatnonzero(
+            (remaining_volume[:open_bins] >= volume) & (remaining_weight[:open_bins] >= weight)
+        )
+        if fits.size:
+            target = fits[0]
+        else:
+            target = open_bins
+            remaining_volume[target] = volume_capacity
+            remaining_weight[target] = weight_capacity
+            open_bins += 1
+        
+        remaining_volume[target] -= volume
+        remaining_weight[target] -= weight
+        assignment[item] = target
+    
+    return assignment
+
+
+class ContainerConsolidator:
+    """Consolidate suggested POs into container-level shipments"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.container_type = settings.CONTAINER_TYPE
+        self.volume_capacity = settings.CONTAINER_VOLUME_CBM
+        self.weight_capacity = settings.CONTAINER_MAX_WEIGHT_KG
+    
+    def get_consolidation_candidates(self, order_week: date) -> List:
+        """Suggested, not yet consolidated POs with a quantity for the given order week"""
+        return self.db.query(PurchaseOrder, ProductModel).join(
+            ProductModel, PurchaseOrder.product_id == ProductModel.id
+        ).filter(
+            PurchaseOrder.order_week == order_week,
+            PurchaseOrder.status == 'suggested',
+            PurchaseOrder.quantity > 0,
+            PurchaseOrder.container_ref.is_(None)
+        ).order_by(PurchaseOrder.id).all()
+    
+    def plan_containers(self, order_week: date) -> Dict:
+        """
+        Build a container plan for the week's suggested POs (nothing is written)
+        Containers never mix shipping modes.
+        """
+        candidates = self.get_consolidation_candidates(order_week)
+        
+        unpacked = []
+        lines_by_mode: Dict[str, List[Dict]] = {}
+        
+        for po, product in candidates:
+            unit_volume = product.kit_volume_cbm
+            unit_weight = product.kit_weight_kg if product.kit_weight_kg is not None else 0.0
+            
+            if unit_volume is None or unit_volume <= 0:  # type: ignore
+                unpacked.append({
+                    "po_id": po.id,
+                    "product_id": product.id,
+                    "product_sku": product.sku,
+                    "quantity": po.quantity,
+                    "reason": "Missing kit volume for SKU"
+                })
+                continue
+            
+            units_per_container = int(min(
+                self.volume_capacity // unit_volume,
+                self.weight_capacity // unit_weight if unit_weight > 0 else float('inf')  # type: ignore
+            ))
+            if units_per_container < 1:
+                unpacked.append({
+                    "po_id": po.id,
+                    "product_id": product.id,
+                    "product_sku": product.sku,
+                    "quantity": po.quantity,
+                    "reason": "Kit exceeds container capacity"
+                })
+                continue
+            
+            lines_by_mode.setdefault(po.shipping_mode, []).append({
+                "po_id": po.id,
+                "product_id": product.id,
+                "product_sku": product.sku,
+                "quantity": int(po.quantity),  # type: ignore
+                "unit_volume": float(unit_volume),  # type: ignore
+                "unit_weight": float(unit_weight),  # type: ignore
+                "units_per_container": units_per_container
+            })
+        
+        containers = []
+        for shipping_mode, lines in lines_by_mode.items():
+            containers.extend(self._pack_lines(shipping_mode, lines))
+        
+        for number, container in enumerate(containers, start=1):
+            container["container_number"] = number
+        
+        total_volume = sum(c["volume_cbm"] for c in containers)
+        
+        return {
+            "order_week": order_week.isoformat(),
+            "container_type": self.container_type,
+            "container_count": len(containers),
+            "average_fill_percentage": round(
+                total_volume / (len(containers) * self.volume_capacity) * 100, 1
+            ) if containers else 0,
+            "containers": containers,
+            "unpacked": unpacked
+        }
+    
+    def _pack_lines(self, shipping_mode: str, lines: List[Dict]) -> List[Dict]:
+        """Split lines into full containers, then first-fit-decreasing for the remainders"""
+        containers = []
+        remainders = []
+        
+        for line in lines:
+            full_containers, remainder = divmod(line["quantity"], line["units_per_container"])
+            for _ in range(full_containers):
+                containers.append([(line, line["units_per_container"])])
+            if remainder:
+                remainders.append((line, remainder))
+        
+        if remainders:
+            volumes = np.array([line["unit_volume"] * qty for line, qty in remainders])
+            weights = np.array([line["unit_weight"] * qty for line, qty in remainders])
+            assignment = first_fit_decreasing(volumes, weights, self.volume_capacity, self.weight_capacity)
+            
+            mixed: List[List] = [[] for _ in range(int(assignment.max()) + 1)]
+            for (line, qty), bin_index in zip(remainders, assignment):
+                mixed[bin_index].append((line, qty))
+            containers.extend(mixed)
+        
+        return [self._container_summary(shipping_mode, contents) for contents in containers]
+    
+    def _container_summary(self, shipping_mode: str, contents: List) -> Dict:
+        """Describe one packed container"""
+        volume = sum(line["unit_volume"] * qty for line, qty in contents)
+        weight = sum(line["unit_weight"] * qty for line, qty in contents)
+        
+        return {
+            "shipping_mode": shipping_mode,
+            "volume_cbm": round(volume, 3),
+            "weight_kg": round(weight, 1),
+            "fill_percentage": round(volume / self.volume_capacity * 100, 1),
+            "lines": [
+                {
+                    "po_id": line["po_id"],
+                    "product_id": line["product_id"],
+                    "product_sku": line["product_sku"],
+                    "quantity": qty
+                }
+                for line, qty in contents
+            ]
+        }
+    
+    def push_to_shipments(self, order_week: date) -> Dict:
+        """
+        Apply the container plan: every container line becomes an ordered PO tagged with
+        its container reference. POs spread over several containers are split, the
+        original PO keeps the first portion. Split POs get their own PO number and a
+        share of the forecasted quantity proportional to their quantity.
+        """
+        plan = self.plan_containers(order_week)
+        
+        # Continue numbering after containers already pushed for this week
+        prefix = f"CNT-{order_week.strftime('%Y%m%d')}"
+        existing = self.db.query(PurchaseOrder.container_ref).filter(
+            PurchaseOrder.container_ref.like(f"{prefix}-%")
+        ).distinct().count()
+        
+        # Same offsets as /purchase/create
+        etd = order_week + timedelta(days=settings.ORDER_TO_ETD_DAYS)
+        eta = etd + timedelta(days=settings.LEAD_TIME_DAYS)
+        
+        po_ids = {line["po_id"] for container in plan["containers"] for line in container["lines"]}
+        pos = {
+            po.id: po
+            for po in self.db.query(PurchaseOrder).filter(PurchaseOrder.id.in_(po_ids)).all()
+        } if po_ids else {}
+        line_totals: Dict[int, int] = {}
+        for container in plan["containers"]:
+            for line in container["lines"]:
+                line_totals[line["po_id"]] = line_totals.get(line["po_id"], 0) + line["quantity"]
+        used = set()
+        splits: List[PurchaseOrder] = []
+        split_forecasts: Dict[int, int] = {}
+        
+        for container in plan["containers"]:
+            container_ref = f"{prefix}-{existing + container['container_number']:03d}"
+            container["container_ref"] = container_ref
+            
+            for line in container["lines"]:
+                source = pos[line["po_id"]]
+                if line["po_id"] not in used:
+                    po = source
+                    used.add(line["po_id"])
+                else:
+                    forecasted_quantity = None
+                    if source.forecasted_quantity is not None:
+                        forecasted_quantity = round(
+                            source.forecasted_quantity * line["quantity"] / line_totals[line["po_id"]]
+                        )
+                        split_forecasts[line["po_id"]] = split_forecasts.get(line["po_id"], 0) + forecasted_quantity
+                    po = PurchaseOrder(
+                        product_id=source.product_id,
+                        order_week=source.order_week,
+                        order_date=source.order_date,
+                        expected_delivery_week=source.expected_delivery_week,
+                        forecasted_quantity=forecasted_quantity,
+                        shipping_mode=source.shipping_mode,
+                        notes=f"Split from PO #{source.id} during container consolidation"
+                    )
+                    self.db.add(po)
+                    splits.append(po)
+                
+                po.quantity = line["quantity"]  # type: ignore
+                po.container_ref = container_ref  # type: ignore
+                po.status = 'ordered'  # type: ignore
+                po.stage = 'CKD Prepared'  # type: ignore
+                if po.etd is None:  # type: ignore
+                    po.etd = etd  # type: ignore
+                if po.eta is None:  # type: ignore
+                    po.eta = eta  # type: ignore
+                line["po"] = po
+        
+        # The original PO keeps what is left of the forecast
+        for po_id, split_forecast in split_forecasts.items():
+            pos[po_id].forecasted_quantity -= split_forecast  # type: ignore
+        if splits:
+            for po, po_number in zip(splits, PONumberAllocator(self.db).allocate(len(splits))):
+                po.po_number = po_number  # type: ignore
+        
+        self.db.flush()
+        for container in plan["containers"]:
+            for line in container["lines"]:
+                line["po_id"] = line.pop("po").id
+        
+        # Split POs add rows to the week
+        POWeeklyTotals(self.db).refresh_weeks([order_week])
+        self.db.commit()
+        stage_counts.invalidate()
+        return plan
+
+
+def get_container_consolidator(db: Session) -> ContainerConsolidator:
+    """Dependency injection for container consolidator"""
+    return ContainerConsolidator(db)
@@ -0,0 +1,355 @@
+"""
+Dashboard Metrics
+Aggregates shared by the dashboard endpoints, computed in the database.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, cast, Integer, Float, and_, select, literal, union_all
+
+from models import ProductModel, Inventory, SalesDailyTotal, PurchaseOrder
+from utils.stage_counts import stage_counts
+from utils.lead_time_analytics import LeadTimeAnalytics
+from utils.po_weekly_totals import POWeeklyTotals
+
+# Week numbers count Mondays from 2000-01-03, so a RANGE frame of N PRECEDING spans N weeks
+WEEK_EPOCH = date(2000, 1, 3)
+MOVER_SORTS = ("rank", "quantity", "wow_delta", "wow_change_pct", "mom_delta", "mom_change_pct", "trailing_average")
+
+
+class DashboardMetrics:
+    """Database-side dashboard aggregates"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_inventory_health_counts(self) -> Dict[str, int]:
+        """
+        Classify active products' inventory as critical / warning / safe in one query
+        - Safety stock = Current Stock × Safety Threshold Percentage (default 20%)
+        - Critical: stock at or below safety stock
+        - Warning: stock within 20% above safety stock
+        - Safe: everything else
+        Integer truncation matches int() in the Python implementation this replaces.
+        """
+        current_stock = func.coalesce(Inventory.current_stock, 0)
+        safety_threshold = func.coalesce(ProductModel.safety_threshold_percentage, 20.0)
+        safety_stock = cast(current_stock * (safety_threshold / 100.0), Integer)
+        warning_threshold = cast(safety_stock * 1.2, Integer)  # 20% above safety stock
+        
+        critical = current_stock <= safety_stock
+        warning = (current_stock > safety_stock) & (current_stock <= warning_threshold)
+        
+        row = self.db.query(
+            func.count(Inventory.id),
+            func.sum(case((critical, 1), else_=0)),
+            func.sum(case((warning, 1), else_=0))
+        ).select_from(Inventory).join(
+            ProductModel, Inventory.product_id == ProductModel.id
+        ).filter(ProductModel.is_active == True).one()
+        
+        total, critical_count, warning_count = (int(value or 0) for value in row)
+        
+        return {
+            "total": total,
+            "critical": critical_count,
+            "warning": warning_count,
+            "safe": total - critical_count - warning_count
+        }
+    
+    def get_stats(self) -> Dict:
+        """Dashboard statistics: total products, critical products, pending POs, weekly sales"""
+        # Total products
+        total_products = self.db.query(ProductModel).filter(ProductModel.is_active == True).count()
+        
+        # Critical / warning products
+        health = self.get_inventory_health_counts()
+        critical_products = health["critical"]
+        warning_count = health["warning"]
+        
+        # Pending POs (suggested or ordered)
+        pending_pos = self.db.query(PurchaseOrder).filter(
+            PurchaseOrder.status.in_(["suggested", "ordered"])
+        ).count()
+        
+        # Current week sales (Monday to Friday)
+        today = date.today()
+        days_since_monday = today.weekday()
+        week_start = today - timedelta(days=days_since_monday)
+        week_end = week_start + timedelta(days=4)  # Friday
+        
+        weekly_sales = self.db.query(func.sum(SalesDailyTotal.total_quantity)).filter(
+            and_(
+                SalesDailyTotal.sale_date >= week_start,
+                SalesDailyTotal.sale_date <= week_end
+            )
+        ).scalar() or 0
+        
+        return {
+            "total_products": total_products,
+            "critical_products": critical_products,
+            "warning_products": warning_count,
+            "safe_products": total_products - critical_products - warning_count,
+            "pending_pos": pending_pos,
+            "weekly_sales": int(weekly_sales),
+            "week_start": week_start.isoformat(),
+            "week_end": week_end.isoformat()
+        }
+    
+    def get_inventory_health_chart(self) -> Dict:
+        """Inventory health pie chart data (critical, warning, safe)"""
+        health = self.get_inventory_health_counts()
+        
+        return {
+            "labels": ["Critical", "Warning", "Safe"],
+            "data": [health["critical"], health["warning"], health["safe"]],
+            "colors": ["#f44336", "#ff9800", "#4caf50"]
+        }
+    
+    def get_sales_trend_chart(
+        self,
+        weeks: int = 12,
+        product_ids: Optional[List[int]] = None,
+        channels: Optional[List[str]] = None,
+        split_by_channel: bool = False
+    ) -> Dict:
+        """
+        Sales trend line chart data, bucketed by week (Monday) in SQL
+        Every week of the window is labelled, weeks without sales are 0.
+        With split_by_channel, "series" holds one line per channel next to the total.
+        """
+        end_date = date.today()
+        start_date = end_date - timedelta(weeks=weeks)
+        
+        # Monday of the sale's week: move to the coming Sunday (same day if Sunday), back 6 days
+        week_start = func.date(SalesDailyTotal.sale_date, 'weekday 0', '-6 days')
+        
+        columns: List[Any] = [week_start.label('week_start'), func.sum(SalesDailyTotal.total_quantity)]
+        group_by: List[Any] = [week_start]
+        if split_by_channel:
+            columns.insert(1, SalesDailyTotal.channel)
+            group_by.append(SalesDailyTotal.channel)
+        
+        query = self.db.query(*columns).filter(
+            SalesDailyTotal.sale_date >= start_date,
+            SalesDailyTotal.sale_date <= end_date
+        )
+        
+        if product_ids:
+            query = query.filter(SalesDailyTotal.product_id.in_(product_ids))
+        if channels:
+            query = query.filter(SalesDailyTotal.channel.in_(channels))
+        
+        rows = query.group_by(*group_by).all()
+        
+        # Zero-filled week labels from the window's first Monday to the current week
+        first_monday = start_date - timedelta(days=start_date.weekday())
+        labels = [
+            (first_monday + timedelta(weeks=i)).isoformat()
+            for i in range((end_date - first_monday).days // 7 + 1)
+        ]
+        position = {label: i for i, label in enumerate(labels)}
+        
+        data = [0] * len(labels)
+        series: Dict[str, List[int]] = {}
+        for row in rows:
+            quantity = int(row[-1] or 0)
+            data[position[row.week_start]] += quantity
+            if split_by_channel:
+                series.setdefault(row.channel, [0] * len(labels))[position[row.week_start]] += quantity
+        
+        result = {
+            "labels": labels,
+            "data": data,
+            "weeks": weeks
+        }
+        if split_by_channel:
+            result["series"] = [
+                {"channel": channel, "data": series[channel]}
+                for channel in sorted(series)
+            ]
+        return result
+    
+    def get_po_forecast_vs_actual(
+        self,
+        weeks: int = 12,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        granularity: str = "week",
+        product_id: Optional[int] = None
+    ) -> Dict:
+        """
+        PO forecast vs actual comparison data, read from the po_weekly_totals aggregate
+        The range defaults to the last `weeks` weeks; rollup by week, month or quarter.
+        """
+        if end_date is None:
+            end_date = date.today()
+        if start_date is None:
+            start_date = end_date - timedelta(weeks=weeks)
+        
+        return POWeeklyTotals(self.db).get_series(start_date, end_date, granularity, product_id)
+    
+    def get_shipment_stages_chart(self) -> Dict:
+        """Shipment stage distribution for donut chart (from the in-memory stage counts)"""
+        stages = ["CKD Prepared", "Booking", "Shipped", "Customs", "Assembly"]
+        
+        counts = stage_counts.get_counts(["ordered", "shipped"], self.db)
+        
+        return {
+            "labels": stages,
+            "data": [counts.get(stage, 0) for stage in stages],
+            "colors": ["#2196f3", "#ff9800", "#4caf50", "#9c27b0", "#f44336"]
+        }
+    
+    def get_lead_time_performance(self) -> Dict:
+        """Lead time performance histogram (0-30, 31-60, 61-90, 91-120, 120+ days)"""
+        analytics = LeadTimeAnalytics(self.db).get_analytics([0, 30, 60, 90, 120])
+        overall = analytics["overall"]
+        
+        return {
+            "labels": analytics["labels"],
+            "data": overall["histogram"],
+            "average_lead_time": overall["mean_days"] or 0,
+            "p90_lead_time": overall["p90_days"],
+            "total_deliveries": overall["count"]
+        }
+    
+    def get_movers(
+        self,
+        week_start: Optional[date] = None,
+        trailing_weeks: int = 4,
+        channel: Optional[str] = None,
+        sort: str = "rank",
+        descending: Optional[bool] = None,
+        skip: int = 0,
+        limit: int = 50
+    ) -> Dict:
+        """
+        Top / slow movers: per active SKU, sales of one week with week-over-week and
+        month-over-month (last 4 weeks vs the 4 before) deltas, a trailing average and
+        the SKU's sales rank. Defaults to the last complete week.
+        
+        One query: weekly totals per SKU (plus a zero row per active SKU for the week,
+        so SKUs without sales are ranked too) go through window functions. Weeks without
+        sales have no row, so comparisons use RANGE frames over the week number rather
+        than LAG, which would compare against the last week that happened to have sales.
+        Sorting, paging and the total count (COUNT(*) OVER ()) happen in the same query.
+        """
+        if week_start is None:
+            week_start = date.today() - timedelta(weeks=1)
+        week_start = week_start - timedelta(days=week_start.weekday())
+        target_week = (week_start - WEEK_EPOCH).days // 7
+        history_weeks = max(8, trailing_weeks)
+        
+        week_number = cast(
+            (func.julianday(SalesDailyTotal.sale_date) - func.julianday(WEEK_EPOCH.isoformat())) / 7, Integer
+        )
+        sales = select(
+            SalesDailyTotal.product_id.label('product_id'),
+            week_number.label('week'),
+            SalesDailyTotal.total_quantity.label('quantity')
+        ).where(
+            SalesDailyTotal.sale_date >= week_start - timedelta(weeks=history_weeks - 1),
+            SalesDailyTotal.sale_date < week_start + timedelta(weeks=1)
+        )
+        if channel:
+            sales = sales.where(SalesDailyTotal.channel == channel)
+        zero_rows = select(
+            ProductModel.id.label('product_id'),
+            literal(target_week).label('week'),
+            literal(0).label('quantity')
+        ).where(ProductModel.is_active == True)
+        combined = union_all(sales, zero_rows).subquery()
+        
+        weekly = select(
+            combined.c.product_id,
+            combined.c.week,
+            func.coalesce(func.sum(combined.c.quantity), 0).label('quantity')
+        ).group_by(combined.c.product_id, combined.c.week).subquery()
+        
+        def weeks_sum(first: int, last: int):
+            """Sales from `first` to `last` weeks relative to the row's week (0 = same week)"""
+            return func.coalesce(func.sum(weekly.c.quantity).over(
+                partition_by=weekly.c.product_id, order_by=weekly.c.week, range_=(first, last)
+            ), 0)
+        
+        windowed = select(
+            weekly.c.product_id,
+            weekly.c.week,
+            weekly.c.quantity,
+            weeks_sum(-1, -1).label('previous_week'),
+            weeks_sum(-3, 0).label('last_4_weeks'),
+            weeks_sum(-7, -4).label('previous_4_weeks'),
+            (cast(weeks_sum(-(trailing_weeks - 1), 0), Float) / trailing_weeks).label('trailing_average')
+        ).subquery()
+        
+        def change_pct(current, previous):
+            return case((previous > 0, (current - previous) * 100.0 / previous), else_=None)
+        
+        columns = {
+            "quantity": windowed.c.quantity,
+            "wow_delta": (windowed.c.quantity - windowed.c.previous_week).label('wow_delta'),
+            "wow_change_pct": change_pct(windowed.c.quantity, windowed.c.previous_week).label('wow_change_pct'),
+            "mom_delta": (windowed.c.last_4_weeks - windowed.c.previous_4_weeks).label('mom_delta'),
+            "mom_change_pct": change_pct(windowed.c.last_4_weeks, windowed.c.previous_4_weeks).label('mom_change_pct'),
+            "trailing_average": windowed.c.trailing_average,
+            "rank": func.rank().over(order_by=windowed.c.quantity.desc()).label('rank')
+        }
+        
+        # Rank 1 is the top seller, so "rank" ascends by default; every other sort descends
+        if descending is None:
+            descending = sort != "rank"
+        sort_column = columns[sort]
+        sort_order = sort_column.desc() if descending else sort_column.asc()
+        
+        query = select(
+            windowed.c.product_id,
+            ProductModel.sku,
+            ProductModel.name,
+            windowed.c.previous_week,
+            windowed.c.last_4_weeks,
+            windowed.c.previous_4_weeks,
+            *columns.values(),
+            func.count().over().label('total')
+        ).join(
+            ProductModel, ProductModel.id == windowed.c.product_id
+        ).where(
+            windowed.c.week == target_week,
+            ProductModel.is_active == True
+        ).order_by(sort_order.nulls_last(), ProductModel.sku).offset(skip).limit(limit)
+        
+        rows = self.db.execute(query).all()
+        
+        return {
+            "week_start": week_start.isoformat(),
+            "trailing_weeks": trailing_weeks,
+            "channel": channel,
+            "sort": sort,
+            "order": "desc" if descending else "asc",
+            "total": rows[0].total if rows else 0,
+            "skip": skip,
+            "limit": limit,
+            "items": [
+                {
+                    "product_id": row.product_id,
+                    "product_sku": row.sku,
+                    "product_name": row.name,
+                    "rank": row.rank,
+                    "quantity": int(row.quantity),
+                    "previous_week_quantity": int(row.previous_week),
+                    "wow_delta": int(row.wow_delta),
+                    "wow_change_pct": round(row.wow_change_pct, 1) if row.wow_change_pct is not None else None,
+                    "last_4_weeks_quantity": int(row.last_4_weeks),
+                    "previous_4_weeks_quantity": int(row.previous_4_weeks),
+                    "mom_delta": int(row.mom_delta),
+                    "mom_change_pct": round(row.mom_change_pct, 1) if row.mom_change_pct is not None else None,
+                    "trailing_average": round(row.trailing_average, 2)
+                }
+                for row in rows
+            ]
+        }
+
+
+def get_dashboard_metrics(db: Session) -> DashboardMetrics:
+    """Dependency injection for dashboard metrics"""
+    return DashboardMetrics(db)
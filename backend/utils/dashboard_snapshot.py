@@ -0,0 +1,153 @@
+"""
+Dashboard Snapshot
+All default dashboard payloads computed together and served from memory.
+
+The snapshot is stamped with the data version it was built from. Writes through the
+sales / purchase / shipment / inventory / model routers bump the version (see
+mark_dashboard_stale) and schedule a rebuild after a short debounce, so a burst of
+writes costs one rebuild. A request that finds the snapshot stale rebuilds it
+immediately, so the dashboard never shows data older than the last write. Every
+rebuild is also pushed to SSE clients as a dashboard_updated event.
+
+Sections are built concurrently on a thread pool, each on its own session (and so its
+own read connection). Build time per section is kept for the Server-Timing header.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Optional, Tuple
+from fastapi import Request
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from utils.dashboard_metrics import DashboardMetrics
+from utils.events import event_broker, publish_event
+
+logger = logging.getLogger(__name__)
+
+# Dashboard sections and how to build their default payloads
+SECTIONS: Dict[str, Callable[[DashboardMetrics], Dict]] = {
+    "stats": lambda metrics: metrics.get_stats(),
+    "inventory_health": lambda metrics: metrics.get_inventory_health_chart(),
+    "sales_trend": lambda metrics: metrics.get_sales_trend_chart(),
+    "po_forecast_vs_actual": lambda metrics: metrics.get_po_forecast_vs_actual(),
+    "shipment_stages": lambda metrics: metrics.get_shipment_stages_chart(),
+    "lead_time_performance": lambda metrics: metrics.get_lead_time_performance()
+}
+
+
+class DashboardSnapshot:
+    """In-memory dashboard payloads with a data-version stamp"""
+    
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self.debounce_seconds = settings.DASHBOARD_REFRESH_DEBOUNCE_SECONDS
+        # Distinguishes ETags across restarts (the version counter starts over)
+        self.instance_id = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.payloads: Dict[str, Dict] = {}
+        self.timings: Dict[str, float] = {}
+        self.built_version: Optional[int] = None
+        self.built_on: Optional[date] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.DASHBOARD_QUERY_WORKERS,
+            thread_name_prefix="dashboard"
+        )
+    
+    def is_current(self) -> bool:
+        """Built from the latest data version, today (stats depend on the current week)"""
+        return self.built_version == self.version and self.built_on == date.today()
+    
+    def etag(self, section: str) -> str:
+        return f'"{section}-{self.instance_id}-{self.built_version}-{self.built_on}"'
+    
+    def get(self, section: str) -> Tuple[Dict, str]:
+        """Payload and ETag for one section, rebuilding first if the snapshot is stale"""
+        if not self.is_current():
+            self.refresh()
+        with self._lock:
+            return self.payloads[section], self.etag(section)
+    
+    def get_all(self) -> Tuple[Dict[str, Dict], str, Dict[str, float]]:
+        """All section payloads, the combined ETag and the build time of each section (ms)"""
+        if not self.is_current():
+            self.refresh()
+        with self._lock:
+            return dict(self.payloads), self.etag("all"), dict(self.timings)
+    
+    def refresh(self) -> None:
+        """
+        Rebuild every section concurrently
+        The snapshot is stamped with the version seen when the build started, so a write
+        that lands during the build leaves it stale.
+        """
+        with self._build_lock:
+            if self.is_current():
+                return
+            
+            with self._lock:
+                version = self.version
+            
+            futures = {name: self._executor.submit(self._build_section, name) for name in SECTIONS}
+            results = {name: future.result() for name, future in futures.items()}
+            
+            payloads = {name: payload for name, (payload, _) in results.items()}
+            with self._lock:
+                self.payloads = payloads
+                self.timings = {name: elapsed for name, (_, elapsed) in results.items()}
+                self.built_version = version
+                self.built_on = date.today()
+                etag = self.etag("all")
+            
+            # Live clients get the refreshed aggregates instead of re-fetching them
+            if event_broker.has_subscribers():
+                publish_event("dashboard_updated", {"etag": etag, **payloads})
+    
+    def _build_section(self, section: str) -> Tuple[Dict, float]:
+        """Build one section on its own session, returning the payload and elapsed ms"""
+        started = time.perf_counter()
+        session = self.session_factory()
+        try:
+            payload = SECTIONS[section](DashboardMetrics(session))
+        finally:
+            session.close()
+        return payload, (time.perf_counter() - started) * 1000
+    
+    def invalidate(self) -> None:
+        """Bump the data version and schedule a debounced rebuild"""
+        with self._lock:
+            self.version += 1
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce_seconds, self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception:
+            # The next dashboard request rebuilds the snapshot anyway
+            logger.exception("Dashboard snapshot refresh failed")
+
+
+dashboard_snapshot = DashboardSnapshot()
+
+
+def mark_dashboard_stale(request: Request):
+    """Router dependency: invalidate the dashboard snapshot after any write request"""
+    yield
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        dashboard_snapshot.invalidate()
+
+
+def get_dashboard_snapshot() -> DashboardSnapshot:
+    """Dependency injection for dashboard snapshot"""
+    return dashboard_snapshot
@@ -0,0 +1,111 @@
+"""
+Change Events
+In-process broker for the Server-Sent Events stream (/events).
+
+Routers publish compact change events after committing: sales recorded, inventory
+updated, PO stage changed, POs generated, and refreshed dashboard aggregates.
+Endpoints run in worker threads while SSE clients wait on the event loop, so events
+are handed to each subscriber's asyncio queue with call_soon_threadsafe. A short
+history lets reconnecting clients resume from their Last-Event-ID.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import settings
+
+
+def format_sse(event: Dict) -> str:
+    """Encode one event in text/event-stream format"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+class EventBroker:
+    """Fan out change events to connected SSE clients"""
+    
+    def __init__(self, history_size: int = 200, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._history: Deque[Dict] = deque(maxlen=history_size)
+        self._subscribers: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+        self._next_event_id = 1
+        self._next_subscriber_id = 1
+        self._lock = threading.Lock()
+    
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+    
+    def publish(self, event_type: str, data: Dict[str, Any]) -> None:
+        """Send an event to every subscriber. Safe to call from any thread."""
+        with self._lock:
+            event = {
+                "id": self._next_event_id,
+                "type": event_type,
+                "data": {**data, "timestamp": datetime.now().isoformat()}
+            }
+            self._next_event_id += 1
+            self._history.append(event)
+            subscribers = list(self._subscribers.items())
+        
+        for subscriber_id, (loop, queue) in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(subscriber_id)
+    
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: Dict) -> None:
+        # A client that stopped reading loses its oldest events rather than blocking publishers
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+    
+    def subscribe(self, last_event_id: Optional[int] = None) -> Tuple[int, asyncio.Queue, List[Dict]]:
+        """
+        Register a subscriber on the running event loop
+        Returns its id, its queue and the events it missed since last_event_id.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            subscriber_id = self._next_subscriber_id
+            self._next_subscriber_id += 1
+            self._subscribers[subscriber_id] = (asyncio.get_running_loop(), queue)
+            missed = [e for e in self._history if e["id"] > last_event_id] if last_event_id is not None else []
+        return subscriber_id, queue, missed
+    
+    def unsubscribe(self, subscriber_id: int) -> None:
+        with self._lock:
+            self._subscribers.pop(subscriber_id, None)
+
+
+event_broker = EventBroker(
+    history_size=settings.EVENTS_HISTORY_SIZE,
+    queue_size=settings.EVENTS_QUEUE_SIZE
+)
+
+
+def publish_event(event_type: str, data: Dict[str, Any]) -> None:
+    """Publish a change event to all SSE clients"""
+    event_broker.publish(event_type, data)
+
+
+def po_stage_changed_event(po, previous: Optional[Tuple[Optional[str], str]] = None) -> Dict[str, Any]:
+    """Payload of a po_stage_changed event; previous is the PO's (stage, status) before the change"""
+    previous_stage, previous_status = previous if previous is not None else (None, None)
+    return {
+        "po_id": po.id,
+        "po_number": po.po_number,
+        "product_id": po.product_id,
+        "stage": po.stage,
+        "status": po.status,
+        "previous_stage": previous_stage,
+        "previous_status": previous_status
+    }
+
+
+def publish_po_stage_changed(po, previous: Optional[Tuple[Optional[str], str]] = None) -> None:
+    """Publish a po_stage_changed event for a PO (see po_stage_changed_event)"""
+    publish_event("po_stage_changed", po_stage_changed_event(po, previous))
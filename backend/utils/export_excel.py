@@ -1,8 +1,9 @@
 import pandas as pd
 from datetime import datetime, date
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from models import ProductModel, SalesRecord, PurchaseOrder, Inventory
-from typing import List, Dict, Optional
+from models import ProductModel, SalesRecord, SalesDailyTotal, ArchivedSalesRecord, PurchaseOrder, Inventory
+from typing import List, Dict, Optional, Tuple
 import io
 
 class ExcelExporter:
@@ -51,7 +52,14 @@ class ExcelExporter:
         return output
     
     def export_sales_data(self, start_date: date, end_date: date) -> io.BytesIO:
-        """Export sales data for specified period"""
+        """Export sales data for specified period (archived records first, then sales_records)"""
+        archived_data = self.db.query(ArchivedSalesRecord, ProductModel).join(
+            ProductModel, ArchivedSalesRecord.product_id == ProductModel.id
+        ).filter(
+            ArchivedSalesRecord.sale_date >= start_date,
+            ArchivedSalesRecord.sale_date <= end_date
+        ).order_by(ArchivedSalesRecord.sale_date).all()
+        
         sales_data = self.db.query(SalesRecord, ProductModel).join(
             ProductModel, SalesRecord.product_id == ProductModel.id
         ).filter(
@@ -60,7 +68,7 @@ class ExcelExporter:
         ).all()
         
         data = []
-        for sale, product in sales_data:
+        for sale, product in archived_data + sales_data:
             data.append({
                 'Date': sale.sale_date.strftime('%Y-%m-%d'),
                 'SKU': product.sku,
@@ -79,6 +87,67 @@ class ExcelExporter:
         output.seek(0)
         return output
     
+    def export_daily_sales(self, start_date: date, end_date: date) -> io.BytesIO:
+        """
+        Export sales totals per day, product and channel, from the archived records and
+        sales_daily. A day with both archived rows and late sales gets a single row.
+        """
+        archived_data = self.db.query(
+            ArchivedSalesRecord.sale_date,
+            ProductModel.sku,
+            ProductModel.name,
+            ArchivedSalesRecord.channel,
+            func.sum(ArchivedSalesRecord.quantity),
+            func.count(ArchivedSalesRecord.id)
+        ).join(
+            ProductModel, ArchivedSalesRecord.product_id == ProductModel.id
+        ).filter(
+            ArchivedSalesRecord.sale_date >= start_date,
+            ArchivedSalesRecord.sale_date <= end_date
+        ).group_by(
+            ArchivedSalesRecord.sale_date, ProductModel.sku, ProductModel.name, ArchivedSalesRecord.channel
+        ).order_by(ArchivedSalesRecord.sale_date).all()
+        
+        daily_data = self.db.query(
+            SalesDailyTotal.sale_date,
+            ProductModel.sku,
+            ProductModel.name,
+            SalesDailyTotal.channel,
+            SalesDailyTotal.total_quantity,
+            SalesDailyTotal.sales_count
+        ).join(
+            ProductModel, SalesDailyTotal.product_id == ProductModel.id
+        ).filter(
+            SalesDailyTotal.sale_date >= start_date,
+            SalesDailyTotal.sale_date <= end_date
+        ).order_by(SalesDailyTotal.sale_date, ProductModel.sku).all()
+        
+        totals: Dict[Tuple[date, str, str, str], List[int]] = {}
+        for sale_date, sku, name, channel, quantity, sales_count in archived_data + daily_data:
+            total = totals.setdefault((sale_date, sku, name, channel), [0, 0])
+            total[0] += quantity
+            total[1] += sales_count
+        
+        data = []
+        for (sale_date, sku, name, channel), (quantity, sales_count) in sorted(totals.items()):
+            data.append({
+                'Date': sale_date.strftime('%Y-%m-%d'),
+                'SKU': sku,
+                'Product Name': name,
+                'Channel': channel,
+                'Quantity': quantity,
+                'Sales': sales_count
+            })
+        
+        df = pd.DataFrame(data)
+        
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:  # type: ignore
+            df.to_excel(writer, sheet_name='Daily Sales', index=False)
+        
+        output.seek(0)
+        return output
+    
     def export_psi_report(self, target_month: date) -> io.BytesIO:
         """Export PSI report for a specific month"""
         from .calculations import BusinessCalculations
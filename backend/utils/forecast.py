@@ -1,7 +1,7 @@
 import numpy as np  
 from datetime import date, timedelta
 from sqlalchemy.orm import Session  
-from models import SalesRecord, ProductModel, Inventory, SalesForecast
+from models import SalesDailyTotal, ProductModel, Inventory, SalesForecast
 from typing import List, Dict, Tuple
 import statistics
 from config import settings
@@ -56,27 +56,27 @@ class ForecastEngine:
         end_date = date.today()
         start_date = end_date - timedelta(weeks=weeks)
         
-        # Get sales data grouped by week
-        query = self.db.query(SalesRecord).filter(
-            SalesRecord.product_id == product_id,
-            SalesRecord.sale_date >= start_date,
-            SalesRecord.sale_date <= end_date
+        # Get daily sales totals, grouped by week below
+        query = self.db.query(SalesDailyTotal.sale_date, SalesDailyTotal.total_quantity).filter(
+            SalesDailyTotal.product_id == product_id,
+            SalesDailyTotal.sale_date >= start_date,
+            SalesDailyTotal.sale_date <= end_date
         )
         
         # Filter by channel if specified
         if channel != "all":
-            query = query.filter(SalesRecord.channel == channel)
+            query = query.filter(SalesDailyTotal.channel == channel)
         
-        sales_data = query.order_by(SalesRecord.sale_date).all()
+        sales_data = query.order_by(SalesDailyTotal.sale_date).all()
         
         # Group by week (using ISO week)
         weekly_sales = {}
-        for sale in sales_data:
-            year, week_num, _ = sale.sale_date.isocalendar()
+        for sale_date, quantity in sales_data:
+            year, week_num, _ = sale_date.isocalendar()
             week_key = f"{year}-W{week_num:02d}"
             if week_key not in weekly_sales:
                 weekly_sales[week_key] = 0
-            weekly_sales[week_key] += sale.quantity
+            weekly_sales[week_key] += quantity
         
         # Return sorted list of weekly sales values
         sorted_weeks = sorted(weekly_sales.keys())
@@ -124,6 +124,20 @@ class ForecastEngine:
             "all_channel_forecast": all_channel_forecast.quantity if all_channel_forecast else total_forecast
         }
     
+    def get_lead_time_days(self, product_id: int) -> float:
+        """
+        Lead time in days used for safety stock
+        Learned from delivered PO history when enabled and available, otherwise from system config
+        """
+        if settings.USE_LEARNED_LEAD_TIMES:
+            from utils.lead_times import LeadTimeLearner
+            product = self.db.query(ProductModel).filter(ProductModel.id == product_id).first()
+            if product:
+                learned_days = LeadTimeLearner(self.db).get_lead_time_days(product_id, product.shipping_mode)  # type: ignore
+                if learned_days is not None:
+                    return learned_days
+        return settings.LEAD_TIME_DAYS
+    
     def calculate_safety_stock(self, product_id: int, service_level: float = 0.95) -> float:
         """Calculate safety stock based on demand variability and lead time"""
         sales_data = self.get_weekly_sales_data(product_id, 12)  # 12 weeks of data
@@ -134,8 +148,8 @@ class ForecastEngine:
         # Calculate standard deviation of demand
         demand_std = statistics.stdev(sales_data) if len(sales_data) > 1 else 0
         
-        # Get lead time from system config
-        lead_time_weeks = settings.LEAD_TIME_DAYS / 7
+        # Get lead time (learned or from system config)
+        lead_time_weeks = self.get_lead_time_days(product_id) / 7
         
         # Safety stock formula: Z * σ * √(Lead Time)
         # Z-score for service level (95% = 1.65, 99% = 2.33)
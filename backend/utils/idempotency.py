@@ -0,0 +1,182 @@
+"""
+Idempotency Keys
+Duplicate suppression for write endpoints called with an Idempotency-Key header
+(POST /sales, POST /purchase/create).
+
+The desktop client retries requests that time out; without a key a retry of a sale
+that did go through records it - and deducts the stock - twice. With a key, the first
+request runs and its response is stored under sha256(endpoint + key); a retry returns
+the stored response (with an Idempotent-Replayed header) without running the endpoint.
+Reusing a key with a different request body is rejected with 422.
+
+Lookups go through an in-memory LRU of recent keys first, then a primary-key lookup in
+idempotency_keys. A retry that arrives while the first request is still running waits
+for it. Only successful responses are stored, so a request that failed (insufficient
+stock, validation) can be retried with the same key. Keys expire after
+IDEMPOTENCY_KEY_TTL_HOURS; expired rows are deleted by created_at at most every
+IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS, which keeps the table bounded.
+
+The response is stored in its own small transaction right after the endpoint commits,
+so a crash between the two lets one retry through.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import IdempotencyKey
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# (request_hash, status_code, response, monotonic expiry)
+StoredResponse = Tuple[str, int, Any, float]
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Stored responses of keyed write requests, with a recent-keys cache"""
+    
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self.ttl_seconds = settings.IDEMPOTENCY_KEY_TTL_HOURS * 3600
+        self.cache_size = settings.IDEMPOTENCY_CACHE_SIZE
+        self.cleanup_interval = settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        # Keys whose first request is running, with the event set when it finishes
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+    
+    def run(self, endpoint: str, key: Optional[str], request: Any, handler: Callable[[], Any]) -> Any:
+        """
+        Run handler once per (endpoint, key) and replay its response for repeats
+        Without a key the handler simply runs.
+        """
+        if not key:
+            return handler()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+        
+        key_hash = _sha256(f"{endpoint}\n{key}")
+        request_hash = _sha256(json.dumps(jsonable_encoder(request), sort_keys=True))
+        
+        while True:
+            with self._lock:
+                stored = self._cached(key_hash)
+                running = self._in_flight.get(key_hash) if stored is None else None
+                if stored is None and running is None:
+                    claim = threading.Event()
+                    self._in_flight[key_hash] = claim
+                    break
+            if stored is not None:
+                return self._replay(stored, request_hash)
+            running.wait()  # type: ignore[union-attr]
+        
+        try:
+            stored = self._load(key_hash)
+            if stored is not None:
+                self._remember(key_hash, stored)
+                return self._replay(stored, request_hash)
+            
+            response = handler()
+            self._save(key_hash, request_hash, 200, jsonable_encoder(response))
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key_hash]
+            claim.set()
+    
+    def _replay(self, stored: StoredResponse, request_hash: str) -> JSONResponse:
+        stored_request_hash, status_code, response, _ = stored
+        if stored_request_hash != request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        return JSONResponse(response, status_code=status_code, headers={REPLAYED_HEADER: "true"})
+    
+    def _cached(self, key_hash: str) -> Optional[StoredResponse]:
+        """Unexpired cache entry, marked most recently used. Call with the lock held."""
+        stored = self._cache.get(key_hash)
+        if stored is None:
+            return None
+        if stored[3] <= time.monotonic():
+            del self._cache[key_hash]
+            return None
+        self._cache.move_to_end(key_hash)
+        return stored
+    
+    def _remember(self, key_hash: str, stored: StoredResponse) -> None:
+        with self._lock:
+            self._cache[key_hash] = stored
+            self._cache.move_to_end(key_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def _load(self, key_hash: str) -> Optional[StoredResponse]:
+        """Unexpired stored response by primary key"""
+        db = self.session_factory()
+        try:
+            row = db.query(
+                IdempotencyKey.request_hash,
+                IdempotencyKey.status_code,
+                IdempotencyKey.response,
+                (func.julianday('now') - func.julianday(IdempotencyKey.created_at)) * 86400
+            ).filter(
+                IdempotencyKey.key_hash == key_hash,
+                IdempotencyKey.created_at >= self._expiry_cutoff()
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        request_hash, status_code, response, age_seconds = row
+        return (request_hash, status_code, json.loads(response), time.monotonic() + self.ttl_seconds - age_seconds)
+    
+    def _save(self, key_hash: str, request_hash: str, status_code: int, response: Any) -> None:
+        """Store a response and, every cleanup interval, delete expired keys"""
+        self._remember(key_hash, (request_hash, status_code, response, time.monotonic() + self.ttl_seconds))
+        
+        db = self.session_factory()
+        try:
+            # An expired row may still be there until the next cleanup
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash))
+            db.add(IdempotencyKey(
+                key_hash=key_hash,
+                request_hash=request_hash,
+                status_code=status_code,
+                response=json.dumps(response)
+            ))
+            if time.monotonic() - self._last_cleanup >= self.cleanup_interval:
+                self._last_cleanup = time.monotonic()
+                db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < self._expiry_cutoff()))
+            db.commit()
+        except Exception:
+            # The write itself is committed; the cached entry still suppresses retries in this process
+            db.rollback()
+        finally:
+            db.close()
+    
+    def _expiry_cutoff(self):
+        return func.datetime('now', f'-{self.ttl_seconds} seconds')
+
+
+idempotency_store = IdempotencyStore()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Dependency injection for the idempotency key store"""
+    return idempotency_store
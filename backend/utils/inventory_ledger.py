@@ -0,0 +1,244 @@
+"""
+Inventory Ledger
+Append-only history of stock movements behind Inventory.current_stock.
+
+Every path that changes current_stock also appends a signed row to inventory_movements
+(sales, sales imports, manual adjustments), so stock at any past date is the sum of the
+movements up to that date. The ledger only records these existing stock changes; PO
+deliveries do not change current_stock. inventory_snapshots holds the closing stock
+per product at chosen dates (month ends by default), and stock_at() answers with the
+latest snapshot on or before the date plus the movements after it - one primary-key
+lookup and a short index range scan instead of summing the whole history.
+
+A movement dated on or before an existing snapshot (a back-dated sale) drops that
+product's snapshots from the movement date on; the next take_snapshots() run rewrites them.
+
+Databases that predate the ledger get one 'opening' movement per product with the stock
+at migration time (migrate_db.py); stock before that date is unknown and stock_at()
+returns None for it. rebuild_current_stock() recomputes current_stock from the ledger
+to catch drift.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, delete, and_, or_
+
+from models import Inventory, InventoryMovement, InventorySnapshot
+from utils.stock import adjust_stock
+
+
+def previous_month_end(day: date) -> date:
+    """Last day of the month before `day`"""
+    return day.replace(day=1) - timedelta(days=1)
+
+
+class InventoryLedger:
+    """Record inventory movements and answer stock-at-date queries"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def record(
+        self,
+        product_id: int,
+        quantity: int,
+        movement_type: str,
+        movement_date: Optional[date] = None,
+        reference: Optional[str] = None
+    ) -> None:
+        """
+        Append one movement (quantity negative for stock leaving)
+        Call alongside the change to current_stock. Does not commit.
+        """
+        if not quantity:
+            return
+        self.record_many([{
+            "product_id": product_id,
+            "quantity": quantity,
+            "movement_type": movement_type,
+            "movement_date": movement_date or date.today(),
+            "reference": reference
+        }])
+    
+    def record_many(self, movements: List[Dict]) -> None:
+        """Append several movements with one executemany INSERT. Does not commit."""
+        movements = [m for m in movements if m["quantity"]]
+        if not movements:
+            return
+        
+        self.db.execute(insert(InventoryMovement), [
+            {"reference": None, **movement} for movement in movements
+        ])
+        
+        # Snapshots from the earliest movement date on no longer match the ledger
+        earliest: Dict[int, date] = {}
+        for movement in movements:
+            product_id = movement["product_id"]
+            if product_id not in earliest or movement["movement_date"] < earliest[product_id]:
+                earliest[product_id] = movement["movement_date"]
+        for product_id, movement_date in earliest.items():
+            self.db.execute(delete(InventorySnapshot).where(
+                InventorySnapshot.product_id == product_id,
+                InventorySnapshot.snapshot_date >= movement_date
+            ))
+    
+    def adjust(
+        self,
+        product_id: int,
+        change: int,
+        movement_type: str,
+        movement_date: Optional[date] = None,
+        reference: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Change current_stock atomically (utils.stock.adjust_stock) and record the movement
+        Returns the new stock, or None if nothing was changed (no inventory record or
+        insufficient stock); no movement is recorded then. Does not commit.
+        """
+        new_stock = adjust_stock(self.db, product_id, change)
+        if new_stock is not None:
+            self.record(product_id, change, movement_type, movement_date, reference)
+        return new_stock
+    
+    def ledger_start(self, product_id: int) -> Optional[date]:
+        """Date of the product's opening movement (None: the ledger holds its whole history)"""
+        return self.db.query(func.min(InventoryMovement.movement_date)).filter(
+            InventoryMovement.product_id == product_id,
+            InventoryMovement.movement_type == "opening"
+        ).scalar()
+    
+    def stock_at(self, product_id: int, as_of: date) -> Optional[int]:
+        """
+        Closing stock of a product on a date: latest snapshot on or before it plus the
+        movements since. None for dates before the product's ledger starts.
+        """
+        snapshot = self.db.query(InventorySnapshot.snapshot_date, InventorySnapshot.stock).filter(
+            InventorySnapshot.product_id == product_id,
+            InventorySnapshot.snapshot_date <= as_of
+        ).order_by(InventorySnapshot.snapshot_date.desc()).first()
+        
+        if snapshot is None:
+            start = self.ledger_start(product_id)
+            if start is not None and as_of < start:
+                return None
+        
+        query = self.db.query(func.coalesce(func.sum(InventoryMovement.quantity), 0)).filter(
+            InventoryMovement.product_id == product_id,
+            InventoryMovement.movement_date <= as_of
+        )
+        if snapshot is not None:
+            query = query.filter(InventoryMovement.movement_date > snapshot.snapshot_date)
+        
+        return (snapshot.stock if snapshot is not None else 0) + query.scalar()
+    
+    def get_movements(
+        self,
+        product_id: int,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        limit: int = 500
+    ) -> List[InventoryMovement]:
+        """Movements of one product, newest first"""
+        query = self.db.query(InventoryMovement).filter(InventoryMovement.product_id == product_id)
+        if start_date:
+            query = query.filter(InventoryMovement.movement_date >= start_date)
+        if end_date:
+            query = query.filter(InventoryMovement.movement_date <= end_date)
+        return query.order_by(InventoryMovement.movement_date.desc(), InventoryMovement.id.desc()).limit(limit).all()
+    
+    def take_snapshots(self, as_of: Optional[date] = None) -> Dict:
+        """
+        Write the closing stock of every product with movements on `as_of`
+        (default: end of the previous month), from each product's previous snapshot plus
+        the movements after it, in one aggregate query. Products whose ledger starts after
+        `as_of` are skipped.
+        """
+        if as_of is None:
+            as_of = previous_month_end(date.today())
+        
+        latest = self.db.query(
+            InventorySnapshot.product_id,
+            func.max(InventorySnapshot.snapshot_date).label("snapshot_date")
+        ).filter(InventorySnapshot.snapshot_date < as_of).group_by(InventorySnapshot.product_id).subquery()
+        
+        base: Dict[int, int] = {
+            product_id: stock
+            for product_id, stock in self.db.query(InventorySnapshot.product_id, InventorySnapshot.stock).join(
+                latest, and_(
+                    InventorySnapshot.product_id == latest.c.product_id,
+                    InventorySnapshot.snapshot_date == latest.c.snapshot_date
+                )
+            )
+        }
+        
+        movement_totals: Dict[int, int] = {
+            product_id: total
+            for product_id, total in self.db.query(
+                InventoryMovement.product_id,
+                func.sum(InventoryMovement.quantity)
+            ).outerjoin(latest, InventoryMovement.product_id == latest.c.product_id).filter(
+                InventoryMovement.movement_date <= as_of,
+                or_(latest.c.snapshot_date.is_(None), InventoryMovement.movement_date > latest.c.snapshot_date)
+            ).group_by(InventoryMovement.product_id)
+        }
+        
+        started_later = {
+            product_id for product_id, in self.db.query(InventoryMovement.product_id).filter(
+                InventoryMovement.movement_type == "opening",
+                InventoryMovement.movement_date > as_of
+            ).distinct().all()
+        }
+        
+        rows = [
+            {"product_id": product_id, "snapshot_date": as_of,
+             "stock": base.get(product_id, 0) + movement_totals.get(product_id, 0)}
+            for product_id in set(base) | set(movement_totals)
+            if product_id not in started_later
+        ]
+        
+        self.db.execute(delete(InventorySnapshot).where(InventorySnapshot.snapshot_date == as_of))
+        if rows:
+            self.db.execute(insert(InventorySnapshot), rows)
+        self.db.commit()
+        
+        return {"snapshot_date": as_of.isoformat(), "products": len(rows)}
+    
+    def rebuild_current_stock(self, dry_run: bool = False) -> Dict:
+        """
+        Recompute Inventory.current_stock as the sum of each product's movements (batch job)
+        Reports every product whose stored stock drifted from the ledger; with dry_run
+        nothing is changed.
+        """
+        ledger_totals: Dict[int, int] = {
+            product_id: total
+            for product_id, total in self.db.query(
+                InventoryMovement.product_id,
+                func.sum(InventoryMovement.quantity)
+            ).group_by(InventoryMovement.product_id)
+        }
+        
+        drift = []
+        for inventory in self.db.query(Inventory).all():
+            stored: int = inventory.current_stock or 0  # type: ignore[assignment]
+            ledger_stock = ledger_totals.get(inventory.product_id, 0)  # type: ignore[call-overload]
+            if stored != ledger_stock:
+                drift.append({
+                    "product_id": inventory.product_id,
+                    "current_stock": stored,
+                    "ledger_stock": ledger_stock,
+                    "difference": stored - ledger_stock
+                })
+                if not dry_run:
+                    inventory.current_stock = ledger_stock  # type: ignore[assignment]
+        
+        if dry_run:
+            self.db.rollback()
+        else:
+            self.db.commit()
+        
+        return {"dry_run": dry_run, "drifted": len(drift), "products": drift}
+
+
+def get_inventory_ledger(db: Session) -> InventoryLedger:
+    """Dependency injection for inventory ledger"""
+    return InventoryLedger(db)
@@ -0,0 +1,173 @@
+"""
+Lead Time Analytics
+Distribution of actual order-to-arrival lead times of delivered POs: histogram with
+configurable bins, P50 / P90 / P99 and breakdowns per SKU, shipping mode and quarter.
+
+Lead times are measured as in utils/lead_times.py. One query fetches the lead time
+column with its grouping keys; everything else is NumPy. Results are cached per bin
+layout until a PO delivery is committed (see LeadTimeLearner).
+"""
+import threading
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, Integer, String
+
+from models import PurchaseOrder, ProductModel
+from utils.lead_times import lead_time_days_expression
+
+DEFAULT_BINS = [0, 30, 60, 90, 120]
+PERCENTILES = [50, 90, 99]
+
+
+def bin_labels(bins: Sequence[int]) -> List[str]:
+    """Labels for the buckets [bins[0], bins[1]], (bins[1], bins[2]], ..., (bins[-1], ∞)"""
+    labels = [f"{bins[0]}-{bins[1]}"] if len(bins) > 1 else []
+    labels += [f"{low + 1}-{high}" for low, high in zip(bins[1:], bins[2:])]
+    labels.append(f"{bins[-1]}+")
+    return labels
+
+
+def summarize_lead_times(days: np.ndarray, bins: Sequence[int]) -> Dict:
+    """Count, mean, percentiles and histogram of an array of lead times in days"""
+    if days.size == 0:
+        return {
+            "count": 0, "mean_days": None, "min_days": None, "max_days": None,
+            "p50_days": None, "p90_days": None, "p99_days": None,
+            "histogram": [0] * len(bins)
+        }
+    
+    p50, p90, p99 = np.percentile(days, PERCENTILES)
+    # Bucket i holds lead times up to bins[i + 1]; everything above the last edge goes last
+    bucket = np.searchsorted(np.asarray(bins[1:]), days, side='left')
+    histogram = np.bincount(bucket, minlength=len(bins))
+    
+    return {
+        "count": int(days.size),
+        "mean_days": round(float(days.mean()), 1),
+        "min_days": int(days.min()),
+        "max_days": int(days.max()),
+        "p50_days": round(float(p50), 1),
+        "p90_days": round(float(p90), 1),
+        "p99_days": round(float(p99), 1),
+        "histogram": histogram.tolist()
+    }
+
+
+class LeadTimeAnalyticsCache:
+    """Analytics results per bin layout, dropped whenever a delivery is committed"""
+    
+    def __init__(self):
+        self.results: Dict[tuple, Dict] = {}
+        # Bumped on invalidate, so a result computed before a delivery is not stored after it
+        self.generation = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key: tuple) -> Optional[Dict]:
+        with self._lock:
+            return self.results.get(key)
+    
+    def store(self, key: tuple, generation: int, result: Dict) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self.results[key] = result
+    
+    def invalidate(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self.results = {}
+
+
+lead_time_analytics_cache = LeadTimeAnalyticsCache()
+
+
+class LeadTimeAnalytics:
+    """Lead-time distribution analytics over delivered POs"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_analytics(self, bins: Optional[Sequence[int]] = None) -> Dict:
+        """Analytics for the given histogram bin edges (cached until the next delivery)"""
+        bins = sorted(set(int(edge) for edge in bins)) if bins else DEFAULT_BINS
+        key = tuple(bins)
+        
+        cached = lead_time_analytics_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        generation = lead_time_analytics_cache.generation
+        result = self.compute(bins)
+        lead_time_analytics_cache.store(key, generation, result)
+        return result
+    
+    def compute(self, bins: Sequence[int]) -> Dict:
+        """Fetch lead times of delivered POs with one query and summarize them"""
+        lead_days = lead_time_days_expression()
+        arrival = func.coalesce(func.date(PurchaseOrder.stage_updated_at), PurchaseOrder.eta)
+        quarter = func.strftime('%Y', arrival) + '-Q' + cast(
+            (cast(func.strftime('%m', arrival), Integer) + 2) // 3, String
+        )
+        
+        rows = self.db.query(
+            lead_days,
+            PurchaseOrder.product_id,
+            ProductModel.sku,
+            PurchaseOrder.shipping_mode,
+            quarter
+        ).join(
+            ProductModel, PurchaseOrder.product_id == ProductModel.id
+        ).filter(
+            PurchaseOrder.status == 'delivered',
+            PurchaseOrder.eta.isnot(None) | PurchaseOrder.stage_updated_at.isnot(None),
+            lead_days >= 0
+        ).all()
+        
+        if rows:
+            days_column, product_ids, skus, modes, quarters = zip(*rows)
+        else:
+            days_column, product_ids, skus, modes, quarters = (), (), (), (), ()
+        days = np.array(days_column, dtype=np.int64)
+        sku_by_product = dict(zip(product_ids, skus))
+        
+        by_sku = [
+            {"product_id": product_id, "product_sku": sku_by_product[product_id], **summary}
+            for product_id, summary in self._group(days, np.array(product_ids, dtype=np.int64), bins)
+        ]
+        # Longest tails first - these are the SKUs planning needs to look at
+        by_sku.sort(key=lambda item: item["p90_days"], reverse=True)
+        
+        return {
+            "bins": list(bins),
+            "labels": bin_labels(bins),
+            "overall": summarize_lead_times(days, bins),
+            "by_sku": by_sku,
+            "by_shipping_mode": [
+                {"shipping_mode": mode, **summary}
+                for mode, summary in self._group(days, np.array(modes, dtype=object), bins)
+            ],
+            "by_quarter": [
+                {"quarter": quarter_label, **summary}
+                for quarter_label, summary in self._group(days, np.array(quarters, dtype=object), bins)
+            ]
+        }
+    
+    def _group(self, days: np.ndarray, keys: np.ndarray, bins: Sequence[int]) -> List:
+        """(key, summary) per distinct key, in key order"""
+        if days.size == 0:
+            return []
+        
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        boundaries = np.cumsum(np.bincount(inverse))[:-1]
+        groups = np.split(days[order], boundaries)
+        
+        return [
+            (key.item() if isinstance(key, np.generic) else key, summarize_lead_times(group, bins))
+            for key, group in zip(unique_keys, groups)
+        ]
+
+
+def get_lead_time_analytics(db: Session) -> LeadTimeAnalytics:
+    """Dependency injection for lead time analytics"""
+    return LeadTimeAnalytics(db)
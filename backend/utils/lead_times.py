@@ -0,0 +1,235 @@
+"""
+Learned Lead Times
+Empirical order-to-arrival lead times per SKU and per shipping mode, learned from delivered POs.
+
+Lead time of a delivered PO = arrival - order date, where
+- arrival is the date of the last stage update (the delivery), falling back to ETA
+- order date is order_date, falling back to order_week
+
+Statistics (median, P90) are cached in lead_time_stats together with a day histogram.
+rebuild() recomputes everything with one aggregate query; sync_purchase_order() applies a
+single delivery to the cached histograms without rescanning history.
+"""
+import json
+import math
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, Integer, insert, select, delete, event
+
+from models import PurchaseOrder, LeadTimeObservation, LeadTimeStat
+from config import settings
+
+# (product_id, shipping_mode) - product_id None means the whole shipping mode
+StatKey = Tuple[Optional[int], str]
+
+
+def lead_time_days_expression():
+    """SQL expression for the order-to-arrival lead time of a PO in days"""
+    arrival = func.coalesce(func.date(PurchaseOrder.stage_updated_at), PurchaseOrder.eta)
+    ordered = func.coalesce(PurchaseOrder.order_date, PurchaseOrder.order_week)
+    return cast(func.julianday(arrival) - func.julianday(ordered), Integer)
+
+
+def summarize_histogram(histogram: Dict[int, int]) -> Dict:
+    """Sample count, mean, median and P90 from a {days: count} histogram"""
+    histogram = {days: count for days, count in histogram.items() if count > 0}
+    if not histogram:
+        return {"sample_count": 0, "mean_days": None, "median_days": None, "p90_days": None}
+    
+    days = np.array(sorted(histogram.keys()), dtype=np.float64)
+    counts = np.array([histogram[int(d)] for d in days], dtype=np.int64)
+    samples = np.repeat(days, counts)
+    median, p90 = np.percentile(samples, [50, 90])
+    
+    return {
+        "sample_count": int(counts.sum()),
+        "mean_days": round(float(samples.mean()), 1),
+        "median_days": round(float(median), 1),
+        "p90_days": round(float(p90), 1)
+    }
+
+
+class LeadTimeLearner:
+    """Learn and serve empirical lead times from delivered purchase orders"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def rebuild(self) -> Dict:
+        """
+        Recompute all lead-time statistics from delivered PO history
+        One aggregate query builds the per-SKU day histograms; per-mode histograms are merged from them.
+        """
+        lead_days = lead_time_days_expression()
+        delivered = (
+            PurchaseOrder.status == 'delivered',
+            PurchaseOrder.eta.isnot(None) | PurchaseOrder.stage_updated_at.isnot(None)
+        )
+        
+        rows = self.db.query(
+            PurchaseOrder.product_id,
+            PurchaseOrder.shipping_mode,
+            lead_days.label('lead_time_days'),
+            func.count(PurchaseOrder.id)
+        ).filter(*delivered).group_by(
+            PurchaseOrder.product_id, PurchaseOrder.shipping_mode, lead_days
+        ).all()
+        
+        histograms: Dict[StatKey, Counter] = {}
+        for product_id, shipping_mode, days, count in rows:
+            if days is None or days < 0:
+                continue
+            histograms.setdefault((product_id, shipping_mode), Counter())[days] += count
+            histograms.setdefault((None, shipping_mode), Counter())[days] += count
+        
+        # Refresh the per-PO observations used for incremental updates
+        self.db.execute(delete(LeadTimeObservation))
+        self.db.execute(insert(LeadTimeObservation).from_select(
+            ['po_id', 'product_id', 'shipping_mode', 'lead_time_days', 'delivered_on'],
+            select(
+                PurchaseOrder.id,
+                PurchaseOrder.product_id,
+                PurchaseOrder.shipping_mode,
+                lead_days,
+                func.coalesce(func.date(PurchaseOrder.stage_updated_at), PurchaseOrder.eta)
+            ).where(*delivered, lead_days >= 0)
+        ))
+        
+        self.db.execute(delete(LeadTimeStat))
+        for key, histogram in histograms.items():
+            self._write_stat(key, histogram)
+        
+        self._invalidate_analytics_on_commit()
+        self.db.commit()
+        
+        return {
+            "sku_count": sum(1 for product_id, _ in histograms if product_id is not None),
+            "shipping_modes": sorted({mode for _, mode in histograms}),
+            "deliveries": sum(sum(h.values()) for (product_id, _), h in histograms.items() if product_id is not None)
+        }
+    
+    def sync_purchase_order(self, po: PurchaseOrder) -> None:
+        """
+        Apply one PO to the learned statistics after its status changed
+        Delivered POs are added (or re-measured), POs that left 'delivered' are removed.
+        Only the SKU and shipping-mode histograms touched by this PO are updated.
+        Does not commit - call inside the transaction that changed the PO.
+        """
+        self.db.flush()
+        observation = self.db.get(LeadTimeObservation, po.id)
+        
+        new_days = None
+        if po.status == 'delivered':  # type: ignore
+            new_days = self.db.query(lead_time_days_expression()).filter(PurchaseOrder.id == po.id).scalar()
+            if new_days is not None and new_days < 0:
+                new_days = None
+        
+        if observation is not None:
+            if new_days is not None and observation.lead_time_days == new_days \
+                    and observation.shipping_mode == po.shipping_mode:  # type: ignore
+                return
+            self._adjust((observation.product_id, observation.shipping_mode), observation.lead_time_days, -1)  # type: ignore
+            self.db.delete(observation)
+        
+        if new_days is not None:
+            self.db.add(LeadTimeObservation(
+                po_id=po.id,
+                product_id=po.product_id,
+                shipping_mode=po.shipping_mode,
+                lead_time_days=new_days,
+                delivered_on=po.stage_updated_at.date() if po.stage_updated_at is not None else po.eta  # type: ignore
+            ))
+            self._adjust((po.product_id, po.shipping_mode), new_days, 1)  # type: ignore
+    
+    def remove_purchase_order(self, po: PurchaseOrder) -> None:
+        """Drop a PO's observation before the PO is deleted. Does not commit."""
+        observation = self.db.get(LeadTimeObservation, po.id)
+        if observation is not None:
+            self._adjust((observation.product_id, observation.shipping_mode), observation.lead_time_days, -1)  # type: ignore
+            self.db.delete(observation)
+    
+    def sync_purchase_orders(self, pos: Iterable[PurchaseOrder]) -> None:
+        """Apply several POs (see sync_purchase_order)"""
+        for po in pos:
+            self.sync_purchase_order(po)
+    
+    def _adjust(self, key: StatKey, days: int, delta: int) -> None:
+        """Add or remove one observation from the SKU and shipping-mode histograms"""
+        product_id, shipping_mode = key
+        for stat_key in ((product_id, shipping_mode), (None, shipping_mode)):
+            stat = self._get_stat(stat_key)
+            histogram = Counter(
+                {int(d): c for d, c in json.loads(stat.histogram).items()}  # type: ignore
+            ) if stat is not None and stat.histogram else Counter()  # type: ignore
+            histogram[days] += delta
+            self._write_stat(stat_key, histogram, stat)
+        self.db.flush()
+        self._invalidate_analytics_on_commit()
+    
+    def _invalidate_analytics_on_commit(self) -> None:
+        """Drop cached lead-time analytics once the current transaction commits"""
+        from utils.lead_time_analytics import lead_time_analytics_cache
+        event.listen(self.db, "after_commit", lambda session: lead_time_analytics_cache.invalidate(), once=True)
+    
+    def _get_stat(self, key: StatKey) -> Optional[LeadTimeStat]:
+        product_id, shipping_mode = key
+        query = self.db.query(LeadTimeStat).filter(LeadTimeStat.shipping_mode == shipping_mode)
+        if product_id is None:
+            query = query.filter(LeadTimeStat.product_id.is_(None))
+        else:
+            query = query.filter(LeadTimeStat.product_id == product_id)
+        return query.first()
+    
+    def _write_stat(self, key: StatKey, histogram: Dict[int, int], stat: Optional[LeadTimeStat] = None) -> None:
+        product_id, shipping_mode = key
+        if stat is None:
+            stat = LeadTimeStat(product_id=product_id, shipping_mode=shipping_mode)
+            self.db.add(stat)
+        
+        for field, value in summarize_histogram(histogram).items():
+            setattr(stat, field, value)
+        stat.histogram = json.dumps({str(d): c for d, c in sorted(histogram.items()) if c > 0})  # type: ignore
+    
+    def get_stats(self) -> Dict[StatKey, LeadTimeStat]:
+        """All cached statistics keyed by (product_id, shipping_mode)"""
+        return {
+            (stat.product_id, stat.shipping_mode): stat  # type: ignore
+            for stat in self.db.query(LeadTimeStat).all()
+        }
+    
+    def resolve_lead_time_days(
+        self,
+        stats: Dict[StatKey, LeadTimeStat],
+        product_id: int,
+        shipping_mode: str,
+        statistic: Optional[str] = None
+    ) -> Optional[float]:
+        """
+        Learned lead time in days for a SKU: the SKU's own statistic when it has enough
+        deliveries, otherwise its shipping mode's, otherwise None
+        """
+        if statistic is None:
+            statistic = settings.LEARNED_LEAD_TIME_STATISTIC
+        field = "median_days" if statistic == "median" else "p90_days"
+        
+        for key in ((product_id, shipping_mode), (None, shipping_mode)):
+            stat = stats.get(key)
+            if stat is not None and (stat.sample_count or 0) >= settings.LEAD_TIME_MIN_SAMPLES:  # type: ignore
+                return getattr(stat, field)
+        return None
+    
+    def get_lead_time_days(self, product_id: int, shipping_mode: str, statistic: Optional[str] = None) -> Optional[float]:
+        """Learned lead time in days for one SKU (see resolve_lead_time_days)"""
+        return self.resolve_lead_time_days(self.get_stats(), product_id, shipping_mode, statistic)
+    
+    def get_lead_time_weeks(self, product_id: int, shipping_mode: str, statistic: Optional[str] = None) -> Optional[int]:
+        """Learned lead time rounded up to whole weeks"""
+        days = self.get_lead_time_days(product_id, shipping_mode, statistic)
+        return math.ceil(days / 7) if days is not None else None
+
+
+def get_lead_time_learner(db: Session) -> LeadTimeLearner:
+    """Dependency injection for lead time learner"""
+    return LeadTimeLearner(db)
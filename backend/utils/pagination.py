@@ -0,0 +1,65 @@
+"""
+Keyset Pagination
+Cursor-based paging for long, newest-first listings such as /sales.
+
+OFFSET makes SQLite walk past every skipped row, so deep pages get slower the further
+you go. A keyset page instead starts right after the last row of the previous page:
+WHERE (sale_date, id) < (:last_date, :last_id) ORDER BY sale_date DESC, id DESC,
+which the index can seek to directly. The position is handed to the client as an
+opaque cursor (base64 of the key values) in the X-Next-Cursor header.
+"""
+import base64
+import json
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from sqlalchemy import literal, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Key values of a cursor; raises ValueError if it was not made by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_page(
+    query,
+    keys: Sequence[Tuple[Any, Callable[[Any], Any]]],
+    cursor: Optional[str],
+    limit: int,
+    offset: int = 0
+) -> Tuple[List, Optional[str]]:
+    """
+    One page of `query` in descending order of the key columns
+    keys: (column, parse) pairs, the last column unique (the primary key); parse turns a
+    cursor value back into a column value. The columns must be selected by the query.
+    Returns the rows and the cursor of the next page (None on the last page).
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError("Invalid cursor")
+        try:
+            bounds = [literal(parse(value), type_=column.type) for (column, parse), value in zip(keys, values)]
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        query = query.filter(tuple_(*[column for column, _ in keys]) < tuple_(*bounds))
+    
+    # One extra row tells whether there is a next page
+    rows = query.order_by(*[column.desc() for column, _ in keys]).offset(offset).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return rows, encode_cursor([last[column] for column, _ in keys])
@@ -0,0 +1,60 @@
+"""
+PO Number Allocation
+PO numbers are taken from the 'purchase_order' row of sequence_counters.
+A whole block is reserved with a single UPDATE ... RETURNING, so bulk creates
+cost one round trip and two POs for the same product on the same day never collide.
+The row is created on first use with INSERT ... ON CONFLICT DO NOTHING, so two
+requests racing to create the first PO both end up incrementing the same row.
+"""
+from datetime import date
+from typing import List
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SequenceCounter
+
+PO_SEQUENCE_NAME = "purchase_order"
+
+
+class PONumberAllocator:
+    """Reserve blocks of PO numbers from the sequence table"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def reserve_block(self, count: int) -> int:
+        """
+        Reserve `count` consecutive sequence values and return the first one
+        The reservation is part of the caller's transaction and is released on rollback
+        """
+        if count <= 0:
+            raise ValueError("count must be positive")
+        
+        self.db.execute(
+            sqlite_insert(SequenceCounter)
+            .values(name=PO_SEQUENCE_NAME, next_value=1)
+            .on_conflict_do_nothing(index_elements=['name'])
+        )
+        
+        stmt = update(SequenceCounter).where(
+            SequenceCounter.name == PO_SEQUENCE_NAME
+        ).values(
+            next_value=SequenceCounter.next_value + count
+        ).returning(SequenceCounter.next_value)
+        
+        next_value = self.db.execute(stmt).scalar_one()
+        return next_value - count
+    
+    def allocate(self, count: int, order_date: date | None = None) -> List[str]:
+        """Allocate `count` PO numbers in the format PO-<YYYYMMDD>-<sequence>"""
+        if order_date is None:
+            order_date = date.today()
+        
+        first = self.reserve_block(count)
+        prefix = f"PO-{order_date.strftime('%Y%m%d')}"
+        return [f"{prefix}-{value:06d}" for value in range(first, first + count)]
+
+def get_po_number_allocator(db: Session) -> PONumberAllocator:
+    """Dependency injection for PO number allocator"""
+    return PONumberAllocator(db)
@@ -0,0 +1,108 @@
+"""
+PO Weekly Totals
+Pre-aggregated forecasted vs actual PO quantities per order week and product.
+
+Every code path that creates, deletes or changes the quantity of POs calls
+refresh_weeks() for the order weeks it touched, inside its own transaction, so the
+table always matches purchase_orders. Long-range charts then read a few rows per week
+instead of every PO (generate_annual_pos alone creates 52 POs per SKU per year).
+"""
+from datetime import date
+from typing import Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, Integer, String, insert, select, delete
+
+from models import PurchaseOrder, POWeeklyTotal
+
+GRANULARITIES = ("week", "month", "quarter")
+
+
+class POWeeklyTotals:
+    """Maintain and query the po_weekly_totals aggregate"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def _aggregate_select(self):
+        return select(
+            PurchaseOrder.order_week,
+            PurchaseOrder.product_id,
+            func.sum(func.coalesce(PurchaseOrder.forecasted_quantity, PurchaseOrder.quantity)),
+            func.sum(PurchaseOrder.quantity),
+            func.count(PurchaseOrder.id)
+        ).group_by(PurchaseOrder.order_week, PurchaseOrder.product_id)
+    
+    def _insert_from(self, aggregate) -> None:
+        self.db.execute(insert(POWeeklyTotal).from_select(
+            ['order_week', 'product_id', 'forecasted_quantity', 'actual_quantity', 'po_count'],
+            aggregate
+        ))
+    
+    def refresh_weeks(self, order_weeks: Iterable[date]) -> None:
+        """
+        Recompute the totals of the given order weeks from purchase_orders
+        Does not commit - call inside the transaction that changed the POs.
+        """
+        weeks = sorted({week for week in order_weeks if week is not None})
+        if not weeks:
+            return
+        
+        self.db.flush()
+        self.db.execute(delete(POWeeklyTotal).where(POWeeklyTotal.order_week.in_(weeks)))
+        self._insert_from(self._aggregate_select().where(PurchaseOrder.order_week.in_(weeks)))
+    
+    def rebuild(self) -> int:
+        """Recompute the whole table with one INSERT ... SELECT ... GROUP BY"""
+        self.db.execute(delete(POWeeklyTotal))
+        self._insert_from(self._aggregate_select())
+        self.db.commit()
+        return self.db.query(POWeeklyTotal).count()
+    
+    def get_series(
+        self,
+        start_date: date,
+        end_date: date,
+        granularity: str = "week",
+        product_id: Optional[int] = None
+    ) -> Dict:
+        """
+        Forecasted vs actual PO quantity per week, month or quarter between two dates
+        Periods without POs are left out; labels are the week's Saturday (YYYY-MM-DD),
+        the month (YYYY-MM) or the quarter (YYYY-Qn).
+        """
+        if granularity == "month":
+            period = func.strftime('%Y-%m', POWeeklyTotal.order_week)
+        elif granularity == "quarter":
+            period = func.strftime('%Y', POWeeklyTotal.order_week) + '-Q' + cast(
+                (cast(func.strftime('%m', POWeeklyTotal.order_week), Integer) + 2) // 3, String
+            )
+        else:
+            period = cast(POWeeklyTotal.order_week, String)
+        
+        query = self.db.query(
+            period.label('period'),
+            func.sum(POWeeklyTotal.forecasted_quantity),
+            func.sum(POWeeklyTotal.actual_quantity)
+        ).filter(
+            POWeeklyTotal.order_week >= start_date,
+            POWeeklyTotal.order_week <= end_date
+        )
+        
+        if product_id:
+            query = query.filter(POWeeklyTotal.product_id == product_id)
+        
+        rows = query.group_by(period).order_by(period).all()
+        
+        return {
+            "labels": [row.period for row in rows],
+            "forecasted": [int(row[1] or 0) for row in rows],
+            "actual": [int(row[2] or 0) for row in rows],
+            "granularity": granularity,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat()
+        }
+
+
+def get_po_weekly_totals(db: Session) -> POWeeklyTotals:
+    """Dependency injection for PO weekly totals"""
+    return POWeeklyTotals(db)
@@ -0,0 +1,177 @@
+"""
+Weekly PO Policy Replay
+Replays the WeeklyPOGenerator ordering rule over a past date range using actual sales
+(sales_daily). Archived months only keep monthly totals, so the replay range must start
+after the archive cutoff (SalesArchive.archived_before()).
+
+Every week (Monday to Sunday) for the whole catalog at once:
+1. POs whose lead time has elapsed arrive and are added to stock
+2. Actual sales for the week are served from stock (demand above stock is lost)
+3. On Saturday the generator's rule orders
+   PO Quantity = (Weekly Consumption × Lead Time Weeks) + Safety Stock - Current Inventory
+   with Safety Stock = Current Inventory × Safety Threshold Percentage;
+   the PO arrives at the end of week + lead time
+
+All state is held as NumPy arrays of shape (products,) or (products, weeks), so a
+multi-year replay over hundreds of SKUs is a few hundred vectorized steps.
+"""
+from datetime import date, timedelta
+from typing import Dict, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import func, cast, Integer
+
+from models import ProductModel, SalesDailyTotal
+from utils.weekly_po_generator import WeeklyPOGenerator
+
+
+class PolicyReplaySimulator:
+    """Replay the weekly PO policy over historical sales"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.generator = WeeklyPOGenerator(db)
+    
+    def get_weekly_demand(self, product_ids: np.ndarray, first_monday: date, num_weeks: int) -> np.ndarray:
+        """Actual sales as a (products, weeks) matrix, bucketed in SQL by week index"""
+        week_index = cast(
+            (func.julianday(SalesDailyTotal.sale_date) - func.julianday(first_monday.isoformat())) / 7,
+            Integer
+        )
+        end_date = first_monday + timedelta(weeks=num_weeks)
+        
+        rows = self.db.query(
+            SalesDailyTotal.product_id,
+            week_index.label('week_index'),
+            func.sum(SalesDailyTotal.total_quantity)
+        ).filter(
+            SalesDailyTotal.sale_date >= first_monday,
+            SalesDailyTotal.sale_date < end_date
+        ).group_by(SalesDailyTotal.product_id, week_index).all()
+        
+        demand = np.zeros((len(product_ids), num_weeks), dtype=np.int64)
+        if not rows:
+            return demand
+        
+        row_ids, row_weeks, row_qty = (np.array(column) for column in zip(*rows))
+        positions = np.searchsorted(product_ids, row_ids)
+        known = (positions < len(product_ids)) & (product_ids[np.minimum(positions, len(product_ids) - 1)] == row_ids)
+        np.add.at(demand, (positions[known], row_weeks[known].astype(np.int64)), row_qty[known].astype(np.int64))
+        return demand
+    
+    def run(
+        self,
+        start_date: date,
+        end_date: date,
+        initial_weeks_of_cover: Optional[float] = None,
+        carrying_cost_per_unit_week: float = 0.0
+    ) -> Dict:
+        """
+        Replay the policy from start_date to end_date (inclusive)
+        
+        Opening stock per SKU is initial_weeks_of_cover × its average weekly sales over the
+        range (default: its lead time in weeks), so every SKU starts with the cover the policy
+        aims for. Inventory carrying is reported in unit-weeks and, when a cost per
+        unit-week is given, in money.
+        """
+        first_monday = start_date - timedelta(days=start_date.weekday())
+        num_weeks = (end_date - first_monday).days // 7 + 1
+        
+        products = self.db.query(ProductModel).filter(
+            ProductModel.is_active == True
+        ).order_by(ProductModel.id).all()
+        if not products:
+            return {"start_week": first_monday.isoformat(), "weeks": num_weeks, "summary": {}, "products": []}
+        
+        lead_time_stats = self.generator.get_lead_time_stats()
+        product_ids = np.array([p.id for p in products], dtype=np.int64)
+        lead_times = np.array([self.generator.get_lead_time_weeks(p, lead_time_stats) for p in products], dtype=np.int64)
+        safety_pct = np.array([
+            p.safety_threshold_percentage if p.safety_threshold_percentage is not None else 20.0
+            for p in products
+        ], dtype=np.float64)
+        
+        demand = self.get_weekly_demand(product_ids, first_monday, num_weeks)
+        mean_weekly_demand = demand.mean(axis=1)
+        
+        cover = lead_times.astype(np.float64) if initial_weeks_of_cover is None else np.full(len(products), initial_weeks_of_cover)
+        stock = np.round(mean_weekly_demand * cover).astype(np.int64)
+        opening_stock = stock.copy()
+        
+        n = len(products)
+        rows = np.arange(n)
+        # Arrivals scheduled per week; orders landing after the range are dropped
+        arrivals = np.zeros((n, num_weeks + int(lead_times.max()) + 1), dtype=np.int64)
+        ending_stock = np.zeros((n, num_weeks), dtype=np.int64)
+        served = np.zeros((n, num_weeks), dtype=np.int64)
+        ordered = np.zeros((n, num_weeks), dtype=np.int64)
+        
+        for week in range(num_weeks):
+            stock += arrivals[:, week]
+            
+            sold = np.minimum(stock, demand[:, week])
+            stock -= sold
+            served[:, week] = sold
+            
+            # Saturday: generator's ordering rule on this week's consumption
+            safety_stock = np.floor(stock * (safety_pct / 100.0)).astype(np.int64)
+            po_quantity = np.maximum(0, demand[:, week] * lead_times + safety_stock - stock)
+            ordered[:, week] = po_quantity
+            arrivals[rows, week + lead_times + 1] += po_quantity
+            
+            ending_stock[:, week] = stock
+        
+        stockout_weeks = (served < demand).sum(axis=1)
+        total_demand = demand.sum(axis=1)
+        total_served = served.sum(axis=1)
+        average_stock = ending_stock.mean(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            average_dos = np.where(mean_weekly_demand > 0, average_stock / mean_weekly_demand * 7, np.nan)
+            fill_rate = np.where(total_demand > 0, total_served / total_demand * 100, 100.0)
+        unit_weeks = ending_stock.sum(axis=1)
+        
+        product_results = [
+            {
+                "product_id": product.id,
+                "product_sku": product.sku,
+                "lead_time_weeks": int(lead_times[i]),
+                "opening_stock": int(opening_stock[i]),
+                "ending_stock": int(stock[i]),
+                "total_demand": int(total_demand[i]),
+                "total_served": int(total_served[i]),
+                "lost_sales": int(total_demand[i] - total_served[i]),
+                "fill_rate": round(float(fill_rate[i]), 1),
+                "stockout_weeks": int(stockout_weeks[i]),
+                "average_dos": None if np.isnan(average_dos[i]) else round(float(average_dos[i]), 1),
+                "average_inventory": round(float(average_stock[i]), 1),
+                "inventory_unit_weeks": int(unit_weeks[i]),
+                "carrying_cost": round(float(unit_weeks[i] * carrying_cost_per_unit_week), 2),
+                "orders_placed": int((ordered[i] > 0).sum()),
+                "total_ordered": int(ordered[i].sum())
+            }
+            for i, product in enumerate(products)
+        ]
+        
+        catalog_demand = int(total_demand.sum())
+        return {
+            "start_week": first_monday.isoformat(),
+            "end_date": end_date.isoformat(),
+            "weeks": num_weeks,
+            "summary": {
+                "products": n,
+                "total_demand": catalog_demand,
+                "total_served": int(total_served.sum()),
+                "fill_rate": round(float(total_served.sum() / catalog_demand * 100), 1) if catalog_demand else 100.0,
+                "stockout_weeks": int(stockout_weeks.sum()),
+                "products_with_stockouts": int((stockout_weeks > 0).sum()),
+                "average_inventory": round(float(average_stock.sum()), 1),
+                "inventory_unit_weeks": int(unit_weeks.sum()),
+                "carrying_cost": round(float(unit_weeks.sum() * carrying_cost_per_unit_week), 2),
+                "total_ordered": int(ordered.sum())
+            },
+            "products": product_results
+        }
+
+def get_policy_replay_simulator(db: Session) -> PolicyReplaySimulator:
+    """Dependency injection for policy replay simulator"""
+    return PolicyReplaySimulator(db)
@@ -0,0 +1,205 @@
+"""
+Sales Archive
+Keeps sales_records bounded: months older than SALES_ARCHIVE_AFTER_MONTHS are compacted
+and moved out of the hot table (POST /sales/archive).
+
+archive() runs three set-based statements in one transaction:
+1. upsert product x month x channel totals of the old rows into sales_monthly_archive
+2. copy the raw rows into archived_sales_records in psi_archive.db, which is attached to
+   every connection as schema 'archive' (database.attach_archive)
+3. delete them from sales_records
+
+Readers that need totals across the boundary add archived_quantity() (one product) or
+archived_totals() (all products): whole archived months come from the compacted table,
+partial months at the range edges from the raw archived rows. Sales entered late for an archived month stay in sales_records until
+the next run merges them into the month totals, so hot + archived never double counts.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, insert, delete, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SalesRecord, SalesMonthlyArchive, ArchivedSalesRecord
+from config import settings
+from utils.sales_daily import SalesDailyTotals
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month `months` after the month of `day`"""
+    years, month_index = divmod(day.month - 1 + months, 12)
+    return date(day.year + years, month_index + 1, 1)
+
+
+def full_months(start_date: date, end_date: date) -> Tuple[date, date]:
+    """
+    Whole months inside [start_date, end_date] as [first_full, after_last_full)
+    first_full >= after_last_full when the range covers no whole month.
+    """
+    first_full = start_date if start_date.day == 1 else add_months(start_date, 1)
+    end_is_month_end = end_date + timedelta(days=1) == add_months(end_date, 1)
+    after_last_full = add_months(end_date, 1) if end_is_month_end else end_date.replace(day=1)
+    return first_full, after_last_full
+
+
+class SalesArchive:
+    """Compact and archive old sales, and read archived totals"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def archived_before(self) -> Optional[date]:
+        """First day after the last archived month (None if nothing was archived)"""
+        last_month = self.db.query(func.max(SalesMonthlyArchive.month)).scalar()
+        return add_months(last_month, 1) if last_month is not None else None
+    
+    def archive(self, keep_months: Optional[int] = None, dry_run: bool = False) -> Dict:
+        """
+        Move every sale before the first of the month `keep_months` ago out of sales_records
+        With dry_run, only reports what would be archived.
+        """
+        if keep_months is None:
+            keep_months = settings.SALES_ARCHIVE_AFTER_MONTHS
+        cutoff = add_months(date.today(), -keep_months)
+        old = SalesRecord.sale_date < cutoff
+        
+        record_count, first_date, last_date = self.db.query(
+            func.count(SalesRecord.id), func.min(SalesRecord.sale_date), func.max(SalesRecord.sale_date)
+        ).filter(old).one()
+        
+        result = {
+            "dry_run": dry_run,
+            "cutoff": cutoff.isoformat(),
+            "archived_records": record_count,
+            "first_sale_date": first_date.isoformat() if first_date else None,
+            "last_sale_date": last_date.isoformat() if last_date else None
+        }
+        if dry_run or not record_count:
+            return result
+        
+        # 1. Month totals (merged into months compacted by an earlier run)
+        month = func.date(SalesRecord.sale_date, 'start of month')
+        compact = sqlite_insert(SalesMonthlyArchive).from_select(
+            ['month', 'product_id', 'channel', 'total_quantity', 'sales_count'],
+            select(month, SalesRecord.product_id, SalesRecord.channel,
+                   func.sum(SalesRecord.quantity), func.count(SalesRecord.id))
+            .where(old).group_by(month, SalesRecord.product_id, SalesRecord.channel)
+        )
+        totals = SalesMonthlyArchive.__table__.c
+        self.db.execute(compact.on_conflict_do_update(
+            index_elements=['month', 'product_id', 'channel'],
+            set_={
+                'total_quantity': totals.total_quantity + compact.excluded.total_quantity,
+                'sales_count': totals.sales_count + compact.excluded.sales_count
+            }
+        ))
+        
+        # 2. Raw rows into the archive database, 3. out of the hot table
+        self.db.execute(insert(ArchivedSalesRecord).from_select(
+            ['sales_record_id', 'product_id', 'sale_date', 'quantity', 'channel', 'created_at'],
+            select(SalesRecord.id, SalesRecord.product_id, SalesRecord.sale_date,
+                   SalesRecord.quantity, SalesRecord.channel, SalesRecord.created_at).where(old)
+        ))
+        self.db.execute(delete(SalesRecord).where(old))
+        # Cached summary partials of those months counted the rows just moved
+        from utils.sales_summary import SalesSummary  # sales_summary imports this module
+        SalesSummary(self.db).invalidate_before(cutoff)
+        # sales_daily mirrors the hot table only
+        SalesDailyTotals(self.db).delete_before(cutoff)
+        self.db.commit()
+        
+        result["hot_records"] = self.db.query(func.count(SalesRecord.id)).scalar()
+        return result
+    
+    def archived_quantity(self, product_id: int, start_date: date, end_date: date) -> int:
+        """
+        Archived sales of a product between two dates (inclusive)
+        Whole months are read from sales_monthly_archive, the days of partially covered
+        months from the raw archived records.
+        """
+        archived_before = self.archived_before()
+        if archived_before is None or start_date >= archived_before:
+            return 0
+        end_date = min(end_date, archived_before - timedelta(days=1))
+        if end_date < start_date:
+            return 0
+        
+        first_full, after_last_full = full_months(start_date, end_date)
+        if first_full >= after_last_full:
+            return self._raw_quantity(product_id, [(start_date, end_date)])
+        
+        months_total = self.db.query(func.coalesce(func.sum(SalesMonthlyArchive.total_quantity), 0)).filter(
+            SalesMonthlyArchive.product_id == product_id,
+            SalesMonthlyArchive.month >= first_full,
+            SalesMonthlyArchive.month < after_last_full
+        ).scalar()
+        edges = [
+            (start_date, first_full - timedelta(days=1)),
+            (after_last_full, end_date)
+        ]
+        return months_total + self._raw_quantity(product_id, edges)
+    
+    def archived_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> Dict[int, List[int]]:
+        """
+        Archived [quantity, number of sales] per product between two dates (inclusive)
+        Same split as archived_quantity(), for all products in two grouped queries.
+        """
+        archived_before = self.archived_before()
+        if archived_before is None:
+            return {}
+        first_month: date = self.db.query(func.min(SalesMonthlyArchive.month)).scalar()
+        last_day = archived_before - timedelta(days=1)
+        start_date = max(start_date, first_month) if start_date else first_month
+        end_date = min(end_date, last_day) if end_date else last_day
+        if end_date < start_date:
+            return {}
+        
+        totals: Dict[int, List[int]] = {}
+        first_full, after_last_full = full_months(start_date, end_date)
+        if first_full < after_last_full:
+            months = self.db.query(
+                SalesMonthlyArchive.product_id,
+                func.sum(SalesMonthlyArchive.total_quantity),
+                func.sum(SalesMonthlyArchive.sales_count)
+            ).filter(
+                SalesMonthlyArchive.month >= first_full,
+                SalesMonthlyArchive.month < after_last_full
+            ).group_by(SalesMonthlyArchive.product_id)
+            for product_id, quantity, count in months:
+                totals[product_id] = [quantity, count]
+            edges = [(start_date, first_full - timedelta(days=1)), (after_last_full, end_date)]
+        else:
+            edges = [(start_date, end_date)]
+        
+        edges = [(edge_start, edge_end) for edge_start, edge_end in edges if edge_start <= edge_end]
+        if edges:
+            rows = self.db.query(
+                ArchivedSalesRecord.product_id,
+                func.sum(ArchivedSalesRecord.quantity),
+                func.count(ArchivedSalesRecord.id)
+            ).filter(or_(*[
+                and_(ArchivedSalesRecord.sale_date >= edge_start, ArchivedSalesRecord.sale_date <= edge_end)
+                for edge_start, edge_end in edges
+            ])).group_by(ArchivedSalesRecord.product_id)
+            for product_id, quantity, count in rows:
+                total = totals.setdefault(product_id, [0, 0])
+                total[0] += quantity
+                total[1] += count
+        return totals
+    
+    def _raw_quantity(self, product_id: int, ranges: List[Tuple[date, date]]) -> int:
+        total = 0
+        for start_date, end_date in ranges:
+            if end_date < start_date:
+                continue
+            total += self.db.query(func.coalesce(func.sum(ArchivedSalesRecord.quantity), 0)).filter(
+                ArchivedSalesRecord.product_id == product_id,
+                ArchivedSalesRecord.sale_date >= start_date,
+                ArchivedSalesRecord.sale_date <= end_date
+            ).scalar()
+        return total
+
+
+def get_sales_archive(db: Session) -> SalesArchive:
+    """Dependency injection for sales archive"""
+    return SalesArchive(db)
@@ -0,0 +1,93 @@
+"""
+Sales Daily
+sales_daily holds sales_records pre-aggregated to one row per day, product and channel.
+
+Sales arrive as many small rows per product per day. Readers that only need totals -
+forecast history, monthly PSI sales, dashboard trends, the daily sales export, weekly PO
+consumption, policy replay - read sales_daily instead of re-summing the individual records.
+
+Every path that writes sales_records (POST/PUT/DELETE /sales, the write-behind queue,
+imports, archiving) applies the same change to sales_daily inside its own transaction,
+as a signed upsert (apply()); rows whose count drops to zero are removed. Like
+sales_records it only covers the hot table: days are dropped when they are archived.
+rebuild() recomputes the table with one INSERT ... SELECT ... GROUP BY
+(POST /sales/daily/rebuild; migrate_db.py backfills existing databases the same way).
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, insert, delete, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SalesRecord, SalesDailyTotal
+
+# (product_id, sale_date, channel, quantity change, sales count change)
+SalesChange = Tuple[int, date, str, int, int]
+
+
+class SalesDailyTotals:
+    """Maintain the sales_daily aggregate"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def apply(self, changes: Iterable[SalesChange]) -> None:
+        """
+        Add signed quantity and count changes (negative for removed sales) to their days
+        One executemany upsert for all changes. Does not commit - call inside the
+        transaction that changed sales_records.
+        """
+        totals: Dict[Tuple[int, date, str], list] = defaultdict(lambda: [0, 0])
+        for product_id, sale_date, channel, quantity, count in changes:
+            total = totals[(product_id, sale_date, channel)]
+            total[0] += quantity
+            total[1] += count
+        totals = {key: total for key, total in totals.items() if total != [0, 0]}
+        if not totals:
+            return
+        
+        upsert = sqlite_insert(SalesDailyTotal)
+        daily = SalesDailyTotal.__table__.c
+        self.db.execute(
+            upsert.on_conflict_do_update(
+                index_elements=['sale_date', 'product_id', 'channel'],
+                set_={
+                    'total_quantity': daily.total_quantity + upsert.excluded.total_quantity,
+                    'sales_count': daily.sales_count + upsert.excluded.sales_count
+                }
+            ),
+            [
+                {"product_id": product_id, "sale_date": sale_date, "channel": channel,
+                 "total_quantity": quantity, "sales_count": count}
+                for (product_id, sale_date, channel), (quantity, count) in totals.items()
+            ]
+        )
+        
+        removed = [key for key, (_, count) in totals.items() if count < 0]
+        if removed:
+            self.db.execute(delete(SalesDailyTotal).where(
+                tuple_(SalesDailyTotal.product_id, SalesDailyTotal.sale_date, SalesDailyTotal.channel).in_(removed),
+                SalesDailyTotal.sales_count <= 0
+            ))
+    
+    def delete_before(self, cutoff: date) -> None:
+        """Drop the days before cutoff (archived out of sales_records). Does not commit."""
+        self.db.execute(delete(SalesDailyTotal).where(SalesDailyTotal.sale_date < cutoff))
+    
+    def rebuild(self) -> int:
+        """Recompute the whole table from sales_records with one INSERT ... SELECT ... GROUP BY"""
+        self.db.execute(delete(SalesDailyTotal))
+        self.db.execute(insert(SalesDailyTotal).from_select(
+            ['sale_date', 'product_id', 'channel', 'total_quantity', 'sales_count'],
+            select(SalesRecord.sale_date, SalesRecord.product_id, SalesRecord.channel,
+                   func.sum(SalesRecord.quantity), func.count(SalesRecord.id))
+            .group_by(SalesRecord.sale_date, SalesRecord.product_id, SalesRecord.channel)
+        ))
+        self.db.commit()
+        return self.db.query(SalesDailyTotal).count()
+
+
+def get_sales_daily_totals(db: Session) -> SalesDailyTotals:
+    """Dependency injection for the sales_daily aggregate"""
+    return SalesDailyTotals(db)
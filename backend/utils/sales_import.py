@@ -0,0 +1,241 @@
+"""
+Sales Import
+Bulk ingestion of sales records from CSV or XLSX files (POST /sales/import).
+
+Rows are parsed one at a time (csv reader / openpyxl read-only mode) and validated
+against lookups loaded up front: active products by id and SKU, and current stock.
+The rules match POST /sales: weekdays only, and no sale may take stock below zero
+(checked in file order). Valid rows are inserted in chunks with executemany, and
+each product's stock is adjusted once by its net quantity at the end, with the same
+conditional UPDATE as utils/stock.py so concurrent sales cannot oversell. The inventory
+ledger gets one movement per product and sale date, sales_daily one upsert per product,
+date and channel. Invalid rows are reported with their row number and skipped; they
+do not abort the import.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, update, bindparam
+
+from models import SalesRecord, Inventory, ProductModel
+from config import settings
+from utils.inventory_ledger import InventoryLedger
+from utils.sales_daily import SalesDailyTotals
+from utils.sales_summary import SalesSummary
+
+IMPORT_FORMATS = ("csv", "xlsx")
+MAX_REPORTED_ERRORS = 500
+
+
+def _csv_rows(file: BinaryIO) -> Iterator[List[str]]:
+    """CSV rows; undecodable or malformed files raise ValueError like other unreadable files"""
+    try:
+        yield from csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Could not read CSV file: {e}")
+
+
+def _normalize_header(value: Any) -> str:
+    return str(value or "").strip().lower().replace(" ", "_")
+
+
+def _parse_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+def _parse_quantity(value: Any) -> int:
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return int(str(value).strip())
+
+
+class SalesImporter:
+    """Validate and bulk-insert sales rows from an uploaded file"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def iter_rows(self, file: BinaryIO, file_format: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        (row number, {column: value}) for every non-empty data row; row 1 is the header
+        Raises ValueError when the file cannot be read or lacks required columns.
+        """
+        workbook = None
+        if file_format == "csv":
+            rows = _csv_rows(file)
+        else:
+            from openpyxl import load_workbook  # pyright: ignore[reportMissingModuleSource]
+            try:
+                workbook = load_workbook(file, read_only=True, data_only=True)
+            except Exception as e:
+                raise ValueError(f"Could not read XLSX file: {e}")
+            rows = workbook.active.iter_rows(values_only=True)  # type: ignore[union-attr]
+        
+        header = [_normalize_header(value) for value in next(rows, [])]
+        if "product_sku" in header and "sku" not in header:
+            header[header.index("product_sku")] = "sku"
+        missing = [column for column in ("quantity", "sale_date") if column not in header]
+        if "product_id" not in header and "sku" not in header:
+            missing.append("product_id or sku")
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+        
+        try:
+            for row_number, values in enumerate(rows, start=2):
+                if not any(value not in (None, "") for value in values):
+                    continue
+                yield row_number, dict(zip(header, values))
+        finally:
+            # Read-only workbooks keep the file open until closed
+            if workbook is not None:
+                workbook.close()
+    
+    def import_file(self, file: BinaryIO, file_format: str, dry_run: bool = False) -> Dict:
+        """
+        Import all valid rows of the file in one transaction
+        With dry_run, rows are validated and counted but nothing is written.
+        """
+        products = self.db.query(ProductModel.id, ProductModel.sku).filter(ProductModel.is_active == True).all()
+        product_ids = {
+            "product_id": {str(product_id): product_id for product_id, _ in products},
+            "sku": {sku: product_id for product_id, sku in products}
+        }
+        available = {
+            product_id: current_stock
+            for product_id, current_stock in self.db.query(Inventory.product_id, Inventory.current_stock)
+        }
+        
+        chunk_size = settings.SALES_IMPORT_CHUNK_SIZE
+        chunk: List[Dict[str, Any]] = []
+        net_quantity: Dict[int, int] = defaultdict(int)
+        daily_quantity: Dict[Tuple[int, date], int] = defaultdict(int)
+        daily_totals: Dict[Tuple[int, date, str], List[int]] = defaultdict(lambda: [0, 0])
+        errors: List[Dict[str, Any]] = []
+        error_count = 0
+        imported = 0
+        
+        for row_number, row in self.iter_rows(file, file_format):
+            try:
+                sale = self._validate(row, product_ids)
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_number, "error": str(e)})
+                continue
+            
+            stock = available.get(sale["product_id"]) or 0
+            if stock < sale["quantity"]:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({
+                        "row": row_number,
+                        "error": f"Insufficient stock. Available: {stock}, Requested: {sale['quantity']}"
+                    })
+                continue
+            
+            available[sale["product_id"]] = stock - sale["quantity"]
+            net_quantity[sale["product_id"]] += sale["quantity"]
+            daily_quantity[(sale["product_id"], sale["sale_date"])] += sale["quantity"]
+            daily_total = daily_totals[(sale["product_id"], sale["sale_date"], sale["channel"])]
+            daily_total[0] += sale["quantity"]
+            daily_total[1] += 1
+            imported += 1
+            chunk.append(sale)
+            if len(chunk) >= chunk_size:
+                if not dry_run:
+                    self.db.execute(insert(SalesRecord), chunk)
+                chunk = []
+        
+        if not dry_run:
+            if chunk:
+                self.db.execute(insert(SalesRecord), chunk)
+            adjustments = [
+                {"b_product_id": product_id, "b_quantity": quantity}
+                for product_id, quantity in net_quantity.items() if quantity > 0
+            ]
+            if adjustments:
+                # One conditional UPDATE per product, sent as a single executemany (Core table:
+                # the ORM entity would turn a parameter list into a bulk update by primary key)
+                inventory = Inventory.__table__
+                result = self.db.execute(
+                    update(inventory).where(
+                        inventory.c.product_id == bindparam("b_product_id"),
+                        inventory.c.current_stock >= bindparam("b_quantity")
+                    ).values(
+                        current_stock=inventory.c.current_stock - bindparam("b_quantity"),
+                        last_updated=func.now()
+                    ),
+                    adjustments
+                )
+                if result.rowcount != len(adjustments):
+                    # Stock was sold elsewhere between validation and the update
+                    self.db.rollback()
+                    raise ValueError("Stock changed while importing; nothing was imported, please retry")
+            InventoryLedger(self.db).record_many([
+                {"product_id": product_id, "quantity": -quantity, "movement_type": "sale_import", "movement_date": sale_date}
+                for (product_id, sale_date), quantity in daily_quantity.items()
+            ])
+            SalesDailyTotals(self.db).apply(
+                (product_id, sale_date, channel, quantity, count)
+                for (product_id, sale_date, channel), (quantity, count) in daily_totals.items()
+            )
+            SalesSummary(self.db).invalidate(sale_date for _, sale_date in daily_quantity)
+            self.db.commit()
+        
+        return {
+            "dry_run": dry_run,
+            "imported": imported,
+            "error_count": error_count,
+            "errors": errors,
+            "inventory_adjustments": [
+                {"product_id": product_id, "quantity_sold": quantity, "current_stock": available[product_id]}
+                for product_id, quantity in sorted(net_quantity.items())
+            ]
+        }
+    
+    def _validate(self, row: Dict[str, Any], product_ids: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+        """
+        Row as SalesRecord values; raises ValueError with a readable message
+        The product is looked up by product_id when the row has one, otherwise by SKU.
+        """
+        column = "product_id" if row.get("product_id") not in (None, "") else "sku"
+        key = row.get(column)
+        if isinstance(key, float) and key.is_integer():
+            key = int(key)
+        product_id = product_ids[column].get(str(key).strip()) if key not in (None, "") else None
+        if product_id is None:
+            raise ValueError(f"Product not found or inactive: {key}")
+        
+        try:
+            quantity = _parse_quantity(row.get("quantity"))
+        except ValueError:
+            raise ValueError(f"Invalid quantity: {row.get('quantity')}")
+        if quantity < 0:
+            raise ValueError(f"Quantity must not be negative: {quantity}")
+        
+        try:
+            sale_date = _parse_date(row.get("sale_date"))
+        except ValueError:
+            raise ValueError(f"Invalid sale_date (expected YYYY-MM-DD): {row.get('sale_date')}")
+        if sale_date.weekday() >= 5:
+            raise ValueError(f"Sales can only be recorded on weekdays (Monday to Friday): {sale_date.isoformat()}")
+        
+        channel = row.get("channel")
+        return {
+            "product_id": product_id,
+            "quantity": quantity,
+            "sale_date": sale_date,
+            "channel": str(channel).strip() if channel not in (None, "") else "all"
+        }
+
+
+def get_sales_importer(db: Session) -> SalesImporter:
+    """Dependency injection for sales importer"""
+    return SalesImporter(db)
@@ -0,0 +1,167 @@
+"""
+Sales Summary
+Per-product sales totals over a date range (GET /sales/summary), served from cached
+per-month partials instead of re-aggregating sales_records on every call.
+
+Closed months (before the current month) are aggregated once, with one
+INSERT ... SELECT ... GROUP BY, into sales_summary_partials and marked in
+sales_summary_months; later requests read their few rows per product. The open month
+is never cached. A range is answered as:
+- the whole closed months it covers, from the partials
+- the partial days at either edge and anything in the open month, from an index range
+  scan of sales_records
+
+Every path that writes sales of a closed month (back-dated sales, edits, deletes,
+imports, archiving) calls invalidate() inside its own transaction, which drops that
+month's partials; the next summary request recomputes it.
+
+The partials only cover sales_records. Archived history is added per request with
+SalesArchive.archived_totals() (month totals plus raw archived rows at the edges).
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, delete, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import SalesRecord, ProductModel, SalesSummaryMonth, SalesSummaryPartial
+from utils.sales_archive import SalesArchive, add_months, full_months
+
+
+class SalesSummary:
+    """Maintain the monthly partials and answer range summaries from them"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def invalidate(self, sale_dates: Iterable[date]) -> None:
+        """
+        Drop the cached partials of the closed months containing these sale dates
+        Sales in the open month need nothing. Does not commit - call inside the
+        transaction that changed the sales.
+        """
+        open_month = date.today().replace(day=1)
+        months = sorted({day.replace(day=1) for day in sale_dates if day is not None and day < open_month})
+        if not months:
+            return
+        self.db.execute(delete(SalesSummaryPartial).where(SalesSummaryPartial.month.in_(months)))
+        self.db.execute(delete(SalesSummaryMonth).where(SalesSummaryMonth.month.in_(months)))
+    
+    def invalidate_before(self, cutoff: date) -> None:
+        """Drop the cached partials of every month before cutoff (archiving). Does not commit."""
+        self.db.execute(delete(SalesSummaryPartial).where(SalesSummaryPartial.month < cutoff))
+        self.db.execute(delete(SalesSummaryMonth).where(SalesSummaryMonth.month < cutoff))
+    
+    def _cache_months(self, first_month: date, after_last_month: date) -> None:
+        """Aggregate the months of [first_month, after_last_month) not cached yet, and commit"""
+        months = []
+        month = first_month
+        while month < after_last_month:
+            months.append(month)
+            month = add_months(month, 1)
+        
+        cached = {row[0] for row in self.db.query(SalesSummaryMonth.month).filter(
+            SalesSummaryMonth.month >= first_month,
+            SalesSummaryMonth.month < after_last_month
+        )}
+        missing = [month for month in months if month not in cached]
+        if not missing:
+            return
+        
+        month_start = func.date(SalesRecord.sale_date, 'start of month')
+        self.db.execute(sqlite_insert(SalesSummaryPartial).from_select(
+            ['month', 'product_id', 'total_quantity', 'sales_count'],
+            select(month_start, SalesRecord.product_id, func.sum(SalesRecord.quantity), func.count(SalesRecord.id))
+            .where(
+                SalesRecord.sale_date >= missing[0],
+                SalesRecord.sale_date < add_months(missing[-1], 1),
+                month_start.in_(missing)
+            )
+            .group_by(month_start, SalesRecord.product_id)
+        ).on_conflict_do_nothing())
+        self.db.execute(
+            sqlite_insert(SalesSummaryMonth).on_conflict_do_nothing(),
+            [{"month": month} for month in missing]
+        )
+        self.db.commit()
+    
+    def summary(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> List[Dict]:
+        """
+        Total quantity and number of sales per active product between two dates (inclusive)
+        Archived sales (POST /sales/archive) are included.
+        """
+        totals: Dict[int, List[int]] = {}
+        first_sale, last_sale = self.db.query(func.min(SalesRecord.sale_date), func.max(SalesRecord.sale_date)).one()
+        if first_sale is not None and last_sale is not None:
+            hot_start = max(start_date, first_sale) if start_date else first_sale
+            hot_end = min(end_date, last_sale) if end_date else last_sale
+            if hot_start <= hot_end:
+                self._add_hot(totals, hot_start, hot_end)
+        
+        # Archived months are never in sales_records; late sales for them are, so nothing double counts
+        for product_id, (quantity, count) in SalesArchive(self.db).archived_totals(start_date, end_date).items():
+            total = totals.setdefault(product_id, [0, 0])
+            total[0] += quantity
+            total[1] += count
+        if not totals:
+            return []
+        
+        products = self.db.query(ProductModel.id, ProductModel.name, ProductModel.sku).filter(
+            ProductModel.id.in_(list(totals)),
+            ProductModel.is_active == True
+        ).order_by(ProductModel.id).all()
+        
+        return [
+            {
+                "product_id": product_id,
+                "product_name": name,
+                "sku": sku,
+                "total_quantity": totals[product_id][0],
+                "sales_count": totals[product_id][1]
+            }
+            for product_id, name, sku in products
+        ]
+    
+    def _add_hot(self, totals: Dict[int, List[int]], start_date: date, end_date: date) -> None:
+        """Add the sales_records totals between two dates: whole closed months from the partials"""
+        first_full, after_last_full = full_months(start_date, end_date)
+        cached_end = min(after_last_full, date.today().replace(day=1))
+        if first_full < cached_end:
+            self._cache_months(first_full, cached_end)
+            partials = self.db.query(
+                SalesSummaryPartial.product_id,
+                func.sum(SalesSummaryPartial.total_quantity),
+                func.sum(SalesSummaryPartial.sales_count)
+            ).filter(
+                SalesSummaryPartial.month >= first_full,
+                SalesSummaryPartial.month < cached_end
+            ).group_by(SalesSummaryPartial.product_id)
+            for product_id, quantity, count in partials:
+                totals[product_id] = [quantity, count]
+            raw_ranges = [(start_date, first_full - timedelta(days=1)), (cached_end, end_date)]
+        else:
+            raw_ranges = [(start_date, end_date)]
+        self._add_raw(totals, raw_ranges)
+    
+    def _add_raw(self, totals: Dict[int, List[int]], ranges: List[Tuple[date, date]]) -> None:
+        """Add the sales_records totals of the given date ranges to totals, one grouped scan"""
+        ranges = [(start_date, end_date) for start_date, end_date in ranges if start_date <= end_date]
+        if not ranges:
+            return
+        rows = self.db.query(
+            SalesRecord.product_id,
+            func.sum(SalesRecord.quantity),
+            func.count(SalesRecord.id)
+        ).filter(or_(*[
+            and_(SalesRecord.sale_date >= start_date, SalesRecord.sale_date <= end_date)
+            for start_date, end_date in ranges
+        ])).group_by(SalesRecord.product_id)
+        for product_id, quantity, count in rows:
+            total = totals.setdefault(product_id, [0, 0])
+            total[0] += quantity
+            total[1] += count
+
+
+def get_sales_summary(db: Session) -> SalesSummary:
+    """Dependency injection for sales summary"""
+    return SalesSummary(db)
@@ -0,0 +1,244 @@
+"""
+Sales Writer
+Writes one sale (POST /sales), either in the request's own transaction or through an
+optional write-behind queue with group commit (SALES_WRITE_BEHIND).
+
+Normally every POST /sales commits on its own, which on SQLite is one fsync per sale.
+In write-behind mode the request is validated synchronously - against an in-memory
+stock cache net of the sales still queued - and then queued. A single writer thread
+collects queued sales for up to SALES_WRITE_BEHIND_BATCH_MS and writes the batch in one
+transaction: the usual conditional stock UPDATE (utils/stock.py) and sales_records
+INSERT per sale, one executemany each for the ledger movements and sales_daily totals,
+then one commit. Each request waits for its own result,
+so a response still means the sale is committed.
+
+The stock cache only decides early rejection. The conditional UPDATE stays the source
+of truth, so a sale that passed a stale cache entry can still fail in its batch with
+insufficient stock; cached entries also expire after SALES_WRITE_BEHIND_STOCK_TTL_SECONDS
+so stock changed elsewhere (manual updates, deliveries) is picked up.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import Inventory, SalesRecord
+from utils.inventory_ledger import InventoryLedger
+from utils.sales_daily import SalesDailyTotals
+from utils.sales_summary import SalesSummary
+from utils.stock import adjust_stock, get_stock
+
+# (product_id, quantity, sale_date, channel)
+SaleRequest = Tuple[int, int, date, str]
+
+
+class InsufficientStock(Exception):
+    """Raised when a sale would take stock below zero"""
+    
+    def __init__(self, available: int, requested: int):
+        super().__init__(f"Insufficient stock. Available: {available}, Requested: {requested}")
+        self.available = available
+        self.requested = requested
+
+
+def write_sale(
+    db: Session,
+    product_id: int,
+    quantity: int,
+    sale_date: date,
+    channel: str,
+    batched: bool = False
+) -> Tuple[SalesRecord, int]:
+    """
+    Subtract the sold quantity, insert the sales record, its ledger movement and daily total
+    The stock check and write are one UPDATE, so concurrent sales cannot oversell; a
+    missing inventory record is created with zero stock. Returns the flushed record and
+    the remaining stock. When batched, the caller records the ledger movements and daily
+    totals of the whole batch at once. Does not commit.
+    """
+    remaining_stock = adjust_stock(db, product_id, -quantity)
+    if remaining_stock is None:
+        available = get_stock(db, product_id)
+        if available is None:
+            # Create inventory record if it doesn't exist
+            db.add(Inventory(product_id=product_id, current_stock=0))
+            db.flush()
+            remaining_stock = adjust_stock(db, product_id, -quantity)
+            available = 0
+        if remaining_stock is None:
+            raise InsufficientStock(available, quantity)
+    
+    sale = SalesRecord(product_id=product_id, quantity=quantity, sale_date=sale_date, channel=channel)
+    db.add(sale)
+    db.flush()
+    
+    SalesSummary(db).invalidate([sale_date])
+    if not batched:
+        InventoryLedger(db).record(product_id, -quantity, "sale", sale_date, reference=f"sale:{sale.id}")
+        SalesDailyTotals(db).apply([(product_id, sale_date, channel, quantity, 1)])
+    return sale, remaining_stock
+
+
+class SalesWriteBehind:
+    """Queue of validated sales, written in batches by a single writer thread"""
+    
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+        self.batch_seconds = settings.SALES_WRITE_BEHIND_BATCH_MS / 1000
+        self.max_batch_size = settings.SALES_WRITE_BEHIND_MAX_BATCH
+        self.stock_ttl = settings.SALES_WRITE_BEHIND_STOCK_TTL_SECONDS
+        self._queue: "queue.Queue[Optional[Tuple[SaleRequest, Future]]]" = queue.Queue()
+        # product_id -> (committed stock, monotonic time it was read)
+        self._stock: Dict[int, Tuple[int, float]] = {}
+        # Quantity queued but not yet committed, per product
+        self._pending: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def submit(self, db: Session, product_id: int, quantity: int, sale_date: date, channel: str) -> Future:
+        """
+        Validate a sale against cached stock and queue it
+        Raises InsufficientStock right away; otherwise returns a Future resolving to the
+        written sale (dict) once its batch commits.
+        """
+        with self._lock:
+            available = self._cached_stock(db, product_id) - self._pending[product_id]
+            if available < quantity:
+                raise InsufficientStock(max(available, 0), quantity)
+            self._pending[product_id] += quantity
+            self._ensure_writer()
+        
+        future: Future = Future()
+        self._queue.put(((product_id, quantity, sale_date, channel), future))
+        return future
+    
+    def _cached_stock(self, db: Session, product_id: int) -> int:
+        """Committed stock of a product, reloaded when older than the TTL. Call with the lock held."""
+        cached = self._stock.get(product_id)
+        if cached is not None and time.monotonic() - cached[1] < self.stock_ttl:
+            return cached[0]
+        stock = get_stock(db, product_id) or 0
+        self._stock[product_id] = (stock, time.monotonic())
+        return stock
+    
+    def _ensure_writer(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sales-writer", daemon=True)
+            self._thread.start()
+    
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._write_batch(batch)
+                    return
+                batch.append(item)
+            self._write_batch(batch)
+    
+    def _write_batch(self, batch: List[Tuple[SaleRequest, Future]]) -> None:
+        """Write every queued sale of the batch in one transaction and resolve their futures"""
+        written = []
+        failed = []
+        db = self.session_factory()
+        try:
+            try:
+                for request, future in batch:
+                    try:
+                        sale, remaining_stock = write_sale(db, *request, batched=True)
+                        written.append((request, future, sale.id, remaining_stock))
+                    except InsufficientStock as e:
+                        failed.append((future, e))
+                InventoryLedger(db).record_many([
+                    {
+                        "product_id": product_id,
+                        "quantity": -quantity,
+                        "movement_type": "sale",
+                        "movement_date": sale_date,
+                        "reference": f"sale:{sale_id}"
+                    }
+                    for (product_id, quantity, sale_date, _), _, sale_id, _ in written
+                ])
+                SalesDailyTotals(db).apply(
+                    (product_id, sale_date, channel, quantity, 1)
+                    for (product_id, quantity, sale_date, channel), _, _, _ in written
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self._release(batch, {})
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            
+            # Committed stock per product is the remaining stock after its last sale in the batch
+            self._release(batch, {request[0]: remaining_stock for request, _, _, remaining_stock in written})
+            try:
+                created = {
+                    sale_id: created_at
+                    for sale_id, created_at in db.query(SalesRecord.id, SalesRecord.created_at)
+                    .filter(SalesRecord.id.in_([sale_id for _, _, sale_id, _ in written]))
+                } if written else {}
+            except Exception:
+                created = {}  # Informational only - the batch is already committed
+        finally:
+            db.close()
+        
+        for (product_id, quantity, sale_date, channel), future, sale_id, remaining_stock in written:
+            future.set_result({
+                "id": sale_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "sale_date": sale_date,
+                "channel": channel,
+                "created_at": created.get(sale_id),
+                "current_stock": remaining_stock
+            })
+        for future, error in failed:
+            future.set_exception(error)
+    
+    def _release(self, items: List[Tuple[SaleRequest, Future]], committed_stock: Dict[int, int]) -> None:
+        """Drop processed sales from the pending totals and refresh the stock cache"""
+        with self._lock:
+            for (product_id, quantity, _, _), _ in items:
+                self._pending[product_id] -= quantity
+                if self._pending[product_id] <= 0:
+                    del self._pending[product_id]
+                if product_id not in committed_stock:
+                    self._stock.pop(product_id, None)
+            now = time.monotonic()
+            for product_id, stock in committed_stock.items():
+                self._stock[product_id] = (stock, now)
+    
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Write what is queued and stop the writer thread"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+        self._thread = None
+
+
+sales_write_behind = SalesWriteBehind()
+
+
+def get_sales_write_behind() -> SalesWriteBehind:
+    """Dependency injection for the sales write-behind queue"""
+    return sales_write_behind
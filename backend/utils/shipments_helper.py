@@ -1,6 +1,9 @@
-from datetime import date, timedelta
+from datetime import date, timedelta, datetime
 from sqlalchemy.orm import Session
 from models import PurchaseOrder
+from utils.lead_times import LeadTimeLearner
+from utils.stage_counts import stage_counts, stage_key
+from utils.events import publish_event, po_stage_changed_event
 from typing import List, Dict
 
 class ShipmentHelper:
@@ -44,6 +47,8 @@ class ShipmentHelper:
         ).all()
         
         updated_count = 0
+        delivered = []
+        changes = []
         for shipment in shipments:
             if not shipment.etd or not shipment.eta:  # type: ignore
                 continue
@@ -55,11 +60,14 @@ class ShipmentHelper:
                 continue
             
             progress = min(100, (days_since_etd / total_days) * 100)
+            previous_stage = shipment.stage
+            before = stage_key(shipment)
             
             # Update stage based on progress
             if progress >= 90 and shipment.stage != "CBU Warehouse":  # type: ignore
                 shipment.stage = "CBU Warehouse"  # type: ignore
                 shipment.status = "delivered"  # type: ignore
+                delivered.append(shipment)
                 updated_count += 1
             elif progress >= 70 and shipment.stage not in ["Assembly", "CBU Warehouse"]:  # type: ignore
                 shipment.stage = "Assembly"  # type: ignore
@@ -70,9 +78,19 @@ class ShipmentHelper:
             elif progress >= 30 and shipment.stage not in ["Shipped", "Customs Clearance", "Assembly", "CBU Warehouse"]:  # type: ignore
                 shipment.stage = "Shipped"  # type: ignore
                 updated_count += 1
+            
+            if shipment.stage != previous_stage:  # type: ignore
+                shipment.stage_updated_at = datetime.now()  # type: ignore
+                changes.append((before, stage_key(shipment), po_stage_changed_event(shipment, before)))
         
         if updated_count > 0:
+            # Keep learned lead times current as POs are delivered
+            LeadTimeLearner(self.db).sync_purchase_orders(delivered)
+            token = stage_counts.token()
             self.db.commit()
+            stage_counts.apply_changes(token, [(before, after) for before, after, _ in changes])
+            for _, _, event in changes:
+                publish_event("po_stage_changed", event)
         
         return {
             "message": f"Updated {updated_count} shipments",
@@ -0,0 +1,109 @@
+"""
+Shipment Stage Counts
+In-memory count of purchase orders per (stage, status), for the shipment-stage donut
+chart and stage filters.
+
+The table is loaded with one GROUP BY query and then kept current by the code paths
+that move POs between stages (update_po_stage, update_shipment_stage,
+update_purchase_order, ShipmentHelper.update_shipment_progress), which apply their
+changes after committing. Bulk writers (weekly / annual generation, bulk create,
+container consolidation) invalidate it instead, and the next read reloads.
+"""
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+
+from database import SessionLocal
+from models import PurchaseOrder
+
+# (stage, status) of a PO; None for a PO that does not exist (created / deleted)
+StageKey = Tuple[Optional[str], str]
+
+
+def stage_key(po: PurchaseOrder) -> StageKey:
+    return (po.stage, po.status)  # type: ignore
+
+
+class StageCountCache:
+    """Purchase order counts per (stage, status), held in memory"""
+    
+    def __init__(self):
+        self.counts: Optional[Counter] = None
+        # Bumped on every load, so changes read before a reload are not applied twice
+        self.generation = 0
+        self._lock = threading.Lock()
+    
+    def load(self, db: Optional[Session] = None) -> None:
+        """Load all counts with one GROUP BY query"""
+        own_session = db is None
+        session = SessionLocal() if own_session else db
+        try:
+            with self._lock:
+                rows = session.query(  # type: ignore
+                    PurchaseOrder.stage,
+                    PurchaseOrder.status,
+                    func.count(PurchaseOrder.id)
+                ).group_by(PurchaseOrder.stage, PurchaseOrder.status).all()
+                
+                self.counts = Counter({(stage, status): count for stage, status, count in rows})
+                self.generation += 1
+        finally:
+            if own_session:
+                session.close()  # type: ignore
+    
+    def get_counts(
+        self,
+        statuses: Optional[Iterable[str]] = None,
+        db: Optional[Session] = None
+    ) -> Dict[Optional[str], int]:
+        """PO count per stage, optionally restricted to some statuses"""
+        if self.counts is None:
+            self.load(db)
+        
+        status_filter = set(statuses) if statuses is not None else None
+        with self._lock:
+            counts: Dict[Optional[str], int] = {}
+            for (stage, status), count in (self.counts or {}).items():
+                if count > 0 and (status_filter is None or status in status_filter):
+                    counts[stage] = counts.get(stage, 0) + count
+            return counts
+    
+    def token(self) -> int:
+        """Take before committing a change, pass to apply_changes afterwards"""
+        return self.generation
+    
+    def apply_changes(self, token: int, changes: Sequence[Tuple[Optional[StageKey], Optional[StageKey]]]) -> None:
+        """
+        Apply committed (before, after) stage changes
+        If the table was reloaded since the token was taken the reload may or may not
+        include the changes, so it is invalidated instead.
+        """
+        with self._lock:
+            if self.counts is None:
+                return
+            if token != self.generation:
+                self.counts = None
+                return
+            
+            for before, after in changes:
+                if before == after:
+                    continue
+                if before is not None:
+                    self.counts[before] -= 1
+                if after is not None:
+                    self.counts[after] += 1
+    
+    def invalidate(self) -> None:
+        """Drop the table; the next read reloads it"""
+        with self._lock:
+            self.counts = None
+
+
+stage_counts = StageCountCache()
+
+
+def get_stage_counts() -> StageCountCache:
+    """Dependency injection for stage count cache"""
+    return stage_counts
@@ -0,0 +1,38 @@
+"""
+Stock Adjustments
+Atomic changes to Inventory.current_stock for sales and manual subtractions.
+
+Reading current_stock into Python, checking it and writing it back loses updates when
+two requests interleave. adjust_stock() changes the stock with a single UPDATE whose
+WHERE clause carries the availability check; whether a row was updated decides success,
+and RETURNING hands back the new level without another round trip.
+"""
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, update
+
+from models import Inventory
+
+
+def adjust_stock(db: Session, product_id: int, change: int, allow_negative: bool = False) -> Optional[int]:
+    """
+    Add `change` (negative to subtract) to a product's stock in one statement
+    Returns the new stock, or None if the product has no inventory record or - unless
+    allow_negative - has less stock than the quantity subtracted. Does not commit.
+    """
+    # Core table: the statement runs as-is, without ORM session synchronization
+    inventory = Inventory.__table__
+    stmt = update(inventory).where(inventory.c.product_id == product_id).values(
+        current_stock=func.coalesce(inventory.c.current_stock, 0) + change,
+        last_updated=func.now()
+    )
+    if change < 0 and not allow_negative:
+        stmt = stmt.where(func.coalesce(inventory.c.current_stock, 0) >= -change)
+    
+    return db.execute(stmt.returning(inventory.c.current_stock)).scalar_one_or_none()
+
+
+def get_stock(db: Session, product_id: int) -> Optional[int]:
+    """Current stock of a product, None without an inventory record"""
+    row = db.query(Inventory.current_stock).filter(Inventory.product_id == product_id).first()
+    return (row[0] or 0) if row is not None else None
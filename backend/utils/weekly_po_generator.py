@@ -5,11 +5,17 @@ PO Quantity = (Weekly Consumption × Lead Time Weeks) + Safety Stock - Current I
 """
 from datetime import date, timedelta, datetime
 from typing import Dict, List
+import math
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from models import ProductModel, Inventory, SalesRecord, PurchaseOrder, SystemConfig
+from models import ProductModel, Inventory, SalesDailyTotal, PurchaseOrder, SystemConfig
 from config import settings
+from utils.lead_times import LeadTimeLearner
+from utils.stage_counts import stage_counts
+from utils.po_weekly_totals import POWeeklyTotals
+from utils.sales_archive import SalesArchive
 
 
 class WeeklyPOGenerator:
@@ -30,15 +36,55 @@ class WeeklyPOGenerator:
         """
         week_end = week_start + timedelta(days=4)  # Friday
         
-        sales = self.db.query(SalesRecord).filter(
+        hot = self.db.query(func.coalesce(func.sum(SalesDailyTotal.total_quantity), 0)).filter(
             and_(
-                SalesRecord.product_id == product_id,
-                SalesRecord.sale_date >= week_start,
-                SalesRecord.sale_date <= week_end
+                SalesDailyTotal.product_id == product_id,
+                SalesDailyTotal.sale_date >= week_start,
+                SalesDailyTotal.sale_date <= week_end
             )
-        ).all()
+        ).scalar()
         
-        return sum(sale.quantity if sale.quantity is not None else 0 for sale in sales)  # type: ignore
+        return int(hot) + SalesArchive(self.db).archived_quantity(product_id, week_start, week_end)
+    
+    def get_weekly_consumption_by_product(self, week_start: date) -> Dict[int, int]:
+        """
+        Calculate weekly consumption for every product in a single grouped query
+        Week is Monday to Friday (5 business days)
+        """
+        week_end = week_start + timedelta(days=4)  # Friday
+        
+        rows = self.db.query(
+            SalesDailyTotal.product_id,
+            func.sum(SalesDailyTotal.total_quantity)
+        ).filter(
+            SalesDailyTotal.sale_date >= week_start,
+            SalesDailyTotal.sale_date <= week_end
+        ).group_by(SalesDailyTotal.product_id).all()
+        
+        consumption = {product_id: int(total or 0) for product_id, total in rows}
+        for product_id, (quantity, _) in SalesArchive(self.db).archived_totals(week_start, week_end).items():
+            consumption[product_id] = consumption.get(product_id, 0) + int(quantity)
+        return consumption
+    
+    def get_lead_time_stats(self) -> Dict:
+        """Learned lead-time statistics, or an empty dict when learned lead times are disabled"""
+        if not settings.USE_LEARNED_LEAD_TIMES:
+            return {}
+        return LeadTimeLearner(self.db).get_stats()
+    
+    def get_lead_time_weeks(self, product: ProductModel, lead_time_stats: Dict) -> int:
+        """
+        Lead time in weeks for a product: learned from delivered POs when available,
+        otherwise the product's lead_time_weeks (default 10)
+        """
+        lead_time_weeks = int(product.lead_time_weeks) if product.lead_time_weeks is not None else 10  # type: ignore
+        if lead_time_stats:
+            learned_days = LeadTimeLearner(self.db).resolve_lead_time_days(
+                lead_time_stats, product.id, product.shipping_mode  # type: ignore
+            )
+            if learned_days is not None:
+                lead_time_weeks = max(1, math.ceil(learned_days / 7))
+        return lead_time_weeks
     
     def calculate_safety_stock(self, product_id: int) -> int:
         """
@@ -96,10 +142,16 @@ class WeeklyPOGenerator:
         saturday = this_monday + timedelta(days=5)
         return saturday
     
-    def generate_weekly_pos(self, order_week: date | None = None) -> Dict:  # type: ignore
+    def generate_weekly_pos(self, order_week: date | None = None, refresh: bool = False) -> Dict:  # type: ignore
         """
         Generate POs for all active products for a given week
         If order_week is None, uses the current week's Saturday
+        
+        All POs are written with one INSERT ... ON CONFLICT on (product_id, order_week),
+        so concurrent runs cannot create duplicates. Existing POs are skipped, or, with
+        refresh=True, recalculated while they are still 'suggested'. Products that already
+        have a manual PO for the week are skipped, as the unique index only covers
+        generated POs.
         """
         if order_week is None:  # type: ignore
             order_week = self.get_current_week_saturday()
@@ -107,79 +159,120 @@ class WeeklyPOGenerator:
         # Get previous week's Monday to Friday for consumption calculation
         previous_week_monday = order_week - timedelta(days=6)  # Saturday - 6 days = previous Monday
         
-        # Get all active products
-        products = self.db.query(ProductModel).filter(ProductModel.is_active == True).all()
+        # Get all active products with their current inventory
+        products = self.db.query(ProductModel, Inventory.current_stock).outerjoin(
+            Inventory, Inventory.product_id == ProductModel.id
+        ).filter(ProductModel.is_active == True).all()
         
-        generated_pos = []
-        skipped = []
+        # Previous week's sales for every product in one query
+        weekly_consumption_by_product = self.get_weekly_consumption_by_product(previous_week_monday)
         
-        for product in products:
-            # Check if PO already exists for this week
-            existing_po = self.db.query(PurchaseOrder).filter(
-                and_(
-                    PurchaseOrder.product_id == product.id,
-                    PurchaseOrder.order_week == order_week
-                )
-            ).first()
-            
-            if existing_po:
-                skipped.append({
-                    "product_id": product.id,
-                    "product_sku": product.sku,
-                    "reason": "PO already exists for this week"
-                })
+        # Learned lead times (from delivered PO history) replace the manual lead_time_weeks when enabled
+        lead_time_stats = self.get_lead_time_stats()
+        
+        # Manual POs already placed for this week (one query for all products)
+        manual_po_products = {
+            product_id for (product_id,) in self.db.query(PurchaseOrder.product_id).filter(
+                PurchaseOrder.order_week == order_week,
+                PurchaseOrder.is_generated == False
+            )
+        }
+        
+        po_rows = []
+        candidates = {}
+        
+        for product, current_stock in products:
+            if product.id in manual_po_products:
+                candidates[product.id] = {"product_id": product.id, "product_sku": product.sku}
                 continue
             
-            # Get inventory
-            inventory = self.db.query(Inventory).filter(Inventory.product_id == product.id).first()
-            current_inventory = inventory.current_stock if inventory and inventory.current_stock is not None else 0  # type: ignore
+            current_inventory = int(current_stock) if current_stock is not None else 0
             
             # Get weekly consumption (previous week's sales)
-            weekly_consumption = self.get_weekly_consumption(product.id, previous_week_monday)  # type: ignore
+            weekly_consumption = weekly_consumption_by_product.get(product.id, 0)  # type: ignore
             
-            # Get lead time (product-specific or system default)
-            lead_time_weeks = product.lead_time_weeks if product.lead_time_weeks is not None else 10  # type: ignore
+            # Get lead time (learned, product-specific or system default)
+            lead_time_weeks = self.get_lead_time_weeks(product, lead_time_stats)
             
             # Calculate safety stock
-            safety_stock = self.calculate_safety_stock(product.id)  # type: ignore
+            safety_threshold = product.safety_threshold_percentage if product.safety_threshold_percentage is not None else 20.0  # type: ignore
+            safety_stock = int(current_inventory * (safety_threshold / 100.0))  # type: ignore
             
             # Calculate PO quantity
             po_quantity = self.calculate_po_quantity(
                 product.id,  # type: ignore
                 weekly_consumption,
-                int(lead_time_weeks) if lead_time_weeks is not None else 10,  # type: ignore
+                lead_time_weeks,
                 safety_stock,
-                int(current_inventory) if current_inventory is not None else 0  # type: ignore
+                current_inventory
             )
             
             # Calculate expected delivery week
-            expected_delivery_week = order_week + timedelta(weeks=lead_time_weeks)  # type: ignore
+            expected_delivery_week = order_week + timedelta(weeks=lead_time_weeks)
             
             # Create PO (even if quantity is 0, as per requirements)
-            po = PurchaseOrder(
-                product_id=product.id,
-                quantity=po_quantity,
-                forecasted_quantity=po_quantity,
-                order_week=order_week,
-                order_date=order_week,
-                expected_delivery_week=expected_delivery_week,
-                status='suggested',
-                shipping_mode=product.shipping_mode,
-                stage='CKD Prepared',
-                notes=f"Auto-generated PO. Weekly consumption: {weekly_consumption}, Safety stock: {safety_stock}, Current inventory: {current_inventory}"
-            )
-            
-            self.db.add(po)
-            generated_pos.append({
+            po_rows.append({
+                "product_id": product.id,
+                "quantity": po_quantity,
+                "forecasted_quantity": po_quantity,
+                "order_week": order_week,
+                "order_date": order_week,
+                "expected_delivery_week": expected_delivery_week,
+                "status": 'suggested',
+                "shipping_mode": product.shipping_mode,
+                "stage": 'CKD Prepared',
+                "is_generated": True,
+                "notes": f"Auto-generated PO. Weekly consumption: {weekly_consumption}, Safety stock: {safety_stock}, Current inventory: {current_inventory}"
+            })
+            candidates[product.id] = {
                 "product_id": product.id,
                 "product_sku": product.sku,
                 "quantity": po_quantity,
                 "weekly_consumption": weekly_consumption,
                 "safety_stock": safety_stock,
                 "current_inventory": current_inventory
-            })
+            }
+        
+        written_ids = set()
+        if po_rows:
+            stmt = sqlite_insert(PurchaseOrder)
+            conflict_target = {
+                "index_elements": [PurchaseOrder.product_id, PurchaseOrder.order_week],
+                "index_where": PurchaseOrder.is_generated == True
+            }
+            if refresh:
+                # Only POs nobody has acted on yet are recalculated
+                stmt = stmt.on_conflict_do_update(
+                    **conflict_target,
+                    set_={
+                        "quantity": stmt.excluded.quantity,
+                        "forecasted_quantity": stmt.excluded.forecasted_quantity,
+                        "expected_delivery_week": stmt.excluded.expected_delivery_week,
+                        "notes": stmt.excluded.notes,
+                        "updated_at": func.now()
+                    },
+                    where=PurchaseOrder.status == 'suggested'
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(**conflict_target)
+            
+            # RETURNING only yields rows that were actually written
+            result = self.db.execute(stmt.values(po_rows).returning(PurchaseOrder.product_id))
+            written_ids = set(result.scalars().all())
+            POWeeklyTotals(self.db).refresh_weeks([order_week])
         
         self.db.commit()
+        stage_counts.invalidate()
+        
+        generated_pos = [po for product_id, po in candidates.items() if product_id in written_ids]
+        skipped = [
+            {
+                "product_id": po["product_id"],
+                "product_sku": po["product_sku"],
+                "reason": "PO already exists for this week"
+            }
+            for product_id, po in candidates.items() if product_id not in written_ids
+        ]
         
         return {
             "order_week": order_week.isoformat(),
@@ -42,12 +42,8 @@ import {
   calculateMonthlyPSI,
   calculateNPlus3Stock,
   listMonthlyPlans,
-  getDashboardStats,
-  getInventoryHealthChart,
-  getSalesTrendChart,
-  getPOForecastVsActualChart,
-  getShipmentStagesChart,
-  getLeadTimePerformanceChart
+  getDashboardAll,
+  subscribeEvents
 } from "../services/api";
 import { Pie, Line, Bar, Doughnut } from "react-chartjs-2";
 import {
@@ -113,6 +109,29 @@ export default function Dashboard() {
   useEffect(() => {
     loadDashboardData();
     loadProducts();
+
+    // Refreshed dashboard aggregates are pushed by the backend after every change
+    const events = subscribeEvents({
+      dashboard_updated: (dashboard) => {
+        const dashboardStats = dashboard.stats || {};
+        setStats((prev) => ({
+          ...prev,
+          totalProducts: dashboardStats.total_products || 0,
+          lowStockItems: dashboardStats.critical_products || 0,
+          pendingPOs: dashboardStats.pending_pos || 0,
+          criticalProducts: dashboardStats.critical_products || 0,
+          warningProducts: dashboardStats.warning_products || 0,
+          safeProducts: dashboardStats.safe_products || 0,
+          weeklySales: dashboardStats.weekly_sales || 0
+        }));
+        setInventoryHealthData(dashboard.inventory_health);
+        setSalesTrendData(dashboard.sales_trend);
+        setPoForecastData(dashboard.po_forecast_vs_actual);
+        setShipmentStagesData(dashboard.shipment_stages);
+        setLeadTimeData(dashboard.lead_time_performance);
+      }
+    });
+    return () => events.close();
   }, []);
 
   useEffect(() => {
@@ -138,12 +157,7 @@ export default function Dashboard() {
     setLoading(true);
     try {
       const [
-        dashboardStatsResponse,
-        inventoryHealthResponse,
-        salesTrendResponse,
-        poForecastResponse,
-        shipmentStagesResponse,
-        leadTimeResponse,
+        dashboardResponse,
         inventoryResponse,
         lowStockResponse,
         poResponse,
@@ -151,12 +165,7 @@ export default function Dashboard() {
         salesSummaryResponse,
         monthlyPlansResponse
       ] = await Promise.all([
-        getDashboardStats(),
-        getInventoryHealthChart(),
-        getSalesTrendChart(12),
-        getPOForecastVsActualChart(12),
-        getShipmentStagesChart(),
-        getLeadTimePerformanceChart(),
+        getDashboardAll(),
         getInventory(),
         getLowStockAlerts(),
         listPOs(),
@@ -165,8 +174,9 @@ export default function Dashboard() {
         listMonthlyPlans()
       ]);
 
-      // Update stats from dashboard API
-      const dashboardStats = dashboardStatsResponse.data || {};
+      // Stats and chart data come from one /dashboard/all response
+      const dashboard = dashboardResponse.data || {};
+      const dashboardStats = dashboard.stats || {};
       setStats({
         totalProducts: dashboardStats.total_products || 0,
         totalInventory: inventoryResponse.data?.reduce((sum, item) => sum + (item.current_stock || 0), 0) || 0,
@@ -181,11 +191,11 @@ export default function Dashboard() {
       });
 
       // Set chart data
-      setInventoryHealthData(inventoryHealthResponse.data);
-      setSalesTrendData(salesTrendResponse.data);
-      setPoForecastData(poForecastResponse.data);
-      setShipmentStagesData(shipmentStagesResponse.data);
-      setLeadTimeData(leadTimeResponse.data);
+      setInventoryHealthData(dashboard.inventory_health);
+      setSalesTrendData(dashboard.sales_trend);
+      setPoForecastData(dashboard.po_forecast_vs_actual);
+      setShipmentStagesData(dashboard.shipment_stages);
+      setLeadTimeData(dashboard.lead_time_performance);
 
       const inventory = inventoryResponse.data || [];
       const lowStockAlerts = lowStockResponse.data || [];
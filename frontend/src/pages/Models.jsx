@@ -61,7 +61,9 @@ export default function Models() {
     remarks: "",
     safety_stock_days: 45,
     safety_threshold_percentage: 20.0,
-    lead_time_weeks: 10
+    lead_time_weeks: 10,
+    kit_volume_cbm: "",
+    kit_weight_kg: ""
   });
   const [inventoryForm, setInventoryForm] = useState({
     product_id: null,
@@ -107,7 +109,9 @@ export default function Models() {
       remarks: "",
       safety_stock_days: 45,
       safety_threshold_percentage: 20.0,
-      lead_time_weeks: 10
+      lead_time_weeks: 10,
+      kit_volume_cbm: "",
+      kit_weight_kg: ""
     });
     setEditingModel(null);
   };
@@ -141,6 +145,14 @@ export default function Models() {
       showSnackbar("Lead Time must be at least 1 week", "error");
       return;
     }
+    if (form.kit_volume_cbm !== "" && !(parseFloat(form.kit_volume_cbm) > 0)) {
+      showSnackbar("Kit Volume must be greater than 0", "error");
+      return;
+    }
+    if (form.kit_weight_kg !== "" && !(parseFloat(form.kit_weight_kg) >= 0)) {
+      showSnackbar("Kit Weight must be 0 or greater", "error");
+      return;
+    }
 
     try {
       // Prepare payload - convert empty strings to null for optional fields
@@ -149,7 +161,9 @@ export default function Models() {
         remarks: form.remarks.trim() || null,  // Convert empty string to null
         safety_stock_days: parseInt(form.safety_stock_days) || 45,
         safety_threshold_percentage: parseFloat(form.safety_threshold_percentage) || 20.0,
-        lead_time_weeks: parseInt(form.lead_time_weeks) || 10
+        lead_time_weeks: parseInt(form.lead_time_weeks) || 10,
+        kit_volume_cbm: form.kit_volume_cbm === "" ? null : parseFloat(form.kit_volume_cbm),  // Empty: not set
+        kit_weight_kg: form.kit_weight_kg === "" ? null : parseFloat(form.kit_weight_kg)
       };
 
       if (editingModel) {
@@ -179,7 +193,9 @@ export default function Models() {
       remarks: model.remarks || "",
       safety_stock_days: model.safety_stock_days || 45,
       safety_threshold_percentage: model.safety_threshold_percentage || 20.0,
-      lead_time_weeks: model.lead_time_weeks || 10
+      lead_time_weeks: model.lead_time_weeks || 10,
+      kit_volume_cbm: model.kit_volume_cbm ?? "",
+      kit_weight_kg: model.kit_weight_kg ?? ""
     });
     setDialogOpen(true);
   };
@@ -503,6 +519,22 @@ export default function Models() {
               helperText="Lead time in weeks for purchase orders (default: 10 weeks)"
               inputProps={{ min: 1 }}
             />
+            <TextField
+              label="Kit Volume (m³)"
+              type="number"
+              value={form.kit_volume_cbm}
+              onChange={(e) => setForm({ ...form, kit_volume_cbm: e.target.value })}
+              helperText="Packed kit volume per unit, used for container consolidation"
+              inputProps={{ min: 0, step: 0.001 }}
+            />
+            <TextField
+              label="Kit Weight (kg)"
+              type="number"
+              value={form.kit_weight_kg}
+              onChange={(e) => setForm({ ...form, kit_weight_kg: e.target.value })}
+              helperText="Packed kit weight per unit (optional)"
+              inputProps={{ min: 0, step: 0.1 }}
+            />
             <TextField
               label="Remarks"
               multiline
@@ -43,6 +43,8 @@ import {
 export default function Sales() {
   const [models, setModels] = useState([]);
   const [sales, setSales] = useState([]);
+  // X-Next-Cursor of the last by-model page (null on the last page)
+  const [salesCursor, setSalesCursor] = useState(null);
   const [salesSummary, setSalesSummary] = useState([]);
   const [weeklySales, setWeeklySales] = useState(null);
   const [multiChannelData, setMultiChannelData] = useState(null);
@@ -94,9 +96,11 @@ export default function Sales() {
     try {
       const res = await listSales({ limit: 50 });
       setSales(res.data || []);
+      setSalesCursor(null);
     } catch (err) {
       console.error("Failed to load sales", err);
       setSales([]);
+      setSalesCursor(null);
     }
   };
 
@@ -110,14 +114,20 @@ export default function Sales() {
     }
   };
 
-  const loadSalesByModel = async () => {
+  // Without a cursor loads the first page; with one appends the next page
+  const loadSalesByModel = async (cursor = null) => {
     if (!selectedProduct) return;
     try {
-      const res = await getSalesByModel(parseInt(selectedProduct));
-      setSales(res.data || []);
+      const res = await getSalesByModel(parseInt(selectedProduct), cursor ? { cursor } : {});
+      const rows = res.data || [];
+      setSales(cursor ? (prev) => [...prev, ...rows] : rows);
+      setSalesCursor(res.headers["x-next-cursor"] || null);
     } catch (err) {
       console.error("Failed to load sales by model", err);
-      setSales([]);
+      if (!cursor) {
+        setSales([]);
+        setSalesCursor(null);
+      }
     }
   };
 
@@ -406,6 +416,13 @@ export default function Sales() {
                       ))}
                     </TableBody>
                   </Table>
+                  {selectedProduct && salesCursor && (
+                    <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                      <Button variant="outlined" onClick={() => loadSalesByModel(salesCursor)}>
+                        Load more
+                      </Button>
+                    </Box>
+                  )}
                 </TableContainer>
               )}
             </Paper>
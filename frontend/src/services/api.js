@@ -26,6 +26,14 @@ export const authLogin = (payload) => API.post("/auth/login", payload);
 export const checkAuthSetup = () => API.get("/auth/check-setup");
 export const getUser = (userId) => API.get(`/auth/user/${userId}`);
 
+// List endpoints accept { format: "columnar" }: one array per field, dictionary-encoded
+// strings. columnValue(payload, field, i) reads one value without building row objects.
+export const columnValue = (payload, field, i) => {
+  const value = payload.columns[field][i];
+  const dictionary = payload.dictionaries[field];
+  return dictionary ? dictionary[value] : value;
+};
+
 // Models
 export const listModels = (params = {}) => API.get("/models", { params });
 export const getModel = (modelId) => API.get(`/models/${modelId}`);
@@ -44,6 +52,11 @@ export const deleteInventoryRecord = (productId) => API.delete(`/inventory/${pro
 // Sales
 export const addSale = (payload) => API.post("/sales", payload);
 export const listSales = (params = {}) => API.get("/sales", { params });
+export const importSales = (file, dryRun = false) => {
+  const form = new FormData();
+  form.append("file", file);
+  return API.post("/sales/import", form, { params: { dry_run: dryRun }, timeout: 120000 });
+};
 export const getSalesByModel = (modelId, params = {}) => 
   API.get(`/sales/by_model/${modelId}`, { params });
 export const getSalesSummary = (params = {}) => 
@@ -56,6 +69,8 @@ export const deleteSalesRecord = (saleId) => API.delete(`/sales/${saleId}`);
 // Purchase Orders - Forecast purchases based on SALES DATA and INVENTORY
 export const listPOs = (params = {}) => API.get("/purchase", { params });
 export const createPO = (payload) => API.post("/purchase/create", payload);
+export const bulkCreatePOs = (purchaseOrders) =>
+  API.post("/purchase/bulk-create", { purchase_orders: purchaseOrders });
 export const forecastPO = (productId, weeks = 8, forecastWeeks = 10) => 
   API.get("/purchase/forecast", { params: { product_id: productId, weeks, forecast_weeks: forecastWeeks } });
 export const updatePO = (poId, payload) => API.put(`/purchase/${poId}`, payload);
@@ -112,6 +127,16 @@ export const updatePOStage = (poId, stage, notes) =>
 export const getPOTimeline = (poId) => API.get(`/purchase/${poId}/timeline`);
 
 // Dashboard Charts and Stats
+export const getDashboardAll = () => API.get("/dashboard/all");
+
+// Live change events (Server-Sent Events); returns the EventSource, call .close() to stop
+export const subscribeEvents = (handlers) => {
+  const source = new EventSource(`${API.defaults.baseURL}/events`);
+  Object.entries(handlers).forEach(([eventType, handler]) =>
+    source.addEventListener(eventType, (e) => handler(JSON.parse(e.data)))
+  );
+  return source;
+};
 export const getDashboardStats = () => API.get("/dashboard/stats");
 export const getInventoryHealthChart = () => API.get("/dashboard/charts/inventory-health");
 export const getSalesTrendChart = (weeks, productId) =>
@@ -120,6 +145,7 @@ export const getPOForecastVsActualChart = (weeks) =>
   API.get("/dashboard/charts/po-forecast-vs-actual", { params: { weeks } });
 export const getShipmentStagesChart = () => API.get("/dashboard/charts/shipment-stages");
 export const getLeadTimePerformanceChart = () => API.get("/dashboard/charts/lead-time-performance");
+export const getMovers = (params = {}) => API.get("/dashboard/movers", { params });
 
 // Export
 export const exportPOExcel = (stage, status) =>